@@ -47,6 +47,8 @@ class Settings(BaseSettings):
     QUEUE_SERVICE: str = ''
     METADATA_SERVICE: str = ''
 
+    LOCK_PREFIXES: bool = False
+
     DATASET_RDS_DBNAME: str = 'dataset'
     RDS_HOST: str = ''
     RDS_PORT: int
@@ -10,8 +10,12 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+from typing import List
+from typing import Set
+
 import requests
 from config import ConfigClass
+from paths import get_node_paths
 
 
 def get_all_children_nodes(parent_path, zone, container_code):
@@ -59,15 +63,27 @@ def unlock_resource(resource_key: str, operation: str) -> dict:
 
 
 def format_folder_path(node):
-    parent_path = node.get('parent_path', None)
-    if parent_path:
-        path = parent_path.replace('.', '/') if '.' in parent_path else parent_path
-        return '{}/{}'.format(path, node.get('name'))
-    return node.get('name')
+    return get_node_paths(node.get('parent_path'), node.get('name')).slashed
+
+
+def get_covering_keys(resource_keys: List[str], folder_keys: Set[str]) -> List[str]:
+    """Return minimal list of keys where folders are locked with prefix keys covering all resources under them."""
+
+    covering_keys = []
+    for resource_key in sorted(resource_keys, key=lambda key: key.split('/')):
+        if covering_keys and covering_keys[-1].endswith('/') and resource_key.startswith(covering_keys[-1]):
+            continue
 
+        covering_keys.append(f'{resource_key}/' if resource_key in folder_keys else resource_key)
 
-def lock_nodes(dataset_code: str):
-    """the function will recursively lock the node tree."""
+    return covering_keys
+
+
+def lock_nodes(dataset_code: str, prefixes: bool = False):
+    """the function will recursively lock the node tree.
+
+    With prefixes enabled folders are locked with prefix keys, so resources under them are not locked one by one.
+    """
 
     # this is for crash recovery, if something trigger the exception
     # we will unlock the locked node only. NOT the whole tree. The example
@@ -76,6 +92,7 @@ def lock_nodes(dataset_code: str):
     locked_node, err = [], None
 
     try:
+        resource_keys, folder_keys = [], set()
         nodes = get_all_children_nodes(None, 'core', dataset_code)
         for ff_object in nodes:
             # we will skip the deleted nodes
@@ -93,6 +110,14 @@ def lock_nodes(dataset_code: str):
                 minio_obj_path = format_folder_path(ff_object)
 
             source_key = '{}/{}'.format(bucket, minio_obj_path)
+            resource_keys.append(source_key)
+            if ff_object.get('type') != 'file':
+                folder_keys.add(source_key)
+
+        if prefixes:
+            resource_keys = get_covering_keys(resource_keys, folder_keys)
+
+        for source_key in resource_keys:
             lock_resource(source_key, 'read')
             locked_node.append((source_key, 'read'))
 
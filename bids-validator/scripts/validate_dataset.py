@@ -165,7 +165,7 @@ def main():
         locked_node = []
         files_locations = get_files(dataset_code)
         # here add recursive read lock on the dataset
-        locked_node, err = lock_nodes(dataset_code)
+        locked_node, err = lock_nodes(dataset_code, ConfigClass.LOCK_PREFIXES)
         if err:
             raise err
 
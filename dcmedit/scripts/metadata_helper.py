@@ -14,6 +14,7 @@ from typing import Tuple
 
 import requests
 from config import ConfigClass
+from paths import get_node_paths
 from requests import Response
 
 
@@ -38,14 +39,16 @@ def create_file_node(
 
     file_name = new_name if new_name else source_file.get('name')
     # format minio object path
-    full_path = '{}/{}'.format(format_folder_path(parent_object, '/'), file_name)
+    parent_paths = get_node_paths(parent_object.get('parent_path'), parent_object.get('name'))
+    parent_path = parent_paths.dotted
+    full_path = '{}/{}'.format(parent_paths.slashed, file_name)
 
     minio_http = ('https://' if ConfigClass.MINIO_HTTPS else 'http://') + ConfigClass.MINIO_ENDPOINT
     location = 'minio://%s/%s/%s' % (minio_http, 'gr-' + project_code, full_path)
 
     payload = {
         'parent': parent_object.get('id'),
-        'parent_path': format_folder_path(parent_object, '.'),
+        'parent_path': parent_path,
         'type': 'file',
         'zone': 0,
         'name': file_name,
@@ -69,11 +72,7 @@ def create_file_node(
 
 
 def format_folder_path(node, divider):
-    parent_path = node.get('parent_path', None)
-    if parent_path:
-        path = parent_path.replace('.', divider) if '.' in parent_path else parent_path
-        return '{}{}{}'.format(path, divider, node.get('name'))
-    return node.get('name')
+    return get_node_paths(node.get('parent_path'), node.get('name')).join(divider)
 
 
 # this function will help to create a target node
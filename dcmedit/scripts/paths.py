@@ -0,0 +1,54 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+"""Cached paths of metadata nodes.
+
+This module is kept as identical copy in dcmedit and bids-validator scripts. Each image is built from its own
+directory and runs the scripts without installing any package, so there is no place to share one module from.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+from typing import Optional
+
+PATHS_CACHE_SIZE = 65536
+
+
+class NodePaths(NamedTuple):
+    """Store precomputed forms of node path built from parent path and name."""
+
+    parent_path: Optional[str]
+    name: str
+    dotted: str
+    slashed: str
+
+    def join(self, divider: str) -> str:
+        """Return node path joined with divider the same way as parent path is stored in metadata service."""
+
+        if divider == '.':
+            return self.dotted
+
+        if divider == '/':
+            return self.slashed
+
+        raise ValueError(f'Unsupported path divider "{divider}".')
+
+
+@lru_cache(maxsize=PATHS_CACHE_SIZE)
+def get_node_paths(parent_path: Optional[str], name: str) -> NodePaths:
+    """Return cached paths of the node with parent path and name."""
+
+    if parent_path:
+        slashed = '{}/{}'.format(parent_path.replace('.', '/'), name)
+        return NodePaths(parent_path, name, f'{parent_path}.{name}', slashed)
+
+    return NodePaths(parent_path, name, name, name)
@@ -0,0 +1,125 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+"""Compare memory and time needed to load approved entities of one approval request.
+
+Approval entities are stored in the sqlite database, so only the cost of loading rows into python objects is measured.
+
+    python -m benchmarks.approval_entities --entities 100000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Any
+from typing import Callable
+from typing import Dict
+
+from operations.services.approval.client import ApprovalServiceClient
+from operations.services.approval.models import CopyStatus
+from operations.services.approval.models import EntityType
+from operations.services.approval.models import ReviewStatus
+from sqlalchemy import Column
+from sqlalchemy import MetaData
+from sqlalchemy import String
+from sqlalchemy import Table
+from sqlalchemy import insert
+from sqlalchemy.future import create_engine
+
+FOLDERS = 100
+
+
+def create_approval_service_client(database_uri: str, request_id: str, entities: int) -> ApprovalServiceClient:
+    metadata = MetaData()
+    Table(
+        'approval_entity',
+        metadata,
+        Column('id', String(), primary_key=True),
+        Column('request_id', String()),
+        Column('entity_id', String()),
+        Column('parent_id', String()),
+        Column('entity_type', String()),
+        Column('review_status', String()),
+        Column('copy_status', String()),
+        Column('name', String()),
+    )
+    Table('approval_request', metadata, Column('id', String(), primary_key=True))
+    client = ApprovalServiceClient(create_engine(database_uri, future=True), metadata)
+    metadata.create_all(client.engine)
+
+    folder_ids = [str(uuid.uuid4()) for _ in range(FOLDERS)]
+    rows = [
+        {'entity_id': folder_id, 'parent_id': None, 'entity_type': EntityType.FOLDER, 'name': f'folder-{i}'}
+        for i, folder_id in enumerate(folder_ids)
+    ]
+    rows += [
+        {
+            'entity_id': str(uuid.uuid4()),
+            'parent_id': folder_ids[i % FOLDERS],
+            'entity_type': EntityType.FILE,
+            'name': f'file-{i}.txt',
+        }
+        for i in range(entities - FOLDERS)
+    ]
+    with client.engine.begin() as connection:
+        connection.execute(
+            insert(client.approval_entity),
+            [
+                {
+                    'id': str(uuid.uuid4()),
+                    'request_id': request_id,
+                    'review_status': ReviewStatus.APPROVED,
+                    'copy_status': CopyStatus.PENDING,
+                    **row,
+                }
+                for row in rows
+            ],
+        )
+
+    return client
+
+
+STRATEGIES: Dict[str, Callable[[ApprovalServiceClient, str], Any]] = {
+    'models': lambda client, request_id: client.get_approval_entities(request_id).get_approved(),
+    'index': lambda client, request_id: client.get_approval_entity_index(request_id).get_approved(),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entities', type=int, default=100000)
+    arguments = parser.parse_args()
+
+    request_id = str(uuid.uuid4())
+    with tempfile.NamedTemporaryFile(suffix='.db') as f:
+        client = create_approval_service_client(f'sqlite:///{f.name}', request_id, arguments.entities)
+
+        for name, strategy in STRATEGIES.items():
+            tracemalloc.start()
+            started_at = time.perf_counter()
+            approved_entities = strategy(client, request_id)
+            elapsed = time.perf_counter() - started_at
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            sys.stdout.write(
+                f'{name:>6}: {len(approved_entities)} approved in {elapsed:6.2f} s, '
+                f'retained {retained / 1024 / 1024:7.1f} MiB, peak {peak / 1024 / 1024:7.1f} MiB\n'
+            )
+            del approved_entities
+
+
+if __name__ == '__main__':
+    main()
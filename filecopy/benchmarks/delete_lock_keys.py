@@ -0,0 +1,200 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+"""Compare number of metadata service requests needed to collect write lock keys of delete job.
+
+Synthetic tree of folders with subfolders and files is served by in-memory metadata service routes that count
+requests. Previous preparation traverses the source folder excluding not included nodes, with and without prefetched
+tree, current one fetches included nodes and nodes under them directly.
+
+    python -m benchmarks.delete_lock_keys --folders 100 --subfolders 4 --files-per-folder 24 --included 100
+"""
+
+import argparse
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from operations.managers import DeletePreparationManager
+from operations.managers import NodeManager
+from operations.models import Node
+from operations.models import NodeList
+from operations.models import ResourceType
+from operations.services.metadata.client import MetadataServiceClient
+from operations.traverser import ConcurrentTraverser
+
+SOURCE_BUCKET = Path('gr-project')
+TRAVERSER_MAX_WORKERS = 8
+
+
+class FakeResponse:
+    def __init__(self, body: Dict[str, Any]) -> None:
+        self.status_code = 200
+        self.body = body
+
+    def json(self) -> Dict[str, Any]:
+        return self.body
+
+
+class FakeMetadataHttpClient:
+    """Metadata service read routes backed by in-memory nodes that count received requests."""
+
+    def __init__(self, nodes: List[Dict[str, Any]]) -> None:
+        self.nodes = {node['id']: node for node in nodes}
+        self.requests: Counter = Counter()
+
+    def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        parent_path = params['parent_path']
+        prefix = f'{parent_path}.'
+        matched = [
+            node
+            for node in self.nodes.values()
+            if node['parent_path'] == parent_path
+            or (params['recursive'] and (node['parent_path'] or '').startswith(prefix))
+        ]
+        if 'page' not in params:
+            return {'result': matched}
+
+        page, page_size = params['page'], params['page_size']
+        return {
+            'result': matched[page * page_size : (page + 1) * page_size],  # noqa: E203
+            'num_of_pages': max(1, -(-len(matched) // page_size)),
+        }
+
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> FakeResponse:
+        route = url.split('/v1/', 1)[1]
+        if route == 'items/search/':
+            self.requests['search'] += 1
+            return FakeResponse(self.search(params))
+
+        if route == 'items/batch/':
+            self.requests['batch'] += 1
+            return FakeResponse({'result': [self.nodes[node_id] for node_id in params['ids']]})
+
+        self.requests['item'] += 1
+        return FakeResponse({'result': self.nodes[route.split('/')[1]]})
+
+
+class TraversalDeletePreparationManager(NodeManager):
+    """Previous delete preparation that traverses source folder only to collect write lock keys."""
+
+    def __init__(self, metadata_service_client: MetadataServiceClient, include_geids: Set[str]) -> None:
+        super().__init__(metadata_service_client)
+
+        self.include_geids = include_geids
+
+    def exclude_nodes(self, source_folder: Node, nodes: NodeList) -> Set[str]:
+        if not self.include_geids.issubset(nodes.ids):
+            return set()
+
+        return nodes.ids.difference(self.include_geids)
+
+    def process_file(self, source_file: Node, destination_path: Path) -> None:
+        pass
+
+    def process_folder(self, source_folder: Node, destination_parent_path: Path) -> Path:
+        return destination_parent_path
+
+
+def generate_nodes(folders: int, subfolders: int, files_per_folder: int) -> List[Dict[str, Any]]:
+    def create_node(parent_path: str, name: str, type_: str) -> Dict[str, Any]:
+        return {
+            'id': str(uuid.uuid4()),
+            'parent_path': parent_path,
+            'name': name,
+            'type': type_,
+            'zone': 0,
+            'container_code': 'project',
+            'archived': False,
+        }
+
+    nodes = [create_node('admin', 'source', ResourceType.FOLDER)]
+    for folder in range(folders):
+        nodes.append(create_node('admin.source', f'folder-{folder}', ResourceType.FOLDER))
+        for subfolder in range(subfolders):
+            parent_path = f'admin.source.folder-{folder}'
+            nodes.append(create_node(parent_path, f'subfolder-{subfolder}', ResourceType.FOLDER))
+            for file in range(files_per_folder):
+                nodes.append(create_node(f'{parent_path}.subfolder-{subfolder}', f'file-{file}.txt', ResourceType.FILE))
+
+    return nodes
+
+
+def collect_by_traversal(prefetch_tree: bool) -> Callable[[MetadataServiceClient, Node, Set[str]], List[str]]:
+    def collect(
+        metadata_service_client: MetadataServiceClient, source_folder: Node, include_ids: Set[str]
+    ) -> List[str]:
+        manager = TraversalDeletePreparationManager(metadata_service_client, include_ids)
+        traverser = ConcurrentTraverser(manager, TRAVERSER_MAX_WORKERS, prefetch_tree)
+        traverser.traverse_tree(source_folder, Path())
+        return [node.paths.in_bucket(SOURCE_BUCKET) for node in traverser.take_snapshot()]
+
+    return collect
+
+
+def collect_directly(prefixes: bool) -> Callable[[MetadataServiceClient, Node, Set[str]], List[str]]:
+    def collect(
+        metadata_service_client: MetadataServiceClient, source_folder: Node, include_ids: Set[str]
+    ) -> List[str]:
+        manager = DeletePreparationManager(metadata_service_client, 'project', 'greenroom', SOURCE_BUCKET, include_ids)
+        return list(manager.get_write_lock_keys(manager.get_included_nodes(), prefixes))
+
+    return collect
+
+
+STRATEGIES = {
+    'traversal': collect_by_traversal(False),
+    'traversal-prefetch': collect_by_traversal(True),
+    'direct': collect_directly(False),
+    'direct-prefixes': collect_directly(True),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--folders', type=int, default=100)
+    parser.add_argument('--subfolders', type=int, default=4)
+    parser.add_argument('--files-per-folder', type=int, default=24)
+    parser.add_argument('--included', type=int, default=100)
+    arguments = parser.parse_args()
+
+    nodes = generate_nodes(arguments.folders, arguments.subfolders, arguments.files_per_folder)
+    source_folder = Node(nodes[0])
+    folder_ids = [node['id'] for node in nodes if node['parent_path'] == 'admin.source']
+    include_ids = set(folder_ids[: arguments.included])
+
+    sys.stdout.write(f'{len(nodes)} nodes, {len(include_ids)} included folders\n')
+    for name, strategy in STRATEGIES.items():
+        metadata_service_client = MetadataServiceClient('http://metadata', 'minio', 'core', '')
+        http_client = FakeMetadataHttpClient(nodes)
+        metadata_service_client.async_client.client = http_client
+
+        started_at = time.perf_counter()
+        keys = strategy(metadata_service_client, source_folder, include_ids)
+        elapsed = time.perf_counter() - started_at
+
+        sys.stdout.write(
+            f'{name:>18}: {sum(http_client.requests.values()):5} requests {dict(http_client.requests)}, '
+            f'{len(keys)} keys in {elapsed:6.2f} s\n'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+"""Compare memory and time needed to load and traverse synthetic tree of nodes.
+
+Nodes are decoded from json pages the same way metadata service responses are, filtered into new node list as traverser
+does and display path of every node is accessed several times as copy and delete managers do. Time and peak traced
+memory are measured in separate runs.
+
+    python -m benchmarks.nodes --folders 1000 --files-per-folder 1000
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+
+from operations.models import NodeList
+
+PAGE_SIZE = 1000
+DISPLAY_PATH_ACCESSES = 3
+
+
+class DictNode(dict):
+    """Previous node representation without interning and shared path cache."""
+
+    @property
+    def display_path(self) -> Path:
+        if self['parent_path']:
+            full_path = '{}/{}'.format(self['parent_path'].replace('.', '/'), self['name'])
+        else:
+            full_path = self['name']
+        display_path = Path(full_path)
+
+        if display_path.is_absolute():
+            display_path = display_path.relative_to('/')
+
+        return display_path
+
+    @property
+    def id(self) -> str:
+        return self['id']
+
+
+class DictNodeList(list):
+    """Previous node list that wraps every node again."""
+
+    def __init__(self, nodes: List[Dict[str, Any]]) -> None:
+        super().__init__([DictNode(node) for node in nodes])
+
+
+STRATEGIES = {'dict': DictNodeList, 'interned': NodeList}
+
+
+def generate_pages(folders: int, files_per_folder: int) -> Iterator[str]:
+    """Generate json encoded pages of file nodes."""
+
+    page = []
+    for folder in range(folders):
+        parent = str(uuid.uuid4())
+        for file in range(files_per_folder):
+            page.append(
+                {
+                    'id': str(uuid.uuid4()),
+                    'parent': parent,
+                    'parent_path': f'admin.folder-{folder // 100}.folder-{folder}',
+                    'name': f'file-{file}.txt',
+                    'type': 'file',
+                    'zone': 1,
+                    'size': 1024,
+                    'owner': 'admin',
+                    'container_code': 'project',
+                    'container_type': 'project',
+                    'archived': False,
+                    'status': 'ACTIVE',
+                    'extended': {'extra': {'tags': [], 'system_tags': [], 'attributes': {}}},
+                    'storage': {'location_uri': f'minio://minio:9000/core-project/admin/{file}'},
+                }
+            )
+            if len(page) == PAGE_SIZE:
+                yield json.dumps({'result': page})
+                page = []
+
+    if page:
+        yield json.dumps({'result': page})
+
+
+def run_strategy(node_list_class: type, pages: List[str]) -> int:
+    nodes = []
+    for page in pages:
+        children = node_list_class(json.loads(page)['result'])
+        nodes.extend(node_list_class([node for node in children if node.id]))
+
+    for node in nodes:
+        for _ in range(DISPLAY_PATH_ACCESSES):
+            node.display_path
+
+    return len(nodes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--folders', type=int, default=1000)
+    parser.add_argument('--files-per-folder', type=int, default=100)
+    arguments = parser.parse_args()
+
+    pages = list(generate_pages(arguments.folders, arguments.files_per_folder))
+
+    for name, node_list_class in STRATEGIES.items():
+        started_at = time.perf_counter()
+        total = run_strategy(node_list_class, pages)
+        elapsed = time.perf_counter() - started_at
+
+        tracemalloc.start()
+        run_strategy(node_list_class, pages)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        sys.stdout.write(f'{name:>8}: {total} nodes in {elapsed:6.2f} s, peak {peak / 1024 / 1024:8.1f} MiB\n')
+
+
+if __name__ == '__main__':
+    main()
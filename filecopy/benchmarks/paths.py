@@ -0,0 +1,97 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+"""Compare time needed to compute node paths on the copy hot path with and without shared path cache.
+
+For every file the display path is computed for duplicated file names lookup and for bucket path, and the parent
+folder path is formatted for the new file node, the same way copy manager does it.
+
+    python -m benchmarks.paths --folders 1000 --files-per-folder 100 --passes 3
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from operations.paths import get_node_paths
+
+
+def get_display_path(parent_path: Optional[str], name: str) -> Path:
+    """Previous display path computation of Node."""
+
+    if parent_path:
+        full_path = '{}/{}'.format(parent_path.replace('.', '/'), name)
+    else:
+        full_path = name
+    display_path = Path(full_path)
+
+    if display_path.is_absolute():
+        display_path = display_path.relative_to('/')
+
+    return display_path
+
+
+def format_folder_path(parent_path: Optional[str], name: str, divider: str) -> str:
+    """Previous folder path formatting of metadata service client."""
+
+    if parent_path:
+        path = parent_path.replace('.', divider) if '.' in parent_path else parent_path
+        return '{}{}{}'.format(path, divider, name)
+    return name
+
+
+def run_uncached(files: List[Tuple[str, str]], folder: Tuple[str, str]) -> None:
+    for parent_path, name in files:
+        get_display_path(parent_path, name)
+        Path('core-project') / get_display_path(parent_path, name)
+        format_folder_path(*folder, '.')
+
+
+def run_cached(files: List[Tuple[str, str]], folder: Tuple[str, str]) -> None:
+    for parent_path, name in files:
+        get_node_paths(parent_path, name).display
+        get_node_paths(parent_path, name).in_bucket('core-project')
+        get_node_paths(*folder).join('.')
+
+
+STRATEGIES = {'uncached': run_uncached, 'cached': run_cached}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--folders', type=int, default=1000)
+    parser.add_argument('--files-per-folder', type=int, default=50)
+    parser.add_argument('--passes', type=int, default=3)
+    arguments = parser.parse_args()
+
+    files = [
+        (f'admin.folder-{folder // 100}.folder-{folder}', f'file-{file}.txt')
+        for folder in range(arguments.folders)
+        for file in range(arguments.files_per_folder)
+    ]
+    folder = ('admin.destination', 'folder')
+
+    for name, strategy in STRATEGIES.items():
+        get_node_paths.cache_clear()
+        elapsed = timeit.timeit(lambda: strategy(files, folder), number=arguments.passes)
+        sys.stdout.write(
+            f'{name:>8}: {len(files) * arguments.passes / elapsed:12.0f} files/s '
+            f'({elapsed / arguments.passes:.3f} s per pass)\n'
+        )
+
+
+if __name__ == '__main__':
+    main()
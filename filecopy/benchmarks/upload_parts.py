@@ -0,0 +1,142 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+"""Compare peak resident memory and throughput of multipart upload part reading strategies.
+
+Parts are sent to the sink s3 client that consumes bodies in chunks the same way http client does, so only the cost
+of reading parts from disk is measured. Every strategy runs in a separate process to get independent peak RSS.
+
+    python -m benchmarks.upload_parts --size-mb 1024 --part-size-mb 64 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Any
+from typing import Dict
+
+from operations.minio_boto3_client import MinioBoto3Client
+from operations.minio_boto3_client import gather_parts
+from operations.minio_boto3_client import get_part_ranges
+
+CHUNK_SIZE = 64 * 1024
+
+
+class SinkS3Client:
+    """S3 client that reads part bodies in chunks and drops them."""
+
+    async def __aenter__(self) -> 'SinkS3Client':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def create_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        return {'UploadId': 'upload'}
+
+    async def upload_part(self, Body: Any, PartNumber: int, **kwargs: Any) -> Dict[str, Any]:
+        if hasattr(Body, 'read'):
+            while Body.read(CHUNK_SIZE):
+                await asyncio.sleep(0)
+        else:
+            view = memoryview(Body)
+            for start in range(0, len(view), CHUNK_SIZE):
+                view[start : start + CHUNK_SIZE].tobytes()  # noqa: E203
+                await asyncio.sleep(0)
+        return {'ETag': f'etag-{PartNumber}'}
+
+    async def complete_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        return {}
+
+    async def abort_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        return {}
+
+
+async def upload_with_reads(file_path: str, part_size: int, concurrency: int) -> None:
+    """Previous strategy that reads every part into bytes in executor before uploading it."""
+
+    s3 = SinkS3Client()
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    def read_part(start: int, end: int) -> bytes:
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start + 1)
+
+    async def upload_part(part_number: int, start: int, end: int) -> Dict[str, Any]:
+        async with semaphore:
+            body = await loop.run_in_executor(None, read_part, start, end)
+            return await s3.upload_part(Body=body, PartNumber=part_number)
+
+    part_ranges = get_part_ranges(os.path.getsize(file_path), part_size)
+    await gather_parts(upload_part(*part_range) for part_range in part_ranges)
+
+
+async def upload_with_mmap(file_path: str, part_size: int, concurrency: int) -> None:
+    """Current strategy that streams parts from memory mapped file."""
+
+    client = MinioBoto3Client.__new__(MinioBoto3Client)
+    client._get_s3_client = lambda max_pool_connections: SinkS3Client()
+    await client.upload_object('bucket', 'key', file_path, part_size, concurrency)
+
+
+STRATEGIES = {'read': upload_with_reads, 'mmap': upload_with_mmap}
+
+
+def run_strategy(name: str, file_path: str, part_size: int, concurrency: int, results: Any) -> None:
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started_at = time.perf_counter()
+    asyncio.run(STRATEGIES[name](file_path, part_size, concurrency))
+    elapsed = time.perf_counter() - started_at
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((name, elapsed, rss_before, rss_after))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--part-size-mb', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=4)
+    arguments = parser.parse_args()
+
+    size = arguments.size_mb * 1024 * 1024
+    part_size = arguments.part_size_mb * 1024 * 1024
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+
+    with tempfile.NamedTemporaryFile() as f:
+        for _ in range(arguments.size_mb):
+            f.write(os.urandom(1024 * 1024))
+        f.flush()
+
+        for name in STRATEGIES:
+            process = context.Process(
+                target=run_strategy, args=(name, f.name, part_size, arguments.concurrency, results)
+            )
+            process.start()
+            name, elapsed, rss_before, rss_after = results.get()
+            process.join()
+
+            sys.stdout.write(
+                f'{name:>5}: {size / elapsed / 1024 / 1024:10.1f} MiB/s, '
+                f'peak rss {rss_after / 1024:8.1f} MiB (+{(rss_after - rss_before) / 1024:.1f} MiB)\n'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from typing import TextIO
+from typing import Union
+
+logger = logging.getLogger(__name__)
+
+
+class CopiedFile(NamedTuple):
+    """Store result of one completed file copy."""
+
+    source_id: str
+    destination_id: str
+    version_id: str
+
+
+class CheckpointJournal:
+    """Append-only journal of files completely copied by one job.
+
+    Every completed file is written as one json line, so entries written before the crash of the job are loaded when
+    the job with the same id is started again. Line that was only partially written is ignored.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.files: Dict[str, CopiedFile] = {}
+        self.file: Optional[TextIO] = None
+        self.lock = threading.Lock()
+        self.ends_with_newline = True
+
+        self._load()
+
+    @classmethod
+    def for_job(cls, directory: Union[Path, str], job_id: str) -> 'CheckpointJournal':
+        """Return journal of the copy job stored in directory."""
+
+        return cls(Path(directory) / f'copy-{job_id}.jsonl')
+
+    def __contains__(self, source_id: str) -> bool:
+        return source_id in self.files
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+
+        content = self.path.read_text()
+        self.ends_with_newline = not content or content.endswith('\n')
+
+        for line in content.splitlines():
+            try:
+                copied_file = CopiedFile(**json.loads(line))
+            except (ValueError, TypeError):
+                logger.warning(f'Skipping malformed line in checkpoint journal "{self.path}": {line!r}.')
+                continue
+
+            self.files[copied_file.source_id] = copied_file
+
+    def get(self, source_id: str) -> Optional[CopiedFile]:
+        return self.files.get(source_id)
+
+    def record(self, source_id: str, destination_id: str, version_id: str) -> None:
+        """Append completed file copy to the journal and flush it to disk."""
+
+        copied_file = CopiedFile(source_id, destination_id, version_id)
+
+        with self.lock:
+            if self.file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.file = self.path.open('a')
+                if not self.ends_with_newline:
+                    self.file.write('\n')
+
+            self.file.write(json.dumps(copied_file._asdict()) + '\n')
+            self.file.flush()
+            self.files[source_id] = copied_file
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def remove(self) -> None:
+        """Close and remove the journal once the job is finished."""
+
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -10,7 +10,6 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
-import asyncio
 import atexit
 import uuid
 from pathlib import Path
@@ -19,10 +18,17 @@ from typing import Set
 
 import click
 from common import ProjectClient
+from operations.checkpoint import CheckpointJournal
 from operations.config import get_settings
+from operations.event_loop import run_blocking
+from operations.event_loop import run_main
+from operations.http_client import close_connection_manager
+from operations.http_client import close_connection_manager_async
 from operations.kafka_producer import KafkaProducer
 from operations.managers import CopyManager
 from operations.managers import CopyPreparationManager
+from operations.metrics import export_job_metrics
+from operations.metrics import reset_job_metrics
 from operations.minio_boto3_client import MinioBoto3Client
 from operations.services.approval.client import ApprovalServiceClient
 from operations.services.audit_trail.client import AuditTrailServiceClient
@@ -31,11 +37,12 @@ from operations.services.dataops.client import JobStatus
 from operations.services.dataops.client import ResourceLockOperation
 from operations.services.lineage.client import LineageServiceClient
 from operations.services.metadata.client import MetadataServiceClient
-from operations.traverser import Traverser
+from operations.traverser import AsyncTraverser
 from sqlalchemy import MetaData
 from sqlalchemy import create_engine
 
 atexit.register(KafkaProducer.close_connection)
+atexit.register(close_connection_manager)
 
 
 @atexit.register
@@ -60,6 +67,22 @@ def copy(
 ):
     """Copy files from source geid into destination geid."""
 
+    run_main(copy_async(source_id, destination_id, include_ids, job_id, session_id, project_code, operator, request_id))
+
+
+async def copy_async(
+    source_id: str,
+    destination_id: str,
+    include_ids: Optional[Set[str]],
+    job_id: str,
+    session_id: str,
+    project_code: str,
+    operator: str,
+    request_id: Optional[uuid.UUID],
+) -> None:
+    """Run the whole copy job in the event loop of the entry point."""
+
+    metrics = reset_job_metrics()
     click.echo(
         f'Starting copy process from "{source_id}" into "{destination_id}" \
         including only "{set(include_ids)}".'
@@ -70,32 +93,36 @@ def copy(
     project_client = ProjectClient(settings.PROJECT_SERVICE, settings.REDIS_URL)
 
     metadata_service_client = MetadataServiceClient(
-        settings.METADATA_SERVICE, settings.S3_URL, settings.CORE_ZONE_LABEL, settings.TEMP_DIR, project_client
+        settings.METADATA_SERVICE, settings.S3_URL, settings.CORE_ZONE_LABEL, project_client
     )
-    dataops_client = DataopsServiceClient(settings.DATAOPS_SERVICE)
+    dataops_client = DataopsServiceClient(settings.DATAOPS_SERVICE, settings.LOCK_CHUNK_SIZE)
     audit_trail_service_client = AuditTrailServiceClient(settings.AUDIT_TRAIL_SERVICE)
     lineage_service_client = LineageServiceClient(settings.LINEAGE_SERVICE)
 
-    minio_client = MinioBoto3Client(
-        settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY, settings.S3_URL, settings.S3_INTERNAL_HTTPS
+    minio_client = await run_blocking(
+        MinioBoto3Client, settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY, settings.S3_URL, settings.S3_INTERNAL_HTTPS
     )
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(KafkaProducer.init_connection())
+    await KafkaProducer.init_connection()
 
     approval_service_client = None
     approved_entities = None
 
+    checkpoint_journal = CheckpointJournal.for_job(settings.CHECKPOINT_DIR or settings.TEMP_DIR, job_id)
+    click.echo(f'Checkpoint journal "{checkpoint_journal.path}" contains {len(checkpoint_journal)} copied files.')
+
     try:
         if request_id:
             approval_service_client = ApprovalServiceClient(
                 engine=create_engine(url=settings.DB_URI, future=True),
                 metadata=MetaData(schema=settings.RDS_SCHEMA),
             )
-            request_approval_entities = approval_service_client.get_approval_entities(str(request_id))
-            approved_entities = request_approval_entities.get_approved()
+            approval_entity_index = await run_blocking(
+                approval_service_client.get_approval_entity_index, str(request_id)
+            )
+            approved_entities = approval_entity_index.get_approved()
 
-        nodes = metadata_service_client.get_items_by_ids([source_id, destination_id])
+        nodes = await metadata_service_client.async_client.get_items_by_ids([source_id, destination_id])
         source_folder = nodes[source_id]
         destination_folder = nodes[destination_id]
 
@@ -115,17 +142,32 @@ def copy(
             source_bucket,
             destination_bucket,
             set(include_ids[0].split(',')),
+            checkpoint_journal,
         )
-        traverser = Traverser(copy_preparation_manager)
-        traverser.traverse_tree(source_folder, destination_folder.display_path)
+        traverser = AsyncTraverser(
+            copy_preparation_manager, settings.TRAVERSER_MAX_WORKERS, settings.TRAVERSER_PREFETCH_TREE
+        )
+        with metrics.measure('job.prepare'):
+            await traverser.traverse_tree_async(source_folder, destination_folder.display_path)
+        snapshot = traverser.take_snapshot()
 
-        loop = asyncio.get_event_loop()
-        project = loop.run_until_complete(metadata_service_client.get_project_by_code(project_code))
+        project = await metadata_service_client.get_project_by_code(project_code)
 
+        read_lock_keys = copy_preparation_manager.get_read_lock_keys(
+            snapshot, source_folder, destination_folder.display_path, settings.LOCK_PREFIXES
+        )
+        write_lock_keys = copy_preparation_manager.get_write_lock_keys(
+            snapshot, source_folder, destination_folder.display_path, settings.LOCK_PREFIXES
+        )
+
+        await dataops_client.async_client.lock_resources(read_lock_keys, ResourceLockOperation.READ)
         try:
-            dataops_client.lock_resources(copy_preparation_manager.read_lock_paths, ResourceLockOperation.READ)
-            dataops_client.lock_resources(copy_preparation_manager.write_lock_paths, ResourceLockOperation.WRITE)
+            await dataops_client.async_client.lock_resources(write_lock_keys, ResourceLockOperation.WRITE)
+        except Exception:
+            await dataops_client.async_client.unlock_resources(read_lock_keys, ResourceLockOperation.READ)
+            raise
 
+        try:
             pipeline_name = 'data_transfer_folder'
             pipeline_desc = 'the script will copy the folder \
                 from greenroom to core recursively'
@@ -150,18 +192,37 @@ def copy(
                 pipeline_desc,
                 operation_type,
                 set(include_ids[0].split(',')),
+                settings.COPY_CONCURRENCY,
+                settings.NODE_BATCH_SIZE,
+                settings.COPY_STATUS_BATCH_SIZE,
+                settings.COPY_STATUS_FLUSH_INTERVAL,
+                checkpoint_journal,
+                settings.NODE_BATCH_MAX_AGE,
+                settings.MAX_PENDING_COPIES,
+            )
+            traverser = AsyncTraverser(
+                copy_manager,
+                settings.COPY_TRAVERSER_MAX_WORKERS,
+                snapshot=snapshot,
+                flush_interval=min(settings.NODE_BATCH_MAX_AGE, settings.COPY_STATUS_FLUSH_INTERVAL),
             )
-            traverser = Traverser(copy_manager)
-            traverser.traverse_tree(source_folder, destination_folder)
+            with metrics.measure('job.copy'):
+                await traverser.traverse_tree_async(source_folder, destination_folder)
         finally:
-            dataops_client.unlock_resources(copy_preparation_manager.read_lock_paths, ResourceLockOperation.READ)
-            dataops_client.unlock_resources(copy_preparation_manager.write_lock_paths, ResourceLockOperation.WRITE)
+            await dataops_client.async_client.unlock_resources(read_lock_keys, ResourceLockOperation.READ)
+            await dataops_client.async_client.unlock_resources(write_lock_keys, ResourceLockOperation.WRITE)
 
-        dataops_client.update_job(session_id, job_id, JobStatus.SUCCEED)
+        await dataops_client.async_client.update_job(session_id, job_id, JobStatus.SUCCEED)
+        checkpoint_journal.remove()
         click.echo('Copy operation has been finished successfully.')
     except Exception as e:
         click.echo(f'Exception occurred while performing copy operation:{e}')
         try:
-            dataops_client.update_job(session_id, job_id, JobStatus.TERMINATED)
+            await dataops_client.async_client.update_job(session_id, job_id, JobStatus.TERMINATED)
         except Exception as e:
             click.echo(f'Update job error: {e}')
+    finally:
+        checkpoint_journal.close()
+        await KafkaProducer.stop()
+        await close_connection_manager_async()
+        click.echo(f'Job metrics: {export_job_metrics(settings.METRICS_TEXTFILE, job_id=job_id, job_type="copy")}')
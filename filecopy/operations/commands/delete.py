@@ -10,7 +10,6 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
-import asyncio
 import atexit
 from pathlib import Path
 from typing import List
@@ -19,9 +18,15 @@ from typing import Optional
 import click
 from common import ProjectClient
 from operations.config import get_settings
+from operations.event_loop import run_blocking
+from operations.event_loop import run_main
+from operations.http_client import close_connection_manager
+from operations.http_client import close_connection_manager_async
 from operations.kafka_producer import KafkaProducer
 from operations.managers import DeleteManager
 from operations.managers import DeletePreparationManager
+from operations.metrics import export_job_metrics
+from operations.metrics import reset_job_metrics
 from operations.minio_boto3_client import MinioBoto3Client
 from operations.models import ZoneType
 from operations.services.audit_trail.client import AuditTrailServiceClient
@@ -30,9 +35,9 @@ from operations.services.dataops.client import JobStatus
 from operations.services.dataops.client import ResourceLockOperation
 from operations.services.lineage.client import LineageServiceClient
 from operations.services.metadata.client import MetadataServiceClient
-from operations.traverser import Traverser
 
 atexit.register(KafkaProducer.close_connection)
+atexit.register(close_connection_manager)
 
 
 @atexit.register
@@ -53,6 +58,20 @@ def delete(
 ):
     """Move files from source geid into trash bin."""
 
+    run_main(delete_async(source_id, include_ids, job_id, session_id, project_code, operator))
+
+
+async def delete_async(
+    source_id: str,
+    include_ids: Optional[List[str]],
+    job_id: str,
+    session_id: str,
+    project_code: str,
+    operator: str,
+) -> None:
+    """Run the whole delete job in the event loop of the entry point."""
+
+    metrics = reset_job_metrics()
     click.echo(f'Starting delete process from "{source_id} including only "{set(include_ids)}".')
 
     settings = get_settings()
@@ -60,22 +79,21 @@ def delete(
     project_client = ProjectClient(settings.PROJECT_SERVICE, settings.REDIS_URL)
 
     metadata_service_client = MetadataServiceClient(
-        settings.METADATA_SERVICE, settings.S3_URL, settings.CORE_ZONE_LABEL, settings.TEMP_DIR, project_client
+        settings.METADATA_SERVICE, settings.S3_URL, settings.CORE_ZONE_LABEL, project_client
     )
-    dataops_client = DataopsServiceClient(settings.DATAOPS_SERVICE)
+    dataops_client = DataopsServiceClient(settings.DATAOPS_SERVICE, settings.LOCK_CHUNK_SIZE)
     audit_trail_service_client = AuditTrailServiceClient(settings.AUDIT_TRAIL_SERVICE)
     lineage_service_client = LineageServiceClient(settings.LINEAGE_SERVICE)
 
-    minio_client = MinioBoto3Client(
-        settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY, settings.S3_URL, settings.S3_INTERNAL_HTTPS
+    minio_client = await run_blocking(
+        MinioBoto3Client, settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY, settings.S3_URL, settings.S3_INTERNAL_HTTPS
     )
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(KafkaProducer.init_connection())
+    await KafkaProducer.init_connection()
 
     try:
-        source_folder = metadata_service_client.get_item_by_id(source_id)
-        destination_folder = Path()
+        nodes = await metadata_service_client.async_client.get_items_by_ids([source_id])
+        source_folder = nodes[source_id]
 
         source_zone = settings.GREEN_ZONE_LABEL
         source_bucket = Path(f'gr-{project_code}')
@@ -90,15 +108,16 @@ def delete(
             source_bucket,
             set(include_ids[0].split(',')),
         )
-        traverser = Traverser(delete_preparation_manager)
-        traverser.traverse_tree(source_folder, destination_folder)
+        with metrics.measure('job.prepare'):
+            included_nodes = await run_blocking(delete_preparation_manager.get_included_nodes)
+            write_lock_keys = await run_blocking(
+                delete_preparation_manager.get_write_lock_keys, included_nodes, settings.LOCK_PREFIXES
+            )
 
-        loop = asyncio.get_event_loop()
-        project = loop.run_until_complete(metadata_service_client.get_project_by_code(project_code))
+        project = await metadata_service_client.get_project_by_code(project_code)
 
+        await dataops_client.async_client.lock_resources(write_lock_keys, ResourceLockOperation.WRITE)
         try:
-            dataops_client.lock_resources(delete_preparation_manager.write_lock_paths, ResourceLockOperation.WRITE)
-
             pipeline_name = 'data_delete_folder'
             pipeline_desc = 'the script will delete the folder in \
                 greenroom/core recursively'
@@ -118,14 +137,20 @@ def delete(
                 pipeline_desc,
                 operation_type,
                 set(include_ids[0].split(',')),
+                included_nodes,
+                settings.ARCHIVE_CONCURRENCY,
             )
 
-            delete_manager.archive_nodes()
+            with metrics.measure('job.archive'):
+                archive_report = await delete_manager.archive_nodes_async()
+            click.echo(str(archive_report))
+            if archive_report.failed:
+                raise Exception(f'Unable to move nodes into trash bin: {archive_report.failed}')
 
         finally:
-            dataops_client.unlock_resources(delete_preparation_manager.write_lock_paths, ResourceLockOperation.WRITE)
+            await dataops_client.async_client.unlock_resources(write_lock_keys, ResourceLockOperation.WRITE)
 
-        dataops_client.update_job(session_id, job_id, JobStatus.SUCCEED)
+        await dataops_client.async_client.update_job(session_id, job_id, JobStatus.SUCCEED)
         click.echo('Delete operation has been finished successfully.')
     except Exception as e:
         click.echo(
@@ -133,6 +158,10 @@ def delete(
             delete operation: {e}'
         )
         try:
-            dataops_client.update_job(session_id, job_id, JobStatus.TERMINATED)
+            await dataops_client.async_client.update_job(session_id, job_id, JobStatus.TERMINATED)
         except Exception as e:
             click.echo(f'Update job error: {e}')
+    finally:
+        await KafkaProducer.stop()
+        await close_connection_manager_async()
+        click.echo(f'Job metrics: {export_job_metrics(settings.METRICS_TEXTFILE, job_id=job_id, job_type="delete")}')
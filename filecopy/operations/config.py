@@ -73,6 +73,24 @@ class Settings(BaseSettings):
     METADATA_SERVICE: str
 
     TEMP_DIR: str = ''
+    TRAVERSER_MAX_WORKERS: int = 8
+    COPY_TRAVERSER_MAX_WORKERS: int = 64
+    TRAVERSER_PREFETCH_TREE: bool = True
+    COPY_CONCURRENCY: int = 16
+    MAX_PENDING_COPIES: int = 64
+    NODE_BATCH_SIZE: int = 100
+    NODE_BATCH_MAX_AGE: float = 5
+    COPY_STATUS_BATCH_SIZE: int = 500
+    COPY_STATUS_FLUSH_INTERVAL: float = 5
+    LOCK_CHUNK_SIZE: int = 1000
+    LOCK_PREFIXES: bool = False
+    CHECKPOINT_DIR: str = ''
+    ARCHIVE_CONCURRENCY: int = 8
+    METRICS_TEXTFILE: str = ''
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 32
+    HTTP_KEEPALIVE_EXPIRY: float = 30
+    HTTP_TIMEOUT: float = 300
     COPIED_WITH_APPROVAL_TAG: str = 'copied-to-core'
     PROJECT_SERVICE: str
     REDIS_USER: str = 'default'
@@ -45,7 +45,7 @@ class DuplicatedFileNames:
     def get(self, filepath: Union[Path, str], default: Optional[str] = '') -> str:
         """Return filename by filepath if it exists or return default value."""
 
-        path = Path(filepath)
+        path = filepath if isinstance(filepath, Path) else Path(filepath)
 
         try:
             return self.files[path]
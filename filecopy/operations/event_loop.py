@@ -0,0 +1,106 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from functools import partial
+from typing import Any
+from typing import Callable
+from typing import Coroutine
+from typing import Optional
+
+
+class SharedEventLoop:
+    """Execute coroutines on one event loop from any thread.
+
+    Async clients such as kafka producer or boto3 sessions are bound to the loop they were created in, so all of them
+    should be used through the same loop even when nodes are processed by multiple worker threads.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, thread: threading.Thread) -> None:
+        self.loop = loop
+        self.thread = thread
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """Schedule coroutine in the shared loop and return future for its result."""
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """Execute coroutine in the shared loop and wait for its result."""
+
+        if threading.current_thread() is self.thread:
+            coroutine.close()
+            raise RuntimeError('Unable to wait for coroutine result from inside of the event loop thread.')
+
+        return self.submit(coroutine).result()
+
+
+class EventLoopThread(SharedEventLoop):
+    """Run shared event loop in a background thread."""
+
+    def __init__(self) -> None:
+        loop = asyncio.new_event_loop()
+        super().__init__(loop, threading.Thread(target=loop.run_forever, name='event-loop', daemon=True))
+        self.thread.start()
+
+
+@lru_cache(1)
+def get_event_loop_thread() -> EventLoopThread:
+    return EventLoopThread()
+
+
+main_event_loop: Optional[SharedEventLoop] = None
+
+
+def get_shared_event_loop() -> SharedEventLoop:
+    """Return loop of the running job entry point or the background loop when there is no entry point running."""
+
+    if main_event_loop is not None:
+        return main_event_loop
+
+    return get_event_loop_thread()
+
+
+def run_coroutine(coroutine: Coroutine) -> Any:
+    """Execute coroutine in the shared loop and return its result."""
+
+    return get_shared_event_loop().run(coroutine)
+
+
+async def run_blocking(function: Callable[..., Any], *args: Any) -> Any:
+    """Run blocking function in the default executor of the running loop and return its result.
+
+    Blocking code can still call run_coroutine from the executor thread while the loop is waiting for it.
+    """
+
+    return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args))
+
+
+def run_main(coroutine: Coroutine) -> Any:
+    """Run coroutine as the only entry point of the job with asyncio.run.
+
+    While it runs its loop is the shared loop, so blocking code called through run_blocking schedules coroutines on it.
+    """
+
+    async def main() -> Any:
+        global main_event_loop
+
+        main_event_loop = SharedEventLoop(asyncio.get_running_loop(), threading.current_thread())
+        try:
+            return await coroutine
+        finally:
+            main_event_loop = None
+
+    return asyncio.run(main())
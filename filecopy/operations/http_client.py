@@ -0,0 +1,109 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+from functools import lru_cache
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+import httpx
+from operations.config import get_settings
+from operations.event_loop import run_coroutine
+
+
+def encode_params(params: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Encode query parameters the same way requests does, with booleans as True/False and without None values."""
+
+    if params is None:
+        return None
+
+    return {key: str(value) if isinstance(value, bool) else value for key, value in params.items() if value is not None}
+
+
+class HTTPConnectionManager:
+    """Share one pooled http client with keep-alive connections between all service clients.
+
+    Number of concurrent requests to the same host is limited separately, so one slow service cannot take all
+    connections from the pool. Should be used only from the shared event loop.
+    """
+
+    def __init__(
+        self, max_connections: int, max_connections_per_host: int, keepalive_expiry: float, timeout: float
+    ) -> None:
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self.max_connections_per_host = max_connections_per_host
+        self.host_semaphores: Dict[Tuple[str, Optional[int]], asyncio.Semaphore] = {}
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        parsed_url = httpx.URL(url)
+        host = (parsed_url.host, parsed_url.port)
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.max_connections_per_host)
+
+        return self.host_semaphores[host]
+
+    async def request(
+        self, method: str, url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> httpx.Response:
+        async with self._get_host_semaphore(url):
+            return await self.client.request(method, url, params=encode_params(params), **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def put(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request('PUT', url, **kwargs)
+
+    async def patch(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request('PATCH', url, **kwargs)
+
+    async def delete(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request('DELETE', url, **kwargs)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+@lru_cache(1)
+def get_connection_manager() -> HTTPConnectionManager:
+    settings = get_settings()
+    return HTTPConnectionManager(
+        settings.HTTP_MAX_CONNECTIONS,
+        settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+        settings.HTTP_KEEPALIVE_EXPIRY,
+        settings.HTTP_TIMEOUT,
+    )
+
+
+async def close_connection_manager_async() -> None:
+    """Close all pooled connections in the loop they were opened in, next use creates new connection manager."""
+
+    if get_connection_manager.cache_info().currsize:
+        await get_connection_manager().close()
+        get_connection_manager.cache_clear()
+
+
+def close_connection_manager() -> None:
+    """Close all pooled connections if connection manager was used."""
+
+    if get_connection_manager.cache_info().currsize:
+        run_coroutine(close_connection_manager_async())
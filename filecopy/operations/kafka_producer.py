@@ -12,14 +12,20 @@
 
 import asyncio
 import io
+import json
 import logging
 from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import List
 from typing import Optional
 
 from aiokafka import AIOKafkaProducer
-from fastavro import schema
+from fastavro import parse_schema
 from fastavro import schemaless_writer
 from operations.config import get_settings
+from operations.event_loop import run_coroutine
+from operations.metrics import measured
 from operations.models import Node
 
 logger = logging.getLogger(__name__)
@@ -27,16 +33,28 @@ ConfigClass = get_settings()
 
 
 class KafkaProducer:
+    """Send activity events without waiting for broker acknowledgement of each of them.
+
+    Delivery futures are collected and awaited every time max pending events count is reached. Delivery errors are
+    raised only on flush, so they never fail the unrelated file whose event reached the limit.
+    """
+
     endpoint = ConfigClass.KAFKA_URL
     topic = 'metadata.items.activity'
     schema = 'operations/item_activity_schema.avsc'
+    max_pending = 1000
     producer = None
+    parsed_schema = None
+    pending: Optional[List[asyncio.Future]] = None
+    delivery_errors: Optional[List[Exception]] = None
 
     @classmethod
     async def init_connection(self):
         if self.producer is None:
             logger.info('Initializing the kafka producer')
             self.producer = AIOKafkaProducer(bootstrap_servers=self.endpoint, enable_idempotence=True)
+            self.pending = []
+            self.delivery_errors = []
             try:
                 # Get cluster layout and initial topic/partition leadership information
                 await self.producer.start()
@@ -45,13 +63,61 @@ class KafkaProducer:
                 raise e
 
     @classmethod
-    def close_connection(self) -> None:
+    def get_schema(self) -> Dict[str, Any]:
+        """Return avro schema that is parsed only once."""
+
+        if self.parsed_schema is None:
+            with open(self.schema) as f:
+                self.parsed_schema = parse_schema(json.load(f))
+
+        return self.parsed_schema
+
+    @classmethod
+    def serialize(self, message: Dict[str, Any]) -> bytes:
+        """Validate and serialize message with schema that is parsed only once."""
+
+        buffer = io.BytesIO()
+        schemaless_writer(buffer, self.get_schema(), message)
+
+        return buffer.getvalue()
+
+    @classmethod
+    async def wait_for_delivery(self) -> None:
+        """Wait for delivery of all sent messages and keep delivery errors until flush."""
+
+        pending, self.pending = self.pending or [], []
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        self.delivery_errors = [*(self.delivery_errors or []), *errors]
+
+    @classmethod
+    @measured('kafka.flush')
+    async def flush(self) -> None:
+        """Wait for delivery of all sent messages and raise errors of all messages that were not delivered."""
+
+        await self.wait_for_delivery()
+
+        errors, self.delivery_errors = self.delivery_errors, []
+        if errors:
+            logger.error(f'Fail to deliver {len(errors)} messages')
+            raise Exception(f'Error when delivering messages to kafka: {errors}')
+
+    @classmethod
+    async def stop(self) -> None:
+        """Stop the producer in the loop it was started in."""
+
         if self.producer is not None:
             logger.info('Closing the kafka producer')
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(self.producer.stop())
+            producer, self.producer = self.producer, None
+            await producer.stop()
 
     @classmethod
+    def close_connection(self) -> None:
+        if self.producer is not None:
+            run_coroutine(self.stop())
+
+    @classmethod
+    @measured('kafka.send')
     async def create_file_operation_logs(
         self, input_file: Node, operation_type: str, operator: str, output_file: Optional[Node]
     ):
@@ -79,15 +145,13 @@ class KafkaProducer:
                 }
             ]
         try:
-            # Validate message
-            bio = io.BytesIO()
-            SCHEMA = schema.load_schema(self.schema)
-            schemaless_writer(bio, SCHEMA, message)
-
-            validated_message = bio.getvalue()
+            validated_message = self.serialize(message)
 
-            # Send message to kafka
-            await self.producer.send_and_wait(self.topic, validated_message)
+            # Send message to kafka, delivery is awaited on flush
+            self.pending.append(await self.producer.send(self.topic, validated_message))
         except Exception as e:
             logger.error(f'Fail to send message:{str(e)}')
             raise Exception(f'Error when validate and send message to kafka producer: {e}')
+
+        if len(self.pending) >= self.max_pending:
+            await self.wait_for_delivery()
@@ -12,31 +12,56 @@
 
 import asyncio
 import logging
+import threading
+import time
+from collections import defaultdict
+from functools import partial
 from pathlib import Path
+from typing import AbstractSet
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Set
+from typing import Tuple
 from typing import Union
 
+from operations.checkpoint import CheckpointJournal
 from operations.duplicated_file_names import DuplicatedFileNames
+from operations.event_loop import run_blocking
+from operations.event_loop import run_coroutine
 from operations.kafka_producer import KafkaProducer
+from operations.metrics import get_job_metrics
+from operations.metrics import measured
 from operations.minio_boto3_client import MinioBoto3Client
 from operations.models import Node
 from operations.models import NodeList
+from operations.models import TreeSnapshot
 from operations.models import get_timestamp
+from operations.pipeline import AsyncPipeline
 from operations.services.approval.client import ApprovalServiceClient
+from operations.services.approval.client import CopyStatusWriter
 from operations.services.approval.models import ApprovedApprovalEntities
 from operations.services.approval.models import CopyStatus
 from operations.services.audit_trail.client import AuditTrailServiceClient
 from operations.services.dataops.client import DataopsServiceClient
+from operations.services.dataops.client import ResourceKeys
+from operations.services.dataops.client import get_prefix_key
 from operations.services.lineage.client import LineageServiceClient
 from operations.services.metadata.client import MetadataServiceClient
+from operations.steps import StepGraph
 
 logger = logging.getLogger(__name__)
 
 
 class NodeManager:
-    """Base class for node manipulations that is used in the Traverser."""
+    """Base class for node manipulations that is used in the Traverser.
+
+    Async methods are used by the AsyncTraverser. By default they run blocking methods in the executor, so manager that
+    implements only blocking methods can be used by any traverser.
+    """
 
     def __init__(self, metadata_service_client: MetadataServiceClient) -> None:
         self.metadata_service_client = metadata_service_client
@@ -46,6 +71,11 @@ class NodeManager:
         nodes = self.metadata_service_client.get_nodes_tree(source_folder.id, False)
         return nodes
 
+    def get_subtree(self, source_folder: Node) -> NodeList:
+        """Return all nodes under current source folder recursively."""
+        nodes = self.metadata_service_client.get_subtree(source_folder)
+        return nodes
+
     def exclude_nodes(self, source_folder: Node, nodes: NodeList) -> Set[str]:
         """Return set of ids that should be excluded when copying from this source folder."""
 
@@ -61,6 +91,32 @@ class NodeManager:
 
         raise NotImplementedError
 
+    def flush(self) -> None:
+        """Finish processing that is still pending once all nodes are traversed."""
+
+    def flush_expired(self) -> None:
+        """Finish processing that is pending for too long, called periodically while nodes are traversed."""
+
+    async def get_tree_async(self, source_folder: Node) -> NodeList:
+        return await run_blocking(self.get_tree, source_folder)
+
+    async def get_subtree_async(self, source_folder: Node) -> NodeList:
+        return await run_blocking(self.get_subtree, source_folder)
+
+    async def process_file_async(self, source_file: Node, destination_folder: Union[Path, Node]) -> None:
+        await run_blocking(self.process_file, source_file, destination_folder)
+
+    async def process_folder_async(
+        self, source_folder: Node, destination_parent_folder: Union[Path, Node]
+    ) -> Union[Path, Node]:
+        return await run_blocking(self.process_folder, source_folder, destination_parent_folder)
+
+    async def flush_async(self) -> None:
+        await run_blocking(self.flush)
+
+    async def flush_expired_async(self) -> None:
+        await run_blocking(self.flush_expired)
+
 
 class BaseCopyManager(NodeManager):
     """Base manager for copying process with approved entities."""
@@ -71,12 +127,28 @@ class BaseCopyManager(NodeManager):
         approval_service_client: Optional[ApprovalServiceClient],
         approved_entities: Optional[ApprovedApprovalEntities],
         include_ids: Optional[Set[str]],
+        copy_status_batch_size: int = 1,
+        copy_status_flush_interval: float = 0,
+        checkpoint_journal: Optional[CheckpointJournal] = None,
     ) -> None:
         super().__init__(metadata_service_client)
 
         self.approval_service_client = approval_service_client
         self.approved_entities = approved_entities
         self.include_ids = include_ids
+        self.checkpoint_journal = checkpoint_journal
+
+        self.copy_status_writer = None
+        if approval_service_client:
+            self.copy_status_writer = CopyStatusWriter(
+                approval_service_client, copy_status_batch_size, copy_status_flush_interval
+            )
+
+    async def get_tree_async(self, source_folder: Node) -> NodeList:
+        return await self.metadata_service_client.async_client.get_nodes_tree(source_folder.id, False)
+
+    async def get_subtree_async(self, source_folder: Node) -> NodeList:
+        return await self.metadata_service_client.async_client.get_subtree(source_folder)
 
     def _is_node_approved(self, node: Node) -> bool:
         """Check if node geid is in a list of approved entities.
@@ -89,6 +161,17 @@ class BaseCopyManager(NodeManager):
 
         return node.id in self.approved_entities
 
+    def _is_node_copied(self, node: Node) -> bool:
+        """Check if node was already copied by previous run of the same job according to checkpoint journal."""
+
+        if self.checkpoint_journal is None:
+            return False
+
+        return node.id in self.checkpoint_journal
+
+    def _is_node_pending(self, node: Node) -> bool:
+        return self._is_node_approved(node) and not self._is_node_copied(node)
+
     def _update_approval_entity_copy_status_for_node(self, node: Node, copy_status: CopyStatus) -> None:
         """Update copy status field for approval entity related to node."""
 
@@ -100,7 +183,18 @@ class BaseCopyManager(NodeManager):
 
         approval_entity = self.approved_entities[node.id]
 
-        self.approval_service_client.update_copy_status(approval_entity, copy_status)
+        self.copy_status_writer.add(approval_entity, copy_status)
+
+    def _flush_copy_statuses(self) -> None:
+        if self.copy_status_writer:
+            self.copy_status_writer.flush()
+
+    def _flush_expired_copy_statuses(self) -> None:
+        if self.copy_status_writer:
+            self.copy_status_writer.flush_expired()
+
+    def flush_expired(self) -> None:
+        self._flush_expired_copy_statuses()
 
     def exclude_nodes(self, source_folder: Node, nodes: NodeList) -> Set[str]:
         """Return set of geids that should be excluded when copying from this source folder."""
@@ -150,8 +244,23 @@ class CopyManager(BaseCopyManager):
         pipeline_desc: str,
         operation_type: str,
         include_geids: Optional[Set[str]],
+        copy_concurrency: int = 1,
+        node_batch_size: int = 1,
+        copy_status_batch_size: int = 1,
+        copy_status_flush_interval: float = 0,
+        checkpoint_journal: Optional[CheckpointJournal] = None,
+        node_batch_max_age: float = 0,
+        max_pending_copies: int = 4,
     ) -> None:
-        super().__init__(metadata_service_client, approval_service_client, approved_entities, include_geids)
+        super().__init__(
+            metadata_service_client,
+            approval_service_client,
+            approved_entities,
+            include_geids,
+            copy_status_batch_size,
+            copy_status_flush_interval,
+            checkpoint_journal,
+        )
 
         self.lineage_service_client = lineage_service_client
         self.audit_trail_service_client = audit_trail_service_client
@@ -168,83 +277,248 @@ class CopyManager(BaseCopyManager):
         self.pipeline_desc = pipeline_desc
         self.operation_type = operation_type
 
-    def _create_file_metadata(self, source_node: Node, target_node: Node, new_node_version_id: str) -> None:
-        self._copy_zip_preview_info(source_node.id, target_node.id)
+        self.copy_concurrency = copy_concurrency
+        self.copy_semaphore: Optional[asyncio.Semaphore] = None
+        self.copy_pipeline = AsyncPipeline(max_pending=max_pending_copies)
 
-        namespace = self.core_zone_label.lower()
-        self.lineage_service_client.create_catalog_entity(target_node, self.operator, namespace)
+        self.node_batch_size = node_batch_size
+        self.node_batch_max_age = node_batch_max_age
+        self.pending_file_nodes: Dict[str, List[Tuple[Node, Dict[str, Any]]]] = defaultdict(list)
+        self.pending_file_nodes_started_at: Dict[str, float] = {}
 
-        self.audit_trail_service_client.create_lineage_v3(
-            source_node.id,
-            target_node.id,
-            source_node.name,
-            target_node.name,
-            self.project_code,
-            self.pipeline_name,
-            self.pipeline_desc,
-        )
+    async def _create_file_metadata(self, source_node: Node, target_node: Node, new_node_version_id: str) -> None:
+        """Run independent post-copy steps concurrently and update source node once all of them succeeded.
 
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(
-            KafkaProducer.create_file_operation_logs(source_node, self.operation_type, self.operator, target_node)
-        )
+        Zip preview creation waits only for its lookup.
+        """
 
+        namespace = self.core_zone_label.lower()
         update_json = {
             'system_tags': self.system_tags,
             'version': new_node_version_id,
         }
-        self.metadata_service_client.update_node(source_node, update_json)
 
-    def _copy_zip_preview_info(self, old_geid, new_geid) -> None:
+        graph = StepGraph()
+        graph.add('get_zip_preview', partial(self.dataops_client.async_client.get_zip_preview, source_node.id))
+        graph.add(
+            'create_zip_preview', partial(self._copy_zip_preview_info, target_node.id), depends_on=['get_zip_preview']
+        )
+        graph.add(
+            'create_catalog_entity',
+            partial(
+                self.lineage_service_client.async_client.create_catalog_entity, target_node, self.operator, namespace
+            ),
+        )
+        graph.add(
+            'create_lineage',
+            partial(
+                self.audit_trail_service_client.async_client.create_lineage_v3,
+                source_node.id,
+                target_node.id,
+                source_node.name,
+                target_node.name,
+                self.project_code,
+                self.pipeline_name,
+                self.pipeline_desc,
+            ),
+        )
+        graph.add(
+            'create_activity_log',
+            partial(
+                KafkaProducer.create_file_operation_logs, source_node, self.operation_type, self.operator, target_node
+            ),
+        )
+        graph.add(
+            'update_source_node',
+            lambda *_: self.metadata_service_client.async_client.update_node(source_node, update_json),
+            depends_on=['create_zip_preview', 'create_catalog_entity', 'create_lineage', 'create_activity_log'],
+        )
+
+        await graph.run()
+
+    async def _copy_zip_preview_info(self, new_geid: str, zip_preview: Optional[Dict[str, Any]]) -> None:
         """Transfer the saved preview info to copied one."""
 
-        response = self.dataops_client.get_zip_preview(old_geid)
-        if response is None:
+        if zip_preview is None:
             return
 
-        self.dataops_client.create_zip_preview(new_geid, response['result'])
+        await self.dataops_client.async_client.create_zip_preview(new_geid, zip_preview['result'])
 
-    def process_file(self, source_file: Node, destination_folder: Node) -> None:
-        if not self._is_node_approved(source_file):
-            return
+    async def _copy_file(self, source_file: Node, payload: Dict[str, Any]) -> None:
+        """Copy file object keeping limited number of copies in flight and chain node creation after it."""
+
+        if self.copy_semaphore is None:
+            self.copy_semaphore = asyncio.Semaphore(self.copy_concurrency)
 
+        with get_job_metrics().measure('copy.wait_for_slot'):
+            await self.copy_semaphore.acquire()
+        try:
+            version_id = await self.metadata_service_client.copy_file_object(source_file, payload, self.minio_client)
+        finally:
+            self.copy_semaphore.release()
+
+        payload['version'] = version_id
+
+        parent_id = payload['parent']
+        self.pending_file_nodes_started_at.setdefault(parent_id, time.monotonic())
+        self.pending_file_nodes[parent_id].append((source_file, payload))
+        if len(self.pending_file_nodes[parent_id]) >= self.node_batch_size:
+            await self._create_pending_file_nodes([parent_id])
+
+    @measured('copy.complete_file')
+    def _complete_file(self, source_file: Node, node: Node, version_id: str) -> None:
+        """Mark source file as copied in approval entities and in checkpoint journal."""
+
+        self._update_approval_entity_copy_status_for_node(source_file, CopyStatus.COPIED)
+
+        if self.checkpoint_journal is not None:
+            self.checkpoint_journal.record(source_file.id, node.id, version_id)
+
+    async def _create_file_node(self, source_file: Node, node: Node, version_id: str) -> None:
+        """Create all related metadata for already created file node."""
+
+        await self._create_file_metadata(source_file, node, version_id)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._complete_file, source_file, node, version_id)
+
+    @measured('copy.create_file_nodes')
+    async def _create_file_nodes(self, batch: List[Tuple[Node, Dict[str, Any]]]) -> None:
+        """Create nodes for batch of already copied files from one destination folder with one bulk request."""
+
+        payloads = [payload for _, payload in batch]
+        nodes = await self.metadata_service_client.async_client.create_nodes(payloads, self.node_batch_size)
+
+        results = await asyncio.gather(
+            *(
+                self._create_file_node(source_file, node, payload['version'])
+                for (source_file, payload), node in zip(batch, nodes)
+            ),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise Exception(errors)
+
+    async def _create_pending_file_nodes(self, parent_ids: Optional[List[str]] = None) -> None:
+        """Create nodes for copied files waiting in batches of given destination folders or in all batches."""
+
+        if parent_ids is None:
+            parent_ids = list(self.pending_file_nodes)
+
+        batches = []
+        for parent_id in parent_ids:
+            batches.append(self.pending_file_nodes.pop(parent_id))
+            del self.pending_file_nodes_started_at[parent_id]
+
+        results = await asyncio.gather(*(self._create_file_nodes(batch) for batch in batches), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise Exception(errors)
+
+    def _skip_copied_file(self, source_file: Node) -> None:
+        logger.info(f'Skipping source file "{source_file}" that was already copied according to checkpoint journal.')
+        self._update_approval_entity_copy_status_for_node(source_file, CopyStatus.COPIED)
+
+    def _get_file_node_payload(self, source_file: Node, destination_folder: Node) -> Dict[str, Any]:
         logger.info(f'Processing source file "{source_file}" against destination folder "{destination_folder}".')
         destination_filename = self.duplicated_files.get(source_file.display_path, source_file.name)
 
-        node, version_id = self.metadata_service_client.create_file_node(
+        return self.metadata_service_client.get_file_node_payload(
             self.project_code,
             source_file,
             destination_folder,
             destination_folder.display_path,
-            self.minio_client,
             source_file.tags,
             source_file.get_attributes(),
             new_name=destination_filename,
             system_tags=self.system_tags,
         )
 
-        self._create_file_metadata(source_file, node, version_id)
+    def process_file(self, source_file: Node, destination_folder: Node) -> None:
+        if not self._is_node_approved(source_file):
+            return
 
-        self._update_approval_entity_copy_status_for_node(source_file, CopyStatus.COPIED)
+        if self._is_node_copied(source_file):
+            self._skip_copied_file(source_file)
+            return
+
+        payload = self._get_file_node_payload(source_file, destination_folder)
+        self.copy_pipeline.submit(self._copy_file(source_file, payload))
+
+    async def process_file_async(self, source_file: Node, destination_folder: Node) -> None:
+        if not self._is_node_approved(source_file):
+            return
+
+        if self._is_node_copied(source_file):
+            await run_blocking(self._skip_copied_file, source_file)
+            return
+
+        payload = self._get_file_node_payload(source_file, destination_folder)
+        await self._copy_file(source_file, payload)
 
     def process_folder(self, source_folder: Node, destination_parent_folder: Node) -> Node:
+        return run_coroutine(self.process_folder_async(source_folder, destination_parent_folder))
+
+    async def process_folder_async(self, source_folder: Node, destination_parent_folder: Node) -> Node:
         logger.info(
             f'Processing source folder "{source_folder}" '
             f'against destination parent folder "{destination_parent_folder}".'
         )
         destination_folder_path = destination_parent_folder.display_path / source_folder.name
-        node = self.metadata_service_client.get_node(self.core_zone_label, self.project_code, destination_folder_path)
+        node = await self.metadata_service_client.async_client.get_node(
+            self.core_zone_label, self.project_code, destination_folder_path
+        )
         if not node:
-            node = self.metadata_service_client.create_folder_node(
+            payload = self.metadata_service_client.get_folder_node_payload(
                 self.project_code,
                 source_folder,
                 destination_parent_folder,
                 source_folder.tags,
                 system_tags=self.system_tags,
             )
+            node = await self.metadata_service_client.async_client.create_node_with_parent(payload)
 
         return node
 
+    def flush(self) -> None:
+        run_coroutine(self.flush_async())
+
+    def flush_expired(self) -> None:
+        run_coroutine(self.flush_expired_async())
+
+    async def flush_expired_async(self) -> None:
+        """Create nodes for batches that wait longer than max age, so copied files are not lost on crash.
+
+        Copy statuses of completed files are written afterwards when their flush interval has passed.
+        """
+
+        expired_at = time.monotonic() - self.node_batch_max_age
+        started_at = self.pending_file_nodes_started_at
+        try:
+            await self._create_pending_file_nodes(
+                [parent_id for parent_id in started_at if started_at[parent_id] <= expired_at]
+            )
+        finally:
+            await run_blocking(self._flush_expired_copy_statuses)
+
+    async def flush_async(self) -> None:
+        """Wait until all scheduled file copies are finished and write everything that is still buffered."""
+
+        errors = await run_blocking(self.copy_pipeline.wait)
+        for finish in (
+            self._create_pending_file_nodes,
+            partial(run_blocking, self._flush_copy_statuses),
+            KafkaProducer.flush,
+        ):
+            try:
+                await finish()
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            raise Exception(errors)
+
 
 class CopyPreparationManager(BaseCopyManager):
     """Manager to prepare data before start of copying process."""
@@ -260,8 +534,15 @@ class CopyPreparationManager(BaseCopyManager):
         source_bucket: Path,
         destination_bucket: Path,
         include_geids: Optional[Set[str]],
+        checkpoint_journal: Optional[CheckpointJournal] = None,
     ) -> None:
-        super().__init__(metadata_service_client, approval_service_client, approved_entities, include_geids)
+        super().__init__(
+            metadata_service_client,
+            approval_service_client,
+            approved_entities,
+            include_geids,
+            checkpoint_journal=checkpoint_journal,
+        )
 
         self.project_code = project_code
         self.source_zone = source_zone
@@ -270,22 +551,68 @@ class CopyPreparationManager(BaseCopyManager):
         self.destination_bucket = destination_bucket
 
         self.duplicated_files = DuplicatedFileNames()
-        self.read_lock_paths = []
-        self.write_lock_paths = []
+
+        self.destination_names: Dict[Path, Set[str]] = {}
+        self.destination_names_lock = threading.Lock()
+        self.destination_path_locks: Dict[Path, threading.Lock] = {}
+        self.destination_names_fetches: Dict[Path, asyncio.Future] = {}
+
+    def _get_destination_names(self, destination_path: Path) -> Set[str]:
+        """Return names of nodes that already exist in destination folder fetching them once per folder.
+
+        Fetch is done under lock of the folder only, so lookups of different folders run in parallel.
+        """
+
+        with self.destination_names_lock:
+            path_lock = self.destination_path_locks.setdefault(destination_path, threading.Lock())
+
+        with path_lock:
+            if destination_path not in self.destination_names:
+                self.destination_names[destination_path] = self.metadata_service_client.get_child_names(
+                    self.destination_zone, self.project_code, destination_path
+                )
+
+            return self.destination_names[destination_path]
+
+    async def _get_destination_names_async(self, destination_path: Path) -> Set[str]:
+        """Return names of nodes that already exist in destination folder fetching them once per folder.
+
+        Failed fetch is forgotten, so the next file in the same folder retries it.
+        """
+
+        fetch = self.destination_names_fetches.get(destination_path)
+        if fetch is None:
+            fetch = asyncio.ensure_future(
+                self.metadata_service_client.async_client.get_child_names(
+                    self.destination_zone, self.project_code, destination_path
+                )
+            )
+            self.destination_names_fetches[destination_path] = fetch
+
+        try:
+            return await fetch
+        except Exception:
+            if self.destination_names_fetches.get(destination_path) is fetch:
+                del self.destination_names_fetches[destination_path]
+            raise
+
+    def _check_duplicated_file(self, source_file: Node, destination_names: Set[str]) -> None:
+        if source_file.name in destination_names:
+            self.duplicated_files.add(source_file.display_path)
 
     def process_file(self, source_file: Node, destination_path: Path) -> None:
-        if not self._is_node_approved(source_file):
+        if not self._is_node_pending(source_file):
             return
         logger.info(f'Processing source file "{source_file}" against destination path "{destination_path}".')
 
-        source_filepath = self.source_bucket / source_file.display_path
-        destination_filepath = self.destination_bucket / destination_path / source_file.name
-        destination_path = destination_path / source_file.name
-        if self.metadata_service_client.is_file_exists(self.destination_zone, self.project_code, destination_path):
-            source_file['name'] = self.duplicated_files.add(source_file.display_path)
-            destination_filepath = self.destination_bucket / destination_path / source_file.name
-        self.read_lock_paths.append(source_filepath)
-        self.write_lock_paths.append(destination_filepath)
+        self._check_duplicated_file(source_file, self._get_destination_names(destination_path))
+
+    async def process_file_async(self, source_file: Node, destination_path: Path) -> None:
+        if not self._is_node_pending(source_file):
+            return
+        logger.info(f'Processing source file "{source_file}" against destination path "{destination_path}".')
+
+        self._check_duplicated_file(source_file, await self._get_destination_names_async(destination_path))
 
     def process_folder(self, source_folder: Node, destination_parent_path: Path) -> Path:
         logger.info(
@@ -293,13 +620,114 @@ class CopyPreparationManager(BaseCopyManager):
             f'against destination parent path "{destination_parent_path}".'
         )
 
-        source_path = self.source_bucket / source_folder.display_path
-        destination_path = self.destination_bucket / destination_parent_path / source_folder.name
+        return destination_parent_path / source_folder.name
+
+    async def process_folder_async(self, source_folder: Node, destination_parent_path: Path) -> Path:
+        return self.process_folder(source_folder, destination_parent_path)
 
-        self.read_lock_paths.append(source_path)
-        self.write_lock_paths.append(destination_path)
+    async def flush_async(self) -> None:
+        self.flush()
 
-        return destination_parent_path / source_folder.name
+    def _iter_lock_keys(
+        self,
+        snapshot: TreeSnapshot,
+        source_folder: Node,
+        destination_path: Path,
+        pending_file_ids: AbstractSet[str],
+        complete_folder_ids: AbstractSet[str],
+    ) -> Iterator[Tuple[str, str]]:
+        """Yield read lock key of source node and write lock key of destination node for every processed node.
+
+        Folders from complete folder ids are yielded as prefix keys covering their whole subtree. Only pending files
+        are locked, so files that were already copied according to checkpoint journal are not locked again.
+        """
+
+        for source_entry in snapshot.get_children(source_folder):
+            if source_entry.is_folder:
+                source_key = source_entry.paths.in_bucket(self.source_bucket)
+                destination_key = f'{self.destination_bucket}/{destination_path}/{source_entry.name}'
+                if source_entry.id in complete_folder_ids:
+                    yield get_prefix_key(source_key), get_prefix_key(destination_key)
+                    continue
+
+                yield source_key, destination_key
+                yield from self._iter_lock_keys(
+                    snapshot, source_entry, destination_path / source_entry.name, pending_file_ids, complete_folder_ids
+                )
+            elif source_entry.id in pending_file_ids:
+                destination_filename = self.duplicated_files.get(source_entry.display_path, source_entry.name)
+                yield (
+                    source_entry.paths.in_bucket(self.source_bucket),
+                    f'{self.destination_bucket}/{destination_path}/{destination_filename}',
+                )
+
+    def _get_pending_file_ids(self, snapshot: TreeSnapshot) -> FrozenSet[str]:
+        """Return ids of files that are still pending at the moment keys are requested.
+
+        Checkpoint journal is updated while files are copied, so pending files are taken once to unlock exactly the
+        same keys that were locked.
+        """
+
+        return frozenset(node.id for node in snapshot if node.is_file and self._is_node_pending(node))
+
+    def _get_complete_folder_ids(
+        self, snapshot: TreeSnapshot, source_folder: Node, pending_file_ids: AbstractSet[str], prefixes: bool
+    ) -> Set[str]:
+        if not prefixes:
+            return set()
+
+        return snapshot.get_complete_folder_ids(source_folder, lambda node: node.id in pending_file_ids)
+
+    def get_read_lock_keys(
+        self, snapshot: TreeSnapshot, source_folder: Node, destination_path: Path, prefixes: bool = False
+    ) -> ResourceKeys:
+        """Return stream of source keys that should be locked for reading from the traversed tree snapshot.
+
+        With prefixes enabled the minimal set of keys is returned, where fully copied folders are locked with one
+        prefix key.
+        """
+
+        pending_file_ids = self._get_pending_file_ids(snapshot)
+        complete_folder_ids = self._get_complete_folder_ids(snapshot, source_folder, pending_file_ids, prefixes)
+        return ResourceKeys(
+            lambda: (
+                read_key
+                for read_key, _ in self._iter_lock_keys(
+                    snapshot, source_folder, destination_path, pending_file_ids, complete_folder_ids
+                )
+            )
+        )
+
+    def get_write_lock_keys(
+        self, snapshot: TreeSnapshot, source_folder: Node, destination_path: Path, prefixes: bool = False
+    ) -> ResourceKeys:
+        """Return stream of destination keys that should be locked for writing from the traversed tree snapshot.
+
+        With prefixes enabled the minimal set of keys is returned, where fully copied folders are locked with one
+        prefix key.
+        """
+
+        pending_file_ids = self._get_pending_file_ids(snapshot)
+        complete_folder_ids = self._get_complete_folder_ids(snapshot, source_folder, pending_file_ids, prefixes)
+        return ResourceKeys(
+            lambda: (
+                write_key
+                for _, write_key in self._iter_lock_keys(
+                    snapshot, source_folder, destination_path, pending_file_ids, complete_folder_ids
+                )
+            )
+        )
+
+
+class ArchiveReport(dict):
+    """Store error message of every node that was not moved into trash bin and None for moved nodes."""
+
+    @property
+    def failed(self) -> Dict[str, str]:
+        return {node_id: error for node_id, error in self.items() if error is not None}
+
+    def __str__(self) -> str:
+        return f'Archived {len(self) - len(self.failed)} of {len(self)} nodes, failed: {self.failed}'
 
 
 class DeleteManager(NodeManager):
@@ -320,6 +748,8 @@ class DeleteManager(NodeManager):
         pipeline_desc: str,
         operation_type: str,
         include_geids: Optional[Set[str]],
+        included_nodes: Optional[NodeList] = None,
+        archive_concurrency: int = 1,
     ) -> None:
         super().__init__(metadata_service_client)
 
@@ -337,6 +767,8 @@ class DeleteManager(NodeManager):
         self.pipeline_desc = pipeline_desc
         self.operation_type = operation_type
         self.include_geids = include_geids
+        self.included_nodes = included_nodes
+        self.archive_concurrency = archive_concurrency
 
     def exclude_nodes(self, source_folder: Node, nodes: NodeList) -> Set[str]:
         if self.include_geids is None:
@@ -358,15 +790,90 @@ class DeleteManager(NodeManager):
             f'against destination parent folder "{destination_parent_folder}".'
         )
 
-    def archive_nodes(self) -> None:
-        for node_id in self.include_geids:
-            logger.info(f'Move the node "{node_id}" into trashbin recursively')
-            node = self.metadata_service_client.get_item_by_id(node_id)
-            self.metadata_service_client.archived_node(node, self.minio_client, self.operation_type, self.operator)
+    async def _get_node(self, node_id: str, semaphore: asyncio.Semaphore) -> Node:
+        async with semaphore:
+            nodes = await self.metadata_service_client.async_client.get_items_by_ids([node_id], allow_missing=True)
+
+        if node_id not in nodes:
+            raise Exception(f'Node "{node_id}" is not found.')
+
+        return nodes[node_id]
+
+    async def _get_nodes(self, node_ids: List[str]) -> Dict[str, Union[Node, Exception]]:
+        """Return node or lookup error for every id.
+
+        Nodes fetched during preparation are reused and only ids that failed to resolve are fetched again one by one,
+        so one missing or already trashed node does not prevent archiving of the others.
+        """
 
+        if self.included_nodes is None:
+            nodes = await self.metadata_service_client.async_client.get_items_by_ids(node_ids, allow_missing=True)
+            self.included_nodes = NodeList(list(nodes.values()))
 
-class DeletePreparationManager(NodeManager):
-    """Manager to prepare data before start of deleting process."""
+        nodes: Dict[str, Union[Node, Exception]] = {node.id: node for node in self.included_nodes}
+        unresolved_ids = [node_id for node_id in node_ids if node_id not in nodes]
+        if not unresolved_ids:
+            return nodes
+
+        logger.warning(f'Getting unresolved included nodes {unresolved_ids} one by one.')
+        semaphore = asyncio.Semaphore(self.archive_concurrency)
+        results = await asyncio.gather(
+            *(self._get_node(node_id, semaphore) for node_id in unresolved_ids), return_exceptions=True
+        )
+        nodes.update(zip(unresolved_ids, results))
+
+        return nodes
+
+    async def _archive_node(self, node: Union[Node, Exception], semaphore: asyncio.Semaphore) -> Optional[str]:
+        """Move one node into trash bin and return error message when it fails or node could not be fetched."""
+
+        if isinstance(node, Exception):
+            return f'Unable to get node: {node}'
+
+        async with semaphore:
+            logger.info(f'Move the node "{node.id}" into trashbin recursively')
+            try:
+                with get_job_metrics().measure('delete.archive_node'):
+                    await self.metadata_service_client.archive_node(
+                        node, self.minio_client, self.operation_type, self.operator
+                    )
+            except Exception as e:
+                logger.exception(f'Unable to move the node "{node.id}" into trashbin.')
+                return str(e)
+
+        return None
+
+    async def archive_nodes_async(self) -> ArchiveReport:
+        """Move all included nodes into trash bin concurrently and return report with result for every node."""
+
+        if not self.include_geids:
+            logger.warning('There are no included nodes to move into trash bin.')
+            return ArchiveReport()
+
+        node_ids = sorted(self.include_geids)
+        nodes = await self._get_nodes(node_ids)
+
+        semaphore = asyncio.Semaphore(self.archive_concurrency)
+
+        errors = await asyncio.gather(*(self._archive_node(nodes[node_id], semaphore) for node_id in node_ids))
+
+        await KafkaProducer.flush()
+
+        report = ArchiveReport(zip(node_ids, errors))
+        logger.info(str(report))
+
+        return report
+
+    def archive_nodes(self) -> ArchiveReport:
+        return run_coroutine(self.archive_nodes_async())
+
+
+class DeletePreparationManager:
+    """Manager to prepare data before start of deleting process.
+
+    Only included nodes are deleted, so lock keys are collected for them and nodes under them without traversing the
+    source folder.
+    """
 
     def __init__(
         self,
@@ -376,42 +883,60 @@ class DeletePreparationManager(NodeManager):
         source_bucket: Path,
         include_geids: Optional[Set[str]],
     ) -> None:
-        super().__init__(metadata_service_client)
-
+        self.metadata_service_client = metadata_service_client
         self.project_code = project_code
         self.source_zone = source_zone
         self.source_bucket = source_bucket
         self.include_geids = include_geids
 
-        self.duplicated_files = DuplicatedFileNames()
-        self.write_lock_paths = []
-
-    def exclude_nodes(self, source_folder: Node, nodes: NodeList) -> Set[str]:
-        if self.include_geids is None:
-            return set()
+    def get_included_nodes(self) -> NodeList:
+        """Return included nodes fetched with one batch request.
 
-        if not self.include_geids.issubset(nodes.ids):
-            return set()
+        Ids that are not found are left out, so they are reported by delete manager instead of aborting the job.
+        """
 
-        excluded_geids = nodes.ids.difference(self.include_geids)
+        if not self.include_geids:
+            return NodeList([])
 
-        return excluded_geids
+        nodes = self.metadata_service_client.get_items_by_ids(sorted(self.include_geids), allow_missing=True)
+        missing_ids = self.include_geids.difference(nodes)
+        if missing_ids:
+            logger.warning(f'Unable to find included nodes {sorted(missing_ids)}.')
 
-    def process_file(self, source_file: Node, destination_path: Path) -> None:
-        logger.info(f'Processing source file "{source_file}" against destination path "{destination_path}".')
+        return NodeList(list(nodes.values()))
 
-        source_filepath = self.source_bucket / source_file.display_path
+    async def _get_subtrees(self, folders: List[Node]) -> Dict[str, NodeList]:
+        """Return nodes under every folder fetching subtrees of all folders concurrently.
 
-        self.write_lock_paths.append(source_filepath)
+        Every folder is searched on its own, so nodes of folders that are not included are never fetched.
+        """
 
-    def process_folder(self, source_folder: Node, destination_parent_path: Path) -> Path:
-        logger.info(
-            f'Processing source folder "{source_folder}" '
-            f'against destination parent path "{destination_parent_path}".'
+        subtrees = await asyncio.gather(
+            *(self.metadata_service_client.async_client.get_subtree(folder) for folder in folders)
         )
 
-        source_path = self.source_bucket / source_folder.display_path
+        return {folder.id: subtree for folder, subtree in zip(folders, subtrees)}
+
+    def _iter_lock_keys(self, nodes: NodeList, subtrees: Dict[str, NodeList], prefixes: bool) -> Iterator[str]:
+        for node in nodes:
+            key = node.paths.in_bucket(self.source_bucket)
+            if node.is_folder and prefixes:
+                yield get_prefix_key(key)
+                continue
+
+            yield key
+            for child in subtrees.get(node.id, ()):
+                yield child.paths.in_bucket(self.source_bucket)
+
+    def get_write_lock_keys(self, nodes: NodeList, prefixes: bool = False) -> ResourceKeys:
+        """Return stream of keys of included nodes and all nodes under them that should be locked for writing.
+
+        Nodes under included folders are fetched with one concurrent recursive search per folder. With prefixes enabled
+        included folders are locked with one prefix key and nothing else is fetched.
+        """
 
-        self.write_lock_paths.append(source_path)
+        subtrees = {}
+        if not prefixes:
+            subtrees = run_coroutine(self._get_subtrees([node for node in nodes if node.is_folder]))
 
-        return destination_parent_path
+        return ResourceKeys(lambda: self._iter_lock_keys(nodes, subtrees, prefixes))
@@ -0,0 +1,268 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Sequence
+from typing import Union
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+METRICS_PREFIX = 'filecopy'
+
+logger = logging.getLogger(__name__)
+
+
+class OperationMetrics:
+    """Store call count, errors, moved bytes and latency histogram of one operation type."""
+
+    __slots__ = ('buckets', 'calls', 'errors', 'bytes', 'latency_sum', 'latency_max', 'bucket_counts')
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.bucket_counts = [0] * (len(buckets) + 1)
+
+    def record(self, latency: float, size: int, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.bytes += size
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+
+        for index, bound in enumerate(self.buckets):
+            if latency <= bound:
+                self.bucket_counts[index] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+
+    def get_cumulative_buckets(self) -> Dict[str, int]:
+        """Return number of calls not slower than each bucket bound the same way prometheus histograms count them."""
+
+        cumulative = {}
+        total = 0
+        for bound, count in zip([*map(str, self.buckets), '+Inf'], self.bucket_counts):
+            total += count
+            cumulative[bound] = total
+
+        return cumulative
+
+    def get_quantile(self, quantile: float) -> float:
+        """Return upper bound of the bucket containing quantile, or max latency for the last bucket."""
+
+        rank = quantile * self.calls
+        total = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.latency_max)
+
+        return self.latency_max
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'latency': {
+                'sum': round(self.latency_sum, 6),
+                'mean': round(self.latency_sum / self.calls, 6) if self.calls else 0.0,
+                'max': round(self.latency_max, 6),
+                'p50': round(self.get_quantile(0.5), 6),
+                'p95': round(self.get_quantile(0.95), 6),
+                'p99': round(self.get_quantile(0.99), 6),
+                'buckets': self.get_cumulative_buckets(),
+            },
+        }
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    return ','.join(f'{name}="{escape_label_value(str(value))}"' for name, value in labels.items())
+
+
+class JobMetrics:
+    """Collect metrics of operations performed by one job.
+
+    Operations are recorded from the event loop as well as from worker threads, so all updates are done under lock.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.operations: Dict[str, OperationMetrics] = {}
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+
+    def record(self, operation: str, latency: float, size: int = 0, failed: bool = False) -> None:
+        with self.lock:
+            if operation not in self.operations:
+                self.operations[operation] = OperationMetrics(self.buckets)
+            self.operations[operation].record(latency, size, failed)
+
+    @contextmanager
+    def measure(self, operation: str, size: int = 0) -> Iterator[None]:
+        """Record latency of the wrapped block, block that raises an exception is recorded as failed call.
+
+        Size is counted as moved bytes only when the block succeeds.
+        """
+
+        started_at = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record(operation, time.perf_counter() - started_at, 0 if failed else size, failed)
+
+    def get_duration(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def summary(self) -> Dict[str, Any]:
+        """Return job duration in seconds and metrics of each operation type sorted by total latency."""
+
+        with self.lock:
+            operations = sorted(self.operations.items(), key=lambda item: item[1].latency_sum, reverse=True)
+            return {
+                'duration': round(self.get_duration(), 6),
+                'operations': {operation: metrics.summary() for operation, metrics in operations},
+            }
+
+    def to_json(self, **labels: str) -> str:
+        return json.dumps({**labels, **self.summary()})
+
+    def format_prometheus(self, **labels: str) -> str:
+        """Return metrics in prometheus text exposition format accepted by textfile collector and pushgateway."""
+
+        lines: List[str] = []
+
+        def add_metric(name: str, type_: str, description: str, samples: List[str]) -> None:
+            lines.append(f'# HELP {METRICS_PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {METRICS_PREFIX}_{name} {type_}')
+            lines.extend(samples)
+
+        job_labels = format_labels(labels)
+        add_metric(
+            'job_duration_seconds',
+            'gauge',
+            'Duration of the job.',
+            [f'{METRICS_PREFIX}_job_duration_seconds{{{job_labels}}} {self.get_duration():.6f}'],
+        )
+
+        with self.lock:
+            operations = sorted(self.operations.items())
+            samples = {'calls': [], 'errors': [], 'bytes': [], 'latency': []}
+            for operation, metrics in operations:
+                operation_labels = format_labels({**labels, 'operation': operation})
+                samples['calls'].append(f'{METRICS_PREFIX}_operation_calls_total{{{operation_labels}}} {metrics.calls}')
+                samples['errors'].append(
+                    f'{METRICS_PREFIX}_operation_errors_total{{{operation_labels}}} {metrics.errors}'
+                )
+                samples['bytes'].append(f'{METRICS_PREFIX}_operation_bytes_total{{{operation_labels}}} {metrics.bytes}')
+                for bound, count in metrics.get_cumulative_buckets().items():
+                    samples['latency'].append(
+                        f'{METRICS_PREFIX}_operation_latency_seconds_bucket{{{operation_labels},le="{bound}"}} {count}'
+                    )
+                samples['latency'].append(
+                    f'{METRICS_PREFIX}_operation_latency_seconds_sum{{{operation_labels}}} {metrics.latency_sum:.6f}'
+                )
+                samples['latency'].append(
+                    f'{METRICS_PREFIX}_operation_latency_seconds_count{{{operation_labels}}} {metrics.calls}'
+                )
+
+        add_metric('operation_calls_total', 'counter', 'Number of calls of the operation.', samples['calls'])
+        add_metric('operation_errors_total', 'counter', 'Number of failed calls of the operation.', samples['errors'])
+        add_metric('operation_bytes_total', 'counter', 'Number of bytes moved by the operation.', samples['bytes'])
+        add_metric('operation_latency_seconds', 'histogram', 'Latency of the operation.', samples['latency'])
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus_textfile(self, path: Union[Path, str], **labels: str) -> None:
+        """Write metrics into textfile replacing it atomically, so collector never reads partially written file."""
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'.{path.name}.{os.getpid()}')
+        temp_path.write_text(self.format_prometheus(**labels))
+        os.replace(temp_path, path)
+
+
+job_metrics = JobMetrics()
+
+
+def get_job_metrics() -> JobMetrics:
+    """Return metrics of the currently running job."""
+
+    return job_metrics
+
+
+def reset_job_metrics() -> JobMetrics:
+    """Start collecting metrics of a new job."""
+
+    global job_metrics
+
+    job_metrics = JobMetrics()
+    return job_metrics
+
+
+def measured(operation: str) -> Callable:
+    """Decorate sync or async function to record its calls in metrics of the running job."""
+
+    def decorator(function: Callable) -> Callable:
+        if inspect.iscoroutinefunction(function):
+
+            @wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with get_job_metrics().measure(operation):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with get_job_metrics().measure(operation):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def export_job_metrics(textfile: str = '', **labels: str) -> str:
+    """Return json summary of the running job metrics and write them into prometheus textfile when its path is set."""
+
+    metrics = get_job_metrics()
+    if textfile:
+        try:
+            metrics.write_prometheus_textfile(textfile, **labels)
+        except OSError:
+            logger.exception(f'Unable to write job metrics into textfile "{textfile}".')
+
+    return metrics.to_json(**labels)
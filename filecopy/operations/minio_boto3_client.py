@@ -11,15 +11,179 @@
 # If not, see http://www.gnu.org/licenses/.
 
 import asyncio
+import io
 import logging
 import math
+import mmap
 import os
+from contextlib import asynccontextmanager
+from typing import Any
+from typing import AsyncIterator
+from typing import Coroutine
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
 
+import aioboto3
+from botocore.client import Config
 from common.object_storage_adaptor.boto3_client import Boto3Client
 from common.object_storage_adaptor.boto3_client import get_boto3_client
+from operations.event_loop import run_coroutine
+from operations.metrics import measured
 
 logger = logging.getLogger(__name__)
 
+S3_SIGNATURE_VERSION = 's3v4'
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS_COUNT = 10000
+COPY_PART_SIZE = 512 * 1024 * 1024
+COPY_PARTS_CONCURRENCY = 8
+UPLOAD_PART_SIZE = 16 * 1024 * 1024
+UPLOAD_PARTS_CONCURRENCY = 4
+UPLOAD_PART_RETRIES = 3
+UPLOAD_RETRY_DELAY = 1
+RELEASE_PAGES_SIZE = 4 * 1024 * 1024
+RELAY_PART_SIZE = 64 * 1024 * 1024
+RELAY_PARTS_CONCURRENCY = 4
+RELAY_CHUNK_SIZE = 1024 * 1024
+DELETE_OBJECTS_CHUNK_SIZE = 1000
+DELETE_OBJECTS_CONCURRENCY = 4
+
+
+def get_part_size(size: int, preferred_part_size: int) -> int:
+    """Return part size closest to preferred one that allows to fit object of given size into max parts count."""
+
+    part_size = max(preferred_part_size, math.ceil(size / MAX_PARTS_COUNT), MIN_PART_SIZE)
+
+    return min(part_size, MAX_PART_SIZE)
+
+
+def get_part_ranges(size: int, part_size: int) -> List[Tuple[int, int, int]]:
+    """Return part number with first and last byte positions for each part of object with given size."""
+
+    return [
+        (part_number, start, min(start + part_size, size) - 1)
+        for part_number, start in enumerate(range(0, size, part_size), start=1)
+    ]
+
+
+async def gather_parts(coroutines: Iterable[Coroutine]) -> List[Any]:
+    """Run part coroutines concurrently and cancel the remaining ones as soon as any of them fails."""
+
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def release_pages(mapped: mmap.mmap, start: int, end: int) -> None:
+    """Tell kernel that pages of already read range are not needed anymore to keep resident memory flat."""
+
+    if not hasattr(mapped, 'madvise') or not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+
+    start = start - start % mmap.PAGESIZE
+    length = end + 1 - start
+    if length > 0:
+        mapped.madvise(mmap.MADV_DONTNEED, start, length)
+
+
+class PartReader(io.RawIOBase):
+    """Read-only seekable file object over memory view of one part.
+
+    Reads return chunks sliced from the view, so part content is never copied into a single buffer and http client
+    streams it straight from the memory mapped file. When mapping is provided pages that were already read are
+    released, they are loaded again from page cache if part is read once more.
+    """
+
+    def __init__(self, view: memoryview, mapped: Optional[mmap.mmap] = None, offset: int = 0) -> None:
+        self.view = view
+        self.mapped = mapped
+        self.offset = offset
+        self.position = 0
+        self.released = 0
+
+    def __len__(self) -> int:
+        return self.view.nbytes
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.view.nbytes
+        self.position = max(0, offset)
+        self.released = min(self.released, self.position)
+        return self.position
+
+    def _release_read_pages(self, force: bool = False) -> None:
+        if self.mapped is None or self.position <= self.released:
+            return
+        if force or self.position - self.released >= RELEASE_PAGES_SIZE:
+            release_pages(self.mapped, self.offset + self.released, self.offset + self.position - 1)
+            self.released = self.position
+
+    def readinto(self, buffer: Any) -> int:
+        chunk = self.view[self.position : self.position + len(buffer)]  # noqa: E203
+        size = chunk.nbytes
+        buffer[:size] = chunk
+        self.position += size
+        self._release_read_pages()
+        return size
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = self.view.nbytes if size is None or size < 0 else self.position + size
+        chunk = self.view[self.position : end].tobytes()  # noqa: E203
+        self.position += len(chunk)
+        self._release_read_pages()
+        return chunk
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.position = self.view.nbytes
+            self._release_read_pages(force=True)
+            self.view.release()
+        super().close()
+
+
+class RingBuffer:
+    """Fixed set of reusable part buffers handed out in turns, so memory never grows above slots times slot size."""
+
+    def __init__(self, slots: int, slot_size: int) -> None:
+        self.slots = [bytearray(slot_size) for _ in range(slots)]
+        self.free = asyncio.Queue()
+        for slot in self.slots:
+            self.free.put_nowait(slot)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[bytearray]:
+        """Wait for free slot and return it back to the ring once it is not used anymore."""
+
+        slot = await self.free.get()
+        try:
+            yield slot
+        finally:
+            self.free.put_nowait(slot)
+
 
 class MinioBoto3Client:
     def __init__(self, access_key: str, secret_key: str, minio_endpoint: str, minio_https: str) -> None:
@@ -28,10 +192,11 @@ class MinioBoto3Client:
         self.minio_endpoint = minio_endpoint
         self.minio_https = minio_https
         self.client = self.connect_to_minio()
+        self.session = aioboto3.Session(aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+        self.endpoint_url = ('https://' if minio_https else 'http://') + minio_endpoint
 
     def connect_to_minio(self) -> Boto3Client:
-        loop = asyncio.get_event_loop()
-        boto3_client = loop.run_until_complete(
+        boto3_client = run_coroutine(
             get_boto3_client(
                 self.minio_endpoint,
                 access_key=self.minio_access_key,
@@ -41,38 +206,263 @@ class MinioBoto3Client:
         )
         return boto3_client
 
+    def _get_s3_client(self, max_pool_connections: int = 10):
+        """Return async context manager with s3 client that reuses connections for multiple requests.
+
+        Client is created from own session with the same credentials and endpoint as common boto3 client, so pool
+        size can be set without touching its private attributes.
+        """
+
+        config = Config(signature_version=S3_SIGNATURE_VERSION, max_pool_connections=max_pool_connections)
+
+        return self.session.client('s3', endpoint_url=self.endpoint_url, config=config)
+
+    @measured('s3.download_object')
     async def download_object(self, src_bucket, src_path, temp_path):
         await self.client.download_object(src_bucket, src_path, temp_path)
 
+    @measured('s3.copy_object')
     async def copy_object(self, dest_bucket, dest_path, source_bucket, source_path):
         result = await self.client.copy_object(source_bucket, source_path, dest_bucket, dest_path)
         return result
 
-    async def upload_object(self, bucket, object_name, file_path):
-        # Here get the total size of the size and set up the max size of each chunk
-        max_size = 5 * 1024 * 1024
+    @measured('s3.copy_large_object')
+    async def copy_large_object(
+        self,
+        dest_bucket: str,
+        dest_path: str,
+        source_bucket: str,
+        source_path: str,
+        size: int,
+        part_size: int = COPY_PART_SIZE,
+        concurrency: int = COPY_PARTS_CONCURRENCY,
+    ) -> Dict[str, Any]:
+        """Copy object of any size on server side using multipart upload with concurrently copied part ranges."""
+
+        part_size = get_part_size(size, part_size)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with self._get_s3_client(concurrency) as s3:
+            response = await s3.create_multipart_upload(Bucket=dest_bucket, Key=dest_path)
+            upload_id = response['UploadId']
+            logger.info(f'Started multipart copy of "{source_bucket}/{source_path}" with upload id "{upload_id}".')
+
+            async def copy_part(part_number: int, start: int, end: int) -> Dict[str, Any]:
+                async with semaphore:
+                    result = await s3.upload_part_copy(
+                        Bucket=dest_bucket,
+                        Key=dest_path,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        CopySource={'Bucket': source_bucket, 'Key': source_path},
+                        CopySourceRange=f'bytes={start}-{end}',
+                    )
+                return {'ETag': result['CopyPartResult']['ETag'], 'PartNumber': part_number}
+
+            try:
+                parts = await gather_parts(copy_part(*part_range) for part_range in get_part_ranges(size, part_size))
+                result = await s3.complete_multipart_upload(
+                    Bucket=dest_bucket, Key=dest_path, UploadId=upload_id, MultipartUpload={'Parts': parts}
+                )
+            except Exception:
+                logger.exception(f'Aborting multipart copy with upload id "{upload_id}".')
+                await s3.abort_multipart_upload(Bucket=dest_bucket, Key=dest_path, UploadId=upload_id)
+                raise
+
+        logger.info(f'Finalize the multipart copy with result {result}')
+        return result
+
+    async def _read_range(self, s3, bucket: str, key: str, start: int, end: int, buffer: bytearray) -> int:
+        """Stream byte range of object into buffer and return number of received bytes.
+
+        Reading is aborted as soon as more bytes than requested arrive, so the buffer is never written past the range.
+        """
+
+        size = end - start + 1
+        response = await s3.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')
+        received = 0
+        async with response['Body'] as stream:
+            while True:
+                chunk = await stream.read(RELAY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if received + len(chunk) > size:
+                    raise ValueError(f'Received more than {size} bytes for range {start}-{end}.')
+                buffer[received : received + len(chunk)] = chunk  # noqa: E203
+                received += len(chunk)
+
+        if received != size:
+            raise ValueError(f'Received {received} bytes instead of {size} for range {start}-{end}.')
+
+        return received
+
+    @measured('s3.relay_object')
+    async def relay_object(
+        self,
+        dest_bucket: str,
+        dest_path: str,
+        source_bucket: str,
+        source_path: str,
+        size: int,
+        part_size: int = RELAY_PART_SIZE,
+        concurrency: int = RELAY_PARTS_CONCURRENCY,
+        retries: int = UPLOAD_PART_RETRIES,
+    ) -> Dict[str, Any]:
+        """Copy object through this process piping ranged reads of source into part uploads of destination.
+
+        Used when object cannot be copied on server side. Parts are kept in ring buffer with one slot per concurrently
+        relayed part, so peak memory is part size times concurrency and nothing is written to local disk.
+        """
+
+        part_size = get_part_size(size, part_size)
+        part_ranges = get_part_ranges(size, part_size) or [(1, 0, -1)]
+        ring = RingBuffer(min(concurrency, len(part_ranges)), min(part_size, size))
+
+        async with self._get_s3_client(concurrency * 2) as s3:
+            response = await s3.create_multipart_upload(Bucket=dest_bucket, Key=dest_path)
+            upload_id = response['UploadId']
+            logger.info(f'Started relay of "{source_bucket}/{source_path}" with upload id "{upload_id}".')
+
+            async def relay_part(part_number: int, start: int, end: int) -> Dict[str, Any]:
+                async with ring.acquire() as slot:
+                    received = 0
+                    if end >= start:
+                        received = await self._read_range(s3, source_bucket, source_path, start, end, slot)
+                    with PartReader(memoryview(slot)[:received]) as body:
+                        return await self._upload_part(
+                            s3, dest_bucket, dest_path, upload_id, part_number, body, retries
+                        )
+
+            try:
+                parts = await gather_parts(relay_part(*part_range) for part_range in part_ranges)
+                result = await s3.complete_multipart_upload(
+                    Bucket=dest_bucket, Key=dest_path, UploadId=upload_id, MultipartUpload={'Parts': parts}
+                )
+            except Exception:
+                logger.exception(f'Aborting relay with upload id "{upload_id}".')
+                await s3.abort_multipart_upload(Bucket=dest_bucket, Key=dest_path, UploadId=upload_id)
+                raise
+
+        logger.info(f'Finalize the relay with result {result}')
+        return result
+
+    async def _upload_part(
+        self, s3, bucket: str, key: str, upload_id: str, part_number: int, body: Any, retries: int
+    ) -> Dict[str, Any]:
+        """Upload one part retrying it when upload fails."""
+
+        for attempt in range(1, retries + 1):
+            try:
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+                result = await s3.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+                )
+                return {'ETag': result['ETag'], 'PartNumber': part_number}
+            except Exception:
+                if attempt == retries:
+                    raise
+                logger.warning(f'Unable to upload part {part_number} of "{bucket}/{key}", attempt {attempt}.')
+                await asyncio.sleep(UPLOAD_RETRY_DELAY * attempt)
+
+    @measured('s3.upload_object')
+    async def upload_object(
+        self,
+        bucket: str,
+        object_name: str,
+        file_path: str,
+        part_size: int = UPLOAD_PART_SIZE,
+        concurrency: int = UPLOAD_PARTS_CONCURRENCY,
+        retries: int = UPLOAD_PART_RETRIES,
+    ) -> Dict[str, Any]:
+        """Upload local file using multipart upload with concurrently uploaded parts.
+
+        Part size grows with file size to fit into max parts count. File is memory mapped and each part is streamed
+        from the mapping without copying it into intermediate buffers, pages are released as soon as they are sent.
+        """
+
         size = os.path.getsize(file_path)
-        logger.info('File total size is ')
-        total_parts = math.ceil(size / max_size)
-
-        # Get upload id from upload pre
-        upload_id_list = await self.client.prepare_multipart_upload(bucket, [object_name])
-        upload_id = upload_id_list[0]
-        logger.info(f'The upload id is {upload_id}')
-        parts = []
+        part_size = get_part_size(size, part_size)
+        part_ranges = get_part_ranges(size, part_size) or [(1, 0, -1)]
+        logger.info(f'File total size is {size}, uploading it in {len(part_ranges)} parts.')
+
+        semaphore = asyncio.Semaphore(concurrency)
+
         with open(file_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            view = memoryview(mapped) if mapped is not None else memoryview(b'')
+            try:
+                async with self._get_s3_client(concurrency) as s3:
+                    response = await s3.create_multipart_upload(Bucket=bucket, Key=object_name)
+                    upload_id = response['UploadId']
+                    logger.info(f'The upload id is {upload_id}')
 
-            for part_number in range(total_parts):
+                    async def upload_part(part_number: int, start: int, end: int) -> Dict[str, Any]:
+                        async with semaphore:
+                            with PartReader(view[start : end + 1], mapped, start) as body:  # noqa: E203
+                                return await self._upload_part(
+                                    s3, bucket, object_name, upload_id, part_number, body, retries
+                                )
 
-                # Cut file into chunks and upload the chunk
-                file_data = f.read(max_size)
-                chunk_result = await self.client.part_upload(bucket, object_name, upload_id, part_number + 1, file_data)
-                parts.append(chunk_result)
-                logger.info(f'Chunk upload result {chunk_result}')
-        res = await self.client.combine_chunks(bucket, object_name, upload_id, parts)
-        logger.info(f'Finalize the large file upload with version is {res}')
-        return res
+                    try:
+                        parts = await gather_parts(upload_part(*part_range) for part_range in part_ranges)
+                        result = await s3.complete_multipart_upload(
+                            Bucket=bucket, Key=object_name, UploadId=upload_id, MultipartUpload={'Parts': parts}
+                        )
+                    except Exception:
+                        logger.exception(f'Aborting multipart upload with upload id "{upload_id}".')
+                        await s3.abort_multipart_upload(Bucket=bucket, Key=object_name, UploadId=upload_id)
+                        raise
+            finally:
+                view.release()
+                if mapped is not None:
+                    mapped.close()
+
+        logger.info(f'Finalize the large file upload with version is {result}')
+        return result
 
+    @measured('s3.remove_object')
     async def remove_object(self, src_bucket, src_obj_path):
         result = await self.client.delete_object(src_bucket, src_obj_path)
         return result
+
+    @measured('s3.remove_objects')
+    async def remove_objects(
+        self,
+        bucket: str,
+        keys: Sequence[str],
+        chunk_size: int = DELETE_OBJECTS_CHUNK_SIZE,
+        concurrency: int = DELETE_OBJECTS_CONCURRENCY,
+    ) -> Dict[str, str]:
+        """Remove objects using multi-object delete requests with several requests in flight.
+
+        Return error message for every key that was not removed.
+        """
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with self._get_s3_client(concurrency) as s3:
+
+            async def remove_chunk(chunk: Sequence[str]) -> Dict[str, str]:
+                async with semaphore:
+                    try:
+                        response = await s3.delete_objects(
+                            Bucket=bucket, Delete={'Objects': [{'Key': key} for key in chunk], 'Quiet': True}
+                        )
+                    except Exception as e:
+                        logger.exception(f'Unable to remove {len(chunk)} objects from bucket "{bucket}".')
+                        return {key: str(e) for key in chunk}
+
+                return {
+                    error['Key']: f'{error.get("Code")}: {error.get("Message")}' for error in response.get('Errors', [])
+                }
+
+            chunks = [keys[start : start + chunk_size] for start in range(0, len(keys), chunk_size)]  # noqa: E203
+            results = await asyncio.gather(*(remove_chunk(chunk) for chunk in chunks))
+
+        errors = {}
+        for chunk_errors in results:
+            errors.update(chunk_errors)
+
+        logger.info(f'Removed {len(keys) - len(errors)} of {len(keys)} objects from bucket "{bucket}".')
+        return errors
@@ -10,16 +10,26 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+import sys
 import time
 from enum import Enum
 from enum import unique
 from pathlib import Path
+from types import MappingProxyType
+from typing import AbstractSet
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Mapping
 from typing import Set
+from typing import Tuple
 from typing import Union
 
+from operations.paths import NodePaths
+from operations.paths import get_node_paths
+
 
 def get_timestamp() -> int:
     """Return current timestamp."""
@@ -61,8 +71,23 @@ class ZoneType(str, Enum):
     CORE = 1
 
 
+INTERNED_NODE_KEYS = ('parent', 'parent_path', 'container_code', 'container_type', 'owner', 'type', 'status')
+
+
 class Node(dict):
-    """Store information about one node."""
+    """Store information about one node.
+
+    Node keeps every field returned by metadata service, because whole nodes are sent on as payloads to other services.
+    Only values repeated across many nodes of the same tree are interned, so large trees share one copy of every
+    string, and paths are taken from the shared path cache.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        for key in INTERNED_NODE_KEYS:
+            value = self.get(key)
+            if type(value) is str:
+                self[key] = sys.intern(value)
 
     def __str__(self) -> str:
         return f'{self.id} | {self.name}'
@@ -102,18 +127,23 @@ class Node(dict):
     def tags(self) -> List[str]:
         return self.get('tags', [])
 
+    @property
+    def paths(self) -> NodePaths:
+        """Return cached paths of the node."""
+
+        return get_node_paths(self.get('parent_path'), self['name'])
+
     @property
     def display_path(self) -> Path:
-        if self['parent_path']:
-            full_path = '{}/{}'.format(self['parent_path'].replace('.', '/'), self['name'])
-        else:
-            full_path = self['name']
-        display_path = Path(full_path)
+        """Return node path relative to the bucket root."""
+
+        return get_node_paths(self['parent_path'], self['name']).display
 
-        if display_path.is_absolute():
-            display_path = display_path.relative_to('/')
+    @property
+    def dotted_path(self) -> str:
+        """Return node path in the same format as it is stored in parent_path of child nodes."""
 
-        return display_path
+        return self.paths.dotted
 
     def get_attributes(self) -> Dict[str, Any]:
         return self['extended']['extra'].get('attributes', {})
@@ -123,7 +153,7 @@ class NodeList(list):
     """Store list of Nodes."""
 
     def __init__(self, nodes: List[Dict[str, Any]]) -> None:
-        super().__init__([Node(node) for node in nodes])
+        super().__init__([node if isinstance(node, Node) else Node(node) for node in nodes])
 
     @property
     def ids(self) -> Set[str]:
@@ -131,3 +161,84 @@ class NodeList(list):
 
     def filter_files(self) -> 'NodeList':
         return NodeList([node for node in self if node.is_file])
+
+
+class NodeTreeIndex(dict):
+    """Store child nodes of every folder in a tree using parent path as a key."""
+
+    @classmethod
+    def from_nodes(cls, nodes: List[Node]) -> 'NodeTreeIndex':
+        instance = cls()
+        for node in nodes:
+            instance.setdefault(node.get('parent_path'), NodeList([])).append(node)
+
+        return instance
+
+    def get_children(self, folder: Node) -> NodeList:
+        """Return child nodes of the folder."""
+
+        return self.get(folder.dotted_path, NodeList([]))
+
+
+class TreeSnapshot:
+    """Store immutable view of already traversed tree using folder id as a key.
+
+    Child nodes are stored after exclusion, so traversing the snapshot again visits exactly the same nodes. Ids of
+    folders that had some of their child nodes excluded are stored as well.
+    """
+
+    def __init__(
+        self, children: Mapping[str, Tuple[Node, ...]], partial_folder_ids: AbstractSet[str] = frozenset()
+    ) -> None:
+        self._children = MappingProxyType(dict(children))
+        self._partial_folder_ids = frozenset(partial_folder_ids)
+
+    def __len__(self) -> int:
+        return len(self._children)
+
+    def __iter__(self) -> Iterator[Node]:
+        """Iterate over all nodes in the snapshot."""
+
+        for nodes in self._children.values():
+            yield from nodes
+
+    def get_children(self, folder: Node) -> Tuple[Node, ...]:
+        """Return child nodes of the folder."""
+
+        return self._children[folder.id]
+
+    def is_partial(self, folder: Node) -> bool:
+        """Return True if some child nodes of the folder were excluded during traversal."""
+
+        return folder.id in self._partial_folder_ids
+
+    def get_complete_folder_ids(self, folder: Node, is_included: Callable[[Node], bool]) -> Set[str]:
+        """Return ids of folders under the folder which have every node of their subtree included.
+
+        Folder is complete when none of its child nodes were excluded, every child file is included and every child
+        folder is complete.
+        """
+
+        complete_folder_ids = set()
+
+        def is_complete(current: Node) -> bool:
+            if current.id not in self._children:
+                return False
+
+            complete = not self.is_partial(current)
+            for node in self._children[current.id]:
+                if node.is_folder:
+                    complete = is_complete(node) and complete
+                elif not is_included(node):
+                    complete = False
+
+            if complete:
+                complete_folder_ids.add(current.id)
+
+            return complete
+
+        for node in self.get_children(folder):
+            if node.is_folder:
+                is_complete(node)
+
+        return complete_folder_ids
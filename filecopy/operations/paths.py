@@ -0,0 +1,68 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from typing import Union
+
+PATHS_CACHE_SIZE = 65536
+
+
+class NodePaths:
+    """Store precomputed forms of node path built from parent path and name."""
+
+    __slots__ = ('parent_path', 'name', 'dotted', 'slashed', 'display', 'object_path')
+
+    def __init__(self, parent_path: Optional[str], name: str) -> None:
+        self.parent_path = parent_path
+        self.name = name
+
+        if parent_path:
+            self.dotted = f'{parent_path}.{name}'
+            self.slashed = '{}/{}'.format(parent_path.replace('.', '/'), name)
+        else:
+            self.dotted = name
+            self.slashed = name
+
+        display = Path(self.slashed)
+        if display.is_absolute():
+            display = display.relative_to('/')
+
+        self.display = display
+        self.object_path = str(display)
+
+    def join(self, divider: str) -> str:
+        """Return node path joined with divider the same way as parent path is stored in metadata service."""
+
+        if divider == '.':
+            return self.dotted
+
+        if divider == '/':
+            return self.slashed
+
+        if self.parent_path:
+            return '{}{}{}'.format(self.parent_path.replace('.', divider), divider, self.name)
+
+        return self.name
+
+    def in_bucket(self, bucket: Union[Path, str]) -> str:
+        """Return object path qualified with the bucket name."""
+
+        return f'{bucket}/{self.object_path}'
+
+
+@lru_cache(maxsize=PATHS_CACHE_SIZE)
+def get_node_paths(parent_path: Optional[str], name: str) -> NodePaths:
+    """Return cached paths of the node with parent path and name."""
+
+    return NodePaths(parent_path, name)
@@ -0,0 +1,71 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import threading
+from concurrent.futures import Future
+from typing import Coroutine
+from typing import List
+
+from operations.event_loop import get_shared_event_loop
+
+
+class AsyncPipeline:
+    """Schedule coroutines on the shared event loop from any thread without waiting for their results.
+
+    Submitting blocks when max_pending coroutines are still running, so producers cannot run too far ahead. All
+    exceptions are collected and raised together by join.
+    """
+
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self.running = 0
+        self.errors: List[Exception] = []
+        self.condition = threading.Condition()
+
+    def _on_done(self, future: Future) -> None:
+        with self.condition:
+            if future.cancelled():
+                self.errors.append(Exception('Coroutine has been cancelled.'))
+            elif future.exception() is not None:
+                self.errors.append(future.exception())
+
+            self.running -= 1
+            self.condition.notify_all()
+
+    def submit(self, coroutine: Coroutine) -> None:
+        """Schedule coroutine for execution."""
+
+        with self.condition:
+            while self.running >= self.max_pending:
+                self.condition.wait()
+            self.running += 1
+
+        future = get_shared_event_loop().submit(coroutine)
+        future.add_done_callback(self._on_done)
+
+    def wait(self) -> List[Exception]:
+        """Wait until all scheduled coroutines are finished and return collected exceptions."""
+
+        with self.condition:
+            while self.running:
+                self.condition.wait()
+
+            errors, self.errors = self.errors, []
+
+        return errors
+
+    def join(self) -> None:
+        """Wait until all scheduled coroutines are finished and raise collected exceptions."""
+
+        errors = self.wait()
+        if errors:
+            raise Exception(errors)
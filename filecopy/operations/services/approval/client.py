@@ -10,11 +10,22 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+import logging
+import threading
+import time
+from collections import defaultdict
 from functools import cached_property
+from typing import Dict
+from typing import List
+from typing import Union
+from uuid import UUID
 from uuid import uuid4
 
+from operations.metrics import measured
 from operations.services.approval.models import ApprovalEntities
 from operations.services.approval.models import ApprovalEntity
+from operations.services.approval.models import ApprovalEntityIndex
+from operations.services.approval.models import ApprovalEntityRecord
 from operations.services.approval.models import ApprovalRequest
 from operations.services.approval.models import CopyStatus
 from sqlalchemy import Column
@@ -22,9 +33,11 @@ from sqlalchemy import MetaData
 from sqlalchemy import Table
 from sqlalchemy import select
 from sqlalchemy import update
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
 from sqlalchemy.future import Engine
 
+logger = logging.getLogger(__name__)
+
 
 class ApprovalServiceClient:
     """Get information about approval request or entities for copy request."""
@@ -37,7 +50,7 @@ class ApprovalServiceClient:
         return Table(
             name,
             self.metadata,
-            Column('id', UUID(as_uuid=True), unique=True, primary_key=True, default=uuid4),
+            Column('id', PostgresUUID(as_uuid=True), unique=True, primary_key=True, default=uuid4),
             keep_existing=True,
             autoload_with=self.engine,
         )
@@ -54,9 +67,9 @@ class ApprovalServiceClient:
         """Return approval request by id."""
 
         statement = select(self.approval_request).filter_by(id=request_id)
-        cursor = self.engine.connect().execute(statement)
-
-        approval_request = ApprovalRequest.from_orm(cursor.fetchone())
+        with self.engine.connect() as connection:
+            cursor = connection.execute(statement)
+            approval_request = ApprovalRequest.from_orm(cursor.fetchone())
 
         return approval_request
 
@@ -64,12 +77,36 @@ class ApprovalServiceClient:
         """Return all approval entities related to request id."""
 
         statement = select(self.approval_entity).filter_by(request_id=request_id)
-        cursor = self.engine.connect().execute(statement)
-
-        request_approval_entities = ApprovalEntities.from_cursor(cursor)
+        with self.engine.connect() as connection:
+            cursor = connection.execute(statement)
+            request_approval_entities = ApprovalEntities.from_cursor(cursor)
 
         return request_approval_entities
 
+    @measured('approval.get_approval_entity_index')
+    def get_approval_entity_index(self, request_id: str, batch_size: int = 10000) -> ApprovalEntityIndex:
+        """Return compact index of all approval entities related to request id.
+
+        Only columns needed for copying are selected and rows are streamed with server side cursor in batches.
+        """
+
+        columns = self.approval_entity.columns
+        statement = select(
+            columns.id,
+            columns.entity_id,
+            columns.parent_id,
+            columns.entity_type,
+            columns.review_status,
+            columns.copy_status,
+        ).filter_by(request_id=request_id)
+
+        with self.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(statement)
+            index = ApprovalEntityIndex.from_rows(result.yield_per(batch_size))
+
+        return index
+
+    @measured('approval.update_copy_status')
     def update_copy_status(self, approval_entity: ApprovalEntity, copy_status: CopyStatus) -> None:
         """Update copy status field for approval entity."""
 
@@ -81,3 +118,81 @@ class ApprovalServiceClient:
 
         with self.engine.begin() as connection:
             connection.execute(statement)
+
+    @measured('approval.update_copy_statuses')
+    def update_copy_statuses(self, copy_statuses: Dict[UUID, CopyStatus]) -> None:
+        """Update copy status field for multiple approval entities in one transaction."""
+
+        ids_by_copy_status: Dict[CopyStatus, List[UUID]] = defaultdict(list)
+        for approval_entity_id, copy_status in copy_statuses.items():
+            ids_by_copy_status[copy_status].append(approval_entity_id)
+
+        with self.engine.begin() as connection:
+            for copy_status, ids in ids_by_copy_status.items():
+                statement = (
+                    update(self.approval_entity)
+                    .where(self.approval_entity.columns.id.in_(ids))
+                    .values(copy_status=copy_status)
+                )
+                connection.execute(statement)
+
+
+class CopyStatusWriter:
+    """Buffer copy status updates of approval entities and write them in batches.
+
+    Buffer is written when it reaches batch size, when expired buffer is flushed after flush interval has passed since
+    the last write and when it is flushed at the end of the job. Failed batch stays buffered and is retried with the
+    next batch, its error is raised only when the final flush fails as well.
+    """
+
+    def __init__(self, approval_service_client: ApprovalServiceClient, batch_size: int, flush_interval: float) -> None:
+        self.approval_service_client = approval_service_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending: Dict[UUID, CopyStatus] = {}
+        self.write_threshold = batch_size
+        self.last_write_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _write(self) -> None:
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+        self.last_write_time = time.monotonic()
+        try:
+            self.approval_service_client.update_copy_statuses(pending)
+        except Exception:
+            self.pending = {**pending, **self.pending}
+            self.write_threshold = len(self.pending) + self.batch_size
+            raise
+
+        self.write_threshold = self.batch_size
+
+    def _write_buffered(self) -> None:
+        try:
+            self._write()
+        except Exception:
+            logger.exception(f'Unable to write {len(self.pending)} copy statuses, retrying them with the next batch.')
+
+    def add(self, approval_entity: Union[ApprovalEntity, ApprovalEntityRecord], copy_status: CopyStatus) -> None:
+        """Buffer copy status update for approval entity."""
+
+        with self.lock:
+            self.pending[approval_entity.id] = copy_status
+
+            if len(self.pending) >= self.write_threshold:
+                self._write_buffered()
+
+    def flush_expired(self) -> None:
+        """Write buffered copy status updates when flush interval has passed since the last write."""
+
+        with self.lock:
+            if time.monotonic() - self.last_write_time >= self.flush_interval:
+                self._write_buffered()
+
+    def flush(self) -> None:
+        """Write all buffered copy status updates."""
+
+        with self.lock:
+            self._write()
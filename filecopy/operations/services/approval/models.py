@@ -11,8 +11,12 @@
 # If not, see http://www.gnu.org/licenses/.
 
 from enum import Enum
+from typing import Any
+from typing import Iterable
+from typing import NamedTuple
 from typing import Optional
 from typing import Set
+from typing import Union
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -125,3 +129,50 @@ class ApprovalEntities(dict):
                 approved_entities.update(self.get_approved_entities_until_top_parent(entity))
 
         return approved_entities
+
+
+class ApprovalEntityRecord(NamedTuple):
+    """Compact representation of approval entity with only fields that are needed for copying."""
+
+    id: Union[UUID, str]
+    parent_id: Optional[str]
+    is_approved_for_copy: bool
+
+
+class ApprovalEntityIndex(dict):
+    """Store compact approval entity records from one request using entity geid as a key."""
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any]):
+        """Load index from rows with id, entity_id, parent_id, entity_type, review_status and copy_status columns."""
+
+        instance = cls()
+        for row in rows:
+            is_approved_for_copy = (
+                row.entity_type == EntityType.FILE
+                and row.review_status == ReviewStatus.APPROVED
+                and row.copy_status == CopyStatus.PENDING
+            )
+            instance[row.entity_id] = ApprovalEntityRecord(row.id, row.parent_id, is_approved_for_copy)
+
+        return instance
+
+    def get_approved(self) -> ApprovedApprovalEntities:
+        """Return approved entity records with pending copy status.
+
+        Also includes folder entity records if those are parents for the file entity.
+        """
+
+        approved_entities = ApprovedApprovalEntities()
+
+        for entity_id, record in self.items():
+            if not record.is_approved_for_copy:
+                continue
+
+            approved_entities[entity_id] = record
+            while record.parent_id and record.parent_id not in approved_entities:
+                entity_id = record.parent_id
+                record = self[entity_id]
+                approved_entities[entity_id] = record
+
+        return approved_entities
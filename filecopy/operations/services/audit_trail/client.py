@@ -14,17 +14,20 @@ import logging
 from typing import Any
 from typing import Dict
 
-from requests import Session
+from operations.event_loop import run_coroutine
+from operations.http_client import get_connection_manager
+from operations.metrics import measured
 
 logger = logging.getLogger(__name__)
 
 
-class AuditTrailServiceClient:
+class AsyncAuditTrailServiceClient:
     def __init__(self, endpoint: str) -> None:
         self.endpoint_v1 = f'{endpoint}/v1'
-        self.client = Session()
+        self.client = get_connection_manager()
 
-    def create_lineage_v3(
+    @measured('audit_trail.create_lineage_v3')
+    async def create_lineage_v3(
         self,
         input_id: str,
         output_id: str,
@@ -48,9 +51,32 @@ class AuditTrailServiceClient:
             'pipeline_name': pipeline_name,
             'description': pipeline_description,
         }
-        response = self.client.post(f'{self.endpoint_v1}/lineage/', json=payload)
+        response = await self.client.post(f'{self.endpoint_v1}/lineage/', json=payload)
         logger.debug(response.json())
         if response.status_code != 200:
             raise Exception(f'Unable to create lineage between "{input_id} and "{output_id}" in atlas.')
 
         return response.json()
+
+
+class AuditTrailServiceClient:
+    """Blocking wrapper around async audit trail service client."""
+
+    def __init__(self, endpoint: str) -> None:
+        self.async_client = AsyncAuditTrailServiceClient(endpoint)
+
+    def create_lineage_v3(
+        self,
+        input_id: str,
+        output_id: str,
+        input_name: str,
+        output_name: str,
+        project_code: str,
+        pipeline_name: str,
+        pipeline_description: str,
+    ) -> Dict[str, Any]:
+        return run_coroutine(
+            self.async_client.create_lineage_v3(
+                input_id, output_id, input_name, output_name, project_code, pipeline_name, pipeline_description
+            )
+        )
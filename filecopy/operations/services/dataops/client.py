@@ -13,13 +13,21 @@
 import logging
 from enum import Enum
 from enum import unique
+from itertools import islice
 from pathlib import Path
 from typing import Any
+from typing import Callable
+from typing import Collection
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
+from typing import Union
 
-from requests import Session
+from operations.event_loop import run_coroutine
+from operations.http_client import get_connection_manager
+from operations.metrics import measured
 
 logger = logging.getLogger(__name__)
 
@@ -42,20 +50,53 @@ class JobStatus(str, Enum):
         use_enum_values = True
 
 
-class DataopsServiceClient:
-    def __init__(self, endpoint: str) -> None:
+def get_prefix_key(resource_key: str) -> str:
+    """Return prefix key that locks the resource together with all resources under it."""
+
+    return f'{resource_key}/'
+
+
+class ResourceKeys:
+    """Stream of resource keys that is produced again by the function on every iteration.
+
+    Allows locking resources in chunks and unlocking or rolling them back later without keeping all keys in memory.
+    """
+
+    def __init__(self, function: Callable[[], Iterable[str]]) -> None:
+        self.function = function
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.function())
+
+
+def iter_chunks(resource_keys: Iterable[Union[Path, str]], chunk_size: int) -> Iterator[List[str]]:
+    """Yield resource keys as strings in chunks of chunk size."""
+
+    chunk = []
+    for resource_key in resource_keys:
+        chunk.append(str(resource_key))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+LockKeys = Union[ResourceKeys, Collection[Union[Path, str]]]
+
+
+class AsyncDataopsServiceClient:
+    def __init__(self, endpoint: str, lock_chunk_size: int = 1000) -> None:
         self.endpoint_v1 = f'{endpoint}/v1'
         self.endpoint_v2 = f'{endpoint}/v2'
-        self.client = Session()
+        self.lock_chunk_size = lock_chunk_size
+        self.client = get_connection_manager()
 
-    def lock_resources(self, resource_keys: List[Path], operation: ResourceLockOperation) -> Dict[str, Any]:
-        resource_keys = list(map(str, resource_keys))
-
-        logger.info(
-            f'Performing "{operation}" \
-            lock for resource keys: {resource_keys}.'
-        )
-        response = self.client.post(
+    @measured('dataops.lock')
+    async def _lock_chunk(self, resource_keys: List[str], operation: ResourceLockOperation) -> Dict[str, Any]:
+        logger.info(f'Performing "{operation}" lock for {len(resource_keys)} resource keys.')
+        response = await self.client.post(
             f'{self.endpoint_v2}/resource/lock/bulk',
             json={
                 'resource_keys': resource_keys,
@@ -68,20 +109,13 @@ class DataopsServiceClient:
             logger.info(message)
             raise Exception(message)
 
-        logger.info(
-            f'Successfully "{operation}" \
-            locked resource keys: {resource_keys}.'
-        )
+        logger.info(f'Successfully "{operation}" locked {len(resource_keys)} resource keys.')
         return response.json()
 
-    def unlock_resources(self, resource_keys: List[Path], operation: ResourceLockOperation) -> Dict[str, Any]:
-        resource_keys = list(map(str, resource_keys))
-
-        logger.info(
-            f'Performing "{operation}" \
-            unlock for resource keys: {resource_keys}.'
-        )
-        response = self.client.delete(
+    @measured('dataops.unlock')
+    async def _unlock_chunk(self, resource_keys: List[str], operation: ResourceLockOperation) -> Dict[str, Any]:
+        logger.info(f'Performing "{operation}" unlock for {len(resource_keys)} resource keys.')
+        response = await self.client.delete(
             f'{self.endpoint_v2}/resource/lock/bulk',
             json={
                 'resource_keys': resource_keys,
@@ -94,14 +128,60 @@ class DataopsServiceClient:
             logger.info(message)
             raise Exception(message)
 
-        logger.info(
-            f'Successfully "{operation}" \
-            unlocked resource keys: {resource_keys}.'
-        )
+        logger.info(f'Successfully "{operation}" unlocked {len(resource_keys)} resource keys.')
         return response.json()
 
-    def update_job(self, session_id: str, job_id: str, status: JobStatus) -> Dict[str, Any]:
-        response = self.client.put(
+    async def lock_resources(self, resource_keys: LockKeys, operation: ResourceLockOperation) -> List[Dict[str, Any]]:
+        """Lock resource keys sending them in chunks and return response body for every chunk.
+
+        When any chunk cannot be locked, already locked chunks are unlocked before raising an exception. Resource keys
+        are iterated again for rollback, so one-shot iterators are rejected.
+        """
+
+        if iter(resource_keys) is resource_keys:
+            raise TypeError('Resource keys must be a collection or ResourceKeys stream, not an iterator.')
+
+        results = []
+        locked = 0
+        try:
+            for chunk in iter_chunks(resource_keys, self.lock_chunk_size):
+                results.append(await self._lock_chunk(chunk, operation))
+                locked += len(chunk)
+        except Exception:
+            if locked:
+                logger.warning(f'Rolling back "{operation}" lock for {locked} already locked resource keys.')
+                try:
+                    await self.unlock_resources(islice(resource_keys, locked), operation)
+                except Exception as e:
+                    logger.error(f'Unable to roll back "{operation}" lock: {e}')
+            raise
+
+        return results
+
+    async def unlock_resources(
+        self, resource_keys: Iterable[Union[Path, str]], operation: ResourceLockOperation
+    ) -> List[Dict[str, Any]]:
+        """Unlock resource keys sending them in chunks and return response body for every chunk.
+
+        All chunks are attempted even if some of them cannot be unlocked.
+        """
+
+        results = []
+        errors = []
+        for chunk in iter_chunks(resource_keys, self.lock_chunk_size):
+            try:
+                results.append(await self._unlock_chunk(chunk, operation))
+            except Exception as e:
+                errors.append(e)
+
+        if errors:
+            raise Exception(errors)
+
+        return results
+
+    @measured('dataops.update_job')
+    async def update_job(self, session_id: str, job_id: str, status: JobStatus) -> Dict[str, Any]:
+        response = await self.client.put(
             f'{self.endpoint_v1}/tasks/',
             json={
                 'session_id': session_id,
@@ -118,8 +198,9 @@ class DataopsServiceClient:
 
         return response.json()
 
-    def get_zip_preview(self, file_geid: str) -> Optional[Dict[str, Any]]:
-        response = self.client.get(
+    @measured('dataops.get_zip_preview')
+    async def get_zip_preview(self, file_geid: str) -> Optional[Dict[str, Any]]:
+        response = await self.client.get(
             f'{self.endpoint_v1}/archive',
             params={
                 'file_id': file_geid,
@@ -138,8 +219,9 @@ class DataopsServiceClient:
 
         return response.json()
 
-    def create_zip_preview(self, file_id: str, archive_preview: Dict[str, Any]) -> Dict[str, Any]:
-        response = self.client.post(
+    @measured('dataops.create_zip_preview')
+    async def create_zip_preview(self, file_id: str, archive_preview: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.client.post(
             f'{self.endpoint_v1}/archive',
             json={
                 'file_id': file_id,
@@ -159,3 +241,27 @@ class DataopsServiceClient:
             )
 
         return response.json()
+
+
+class DataopsServiceClient:
+    """Blocking wrapper around async dataops service client."""
+
+    def __init__(self, endpoint: str, lock_chunk_size: int = 1000) -> None:
+        self.async_client = AsyncDataopsServiceClient(endpoint, lock_chunk_size)
+
+    def lock_resources(self, resource_keys: LockKeys, operation: ResourceLockOperation) -> List[Dict[str, Any]]:
+        return run_coroutine(self.async_client.lock_resources(resource_keys, operation))
+
+    def unlock_resources(
+        self, resource_keys: Iterable[Union[Path, str]], operation: ResourceLockOperation
+    ) -> List[Dict[str, Any]]:
+        return run_coroutine(self.async_client.unlock_resources(resource_keys, operation))
+
+    def update_job(self, session_id: str, job_id: str, status: JobStatus) -> Dict[str, Any]:
+        return run_coroutine(self.async_client.update_job(session_id, job_id, status))
+
+    def get_zip_preview(self, file_geid: str) -> Optional[Dict[str, Any]]:
+        return run_coroutine(self.async_client.get_zip_preview(file_geid))
+
+    def create_zip_preview(self, file_id: str, archive_preview: Dict[str, Any]) -> Dict[str, Any]:
+        return run_coroutine(self.async_client.create_zip_preview(file_id, archive_preview))
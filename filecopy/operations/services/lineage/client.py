@@ -10,17 +10,19 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
-
+from operations.event_loop import run_coroutine
+from operations.http_client import get_connection_manager
+from operations.metrics import measured
 from operations.models import Node
-from requests import Session
 
 
-class LineageServiceClient:
+class AsyncLineageServiceClient:
     def __init__(self, endpoint: str):
         self.endpoint_v2 = f'{endpoint}/v2'
-        self.client = Session()
+        self.client = get_connection_manager()
 
-    def create_catalog_entity(self, payload: Node, operator: str, namespace: str) -> str:
+    @measured('lineage.create_catalog_entity')
+    async def create_catalog_entity(self, payload: Node, operator: str, namespace: str) -> str:
         """Function will create new entity in the Atlas."""
 
         payload.update({'uploader': operator})
@@ -31,7 +33,7 @@ class LineageServiceClient:
         payload.update({'namespace': namespace})
         payload.update({'file_size': payload.get('size')})
 
-        response = self.client.post(f'{self.endpoint_v2}/filedata', json=payload)
+        response = await self.client.post(f'{self.endpoint_v2}/filedata', json=payload)
 
         if response.status_code != 200:
             raise Exception(f'Unable to create new entity in the Atlas for "{payload}".')
@@ -46,3 +48,13 @@ class LineageServiceClient:
         if created_entity:
             guid = created_entity['guid']
             return guid
+
+
+class LineageServiceClient:
+    """Blocking wrapper around async lineage service client."""
+
+    def __init__(self, endpoint: str):
+        self.async_client = AsyncLineageServiceClient(endpoint)
+
+    def create_catalog_entity(self, payload: Node, operator: str, namespace: str) -> str:
+        return run_coroutine(self.async_client.create_catalog_entity(payload, operator, namespace))
@@ -12,52 +12,49 @@
 
 import asyncio
 import logging
-import time
+from collections import defaultdict
 from pathlib import Path
 from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Set
 from typing import Tuple
 from typing import Union
 
 from common import ProjectException
+from operations.event_loop import run_coroutine
+from operations.http_client import get_connection_manager
 from operations.kafka_producer import KafkaProducer
+from operations.metrics import get_job_metrics
+from operations.metrics import measured
 from operations.minio_boto3_client import MinioBoto3Client
 from operations.models import Node
 from operations.models import NodeList
 from operations.models import ResourceType
 from operations.models import ZoneType
-from requests import Session
+from operations.paths import get_node_paths
 
 logger = logging.getLogger(__name__)
 
 
-class MetadataServiceClient:
-    def __init__(
-        self, endpoint: str, minio_endpoint: str, core_zone_label: str, temp_dir: str, project_client: str
-    ) -> None:
+class AsyncMetadataServiceClient:
+    def __init__(self, endpoint: str) -> None:
         self.endpoint_v1 = f'{endpoint}/v1/'
-        self.client = Session()
+        self.client = get_connection_manager()
 
-        self.minio_endpoint = minio_endpoint
-        self.core_zone_label = core_zone_label
-        self.temp_dir = temp_dir
-        self.project_client = project_client
+    @measured('metadata.get_items_by_ids')
+    async def get_items_by_ids(self, ids: list, allow_missing: bool = False) -> Dict[str, Node]:
+        """Return nodes by ids, raise an exception when some of them are not found unless missing ids are allowed."""
 
-    def get_item_by_id(self, node_id: str) -> Node:
-        nodes = self.get_items_by_ids([node_id])
-        return nodes[node_id]
-
-    def get_items_by_ids(self, ids: list) -> Dict[str, Node]:
         parameter = {'ids': ids}
-        response = self.client.get(f'{self.endpoint_v1}items/batch/', params=parameter)
+        response = await self.client.get(f'{self.endpoint_v1}items/batch/', params=parameter)
         if response.status_code != 200:
             raise Exception(f'Unable to get nodes by ids "{ids}".')
 
         results = response.json()['result']
 
-        if len(results) != len(ids):
+        if not allow_missing and len(results) != len(ids):
             raise Exception(
                 f'Number of returned nodes does not match number \
                     of requested ids "{ids}".'
@@ -67,17 +64,9 @@ class MetadataServiceClient:
 
         return nodes
 
-    async def get_project_by_code(self, project_code: str) -> Node:
-        try:
-            project = await self.project_client.get(code=project_code)
-            result = await project.json()
-        except ProjectException:
-            raise ProjectException(f'Unable to get project by code "{project_code}".')
-
-        return Node(result)
-
-    def get_nodes_tree(self, start_folder_id: str, traverse_subtrees: bool = False) -> NodeList:
-        parent_folder_response = self.client.get('{}item/{}/'.format(self.endpoint_v1, start_folder_id))
+    @measured('metadata.get_nodes_tree')
+    async def get_nodes_tree(self, start_folder_id: str, traverse_subtrees: bool = False) -> NodeList:
+        parent_folder_response = await self.client.get('{}item/{}/'.format(self.endpoint_v1, start_folder_id))
         parent_folder = parent_folder_response.json()['result']
         if parent_folder_response.status_code != 200:
             raise Exception(
@@ -93,7 +82,7 @@ class MetadataServiceClient:
             'recursive': traverse_subtrees,
         }
         node_query_url = self.endpoint_v1 + 'items/search/'
-        response = self.client.get(node_query_url, params=parameters)
+        response = await self.client.get(node_query_url, params=parameters)
 
         if response.status_code != 200:
             raise Exception(f'Unable to get nodes tree starting from "{start_folder_id}".')
@@ -101,7 +90,51 @@ class MetadataServiceClient:
         nodes = NodeList(response.json()['result'])
         return nodes
 
-    def get_node(self, zone: str, project_code: str, file_path: Union[Path, str]) -> Optional[Node]:
+    @measured('metadata.search_nodes')
+    async def search_nodes(self, parameters: Dict[str, Any], page_size: int = 1000) -> NodeList:
+        """Return all nodes matching search parameters fetching them page by page."""
+
+        node_query_url = self.endpoint_v1 + 'items/search/'
+        nodes = NodeList([])
+        page = 0
+        while True:
+            response = await self.client.get(
+                node_query_url, params={**parameters, 'page': page, 'page_size': page_size}
+            )
+            if response.status_code != 200:
+                raise Exception(f'Unable to search nodes with parameters "{parameters}".')
+
+            body = response.json()
+            nodes.extend(NodeList(body['result']))
+
+            page += 1
+            if page >= body.get('num_of_pages', 1):
+                break
+
+        return nodes
+
+    async def search_subtree(self, zone: int, container_code: str, parent_path: str) -> NodeList:
+        """Return all nodes under dotted parent path recursively using one paginated search."""
+
+        parameters = {
+            'archived': False,
+            'zone': zone,
+            'container_code': container_code,
+            'parent_path': parent_path,
+            'recursive': True,
+        }
+
+        return await self.search_nodes(parameters)
+
+    async def get_subtree(self, start_folder: Node) -> NodeList:
+        """Return all nodes under start folder recursively using one paginated search."""
+
+        return await self.search_subtree(
+            start_folder['zone'], start_folder['container_code'], self.format_folder_path(start_folder, '.')
+        )
+
+    @measured('metadata.get_node')
+    async def get_node(self, zone: str, project_code: str, file_path: Union[Path, str]) -> Optional[Node]:
         item_list = str(file_path).split('/')
         if len(item_list) < 2:
             raise Exception('Invalid item path')
@@ -119,28 +152,31 @@ class MetadataServiceClient:
             'name': node_name,
         }
         node_query_url = self.endpoint_v1 + 'items/search/'
-        response = self.client.get(node_query_url, params=parameters)
+        response = await self.client.get(node_query_url, params=parameters)
         node = response.json()['result']
         if node:
             return Node(node[0])
         return None
 
-    def is_file_exists(self, zone: str, project_code: str, path: Union[Path, str]) -> bool:
-        """Check if file already exists at specified path."""
-
-        node = self.get_node(zone, project_code, path)
-
-        return bool(node)
-
-    def is_folder_exists(self, zone: str, project_code: str, path: Union[Path, str]) -> bool:
-        """Check if folder already exists within project at specified path."""
+    async def get_child_names(self, zone: str, project_code: str, folder_path: Union[Path, str]) -> Set[str]:
+        """Return names of all nodes that are located directly in the folder at specified path."""
 
-        node = self.get_node(zone, project_code, path)
+        parameters = {
+            'archived': False,
+            'zone': {'greenroom': 0, 'core': 1}.get(zone.lower()),
+            'container_code': project_code,
+            'recursive': False,
+            'parent_path': '.'.join(Path(folder_path).parts),
+        }
+        nodes = await self.search_nodes(parameters)
 
-        return bool(node)
+        return {node.name for node in nodes}
 
-    def update_node(self, node: Node, update_json: Dict[str, Any]) -> Dict[str, Any]:
-        response = self.client.put(url=f'{self.endpoint_v1}item/', params={'id': node.get('id')}, json=update_json)
+    @measured('metadata.update_node')
+    async def update_node(self, node: Node, update_json: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self.client.put(
+            url=f'{self.endpoint_v1}item/', params={'id': node.get('id')}, json=update_json
+        )
 
         if response.status_code != 200:
             raise Exception(
@@ -151,38 +187,138 @@ class MetadataServiceClient:
         return response.json()
 
     def format_folder_path(self, node: Node, divider: str) -> str:
-        parent_path = node.get('parent_path', None)
-        if parent_path:
-            path = parent_path.replace('.', divider) if '.' in parent_path else parent_path
-            return '{}{}{}'.format(path, divider, node.get('name'))
-        return node.get('name')
+        return get_node_paths(node.get('parent_path'), node.get('name')).join(divider)
 
-    def create_node_with_parent(self, node_property) -> Node:
+    @measured('metadata.create_node_with_parent')
+    async def create_node_with_parent(self, node_property) -> Node:
         """create the node with following attribute."""
         create_node_url = self.endpoint_v1 + 'item/'
-        response = self.client.post(create_node_url, json=node_property)
+        response = await self.client.post(create_node_url, json=node_property)
         new_node = response.json()['result']
         return Node(new_node)
 
-    def move_node_to_trash(self, node_id: str) -> List:
+    @measured('metadata.create_nodes')
+    async def create_nodes(self, payloads: List[Dict[str, Any]], chunk_size: int = 100) -> NodeList:
+        """Create nodes in bulk sending payloads in chunks and return created nodes in the same order.
+
+        Chunks are created one after another, so when one of them fails only payloads before it have nodes.
+        """
+
+        create_nodes_url = self.endpoint_v1 + 'items/batch/'
+
+        async def create_chunk(chunk: List[Dict[str, Any]]) -> NodeList:
+            response = await self.client.post(create_nodes_url, json={'items': chunk})
+            if response.status_code != 200:
+                raise Exception(f'Unable to create {len(chunk)} nodes in bulk.')
+
+            nodes = NodeList(response.json()['result'])
+            if len(nodes) != len(chunk):
+                raise Exception(f'Number of created nodes does not match number of payloads {len(chunk)}.')
+
+            return nodes
+
+        created_nodes = NodeList([])
+        for start in range(0, len(payloads), chunk_size):
+            try:
+                created_nodes.extend(await create_chunk(payloads[start : start + chunk_size]))  # noqa: E203
+            except Exception as e:
+                raise Exception(f'Nodes were created only for first {start} of {len(payloads)} payloads: {e}')
+
+        return created_nodes
+
+    @measured('metadata.move_node_to_trash')
+    async def move_node_to_trash(self, node_id: str) -> List:
         patch_node_url = self.endpoint_v1 + 'item/'
         parameter = {'id': node_id, 'archived': True}
-        response = self.client.patch(patch_node_url, params=parameter)
+        response = await self.client.patch(patch_node_url, params=parameter)
         trash_node = response.json()['result']
         return trash_node
 
-    def create_file_node(
+
+class MetadataServiceClient:
+    """Blocking wrapper around async metadata service client with composite operations on nodes."""
+
+    def __init__(self, endpoint: str, minio_endpoint: str, core_zone_label: str, project_client: str) -> None:
+        self.async_client = AsyncMetadataServiceClient(endpoint)
+
+        self.minio_endpoint = minio_endpoint
+        self.core_zone_label = core_zone_label
+        self.project_client = project_client
+
+    def get_item_by_id(self, node_id: str) -> Node:
+        nodes = self.get_items_by_ids([node_id])
+        return nodes[node_id]
+
+    def get_items_by_ids(self, ids: list, allow_missing: bool = False) -> Dict[str, Node]:
+        return run_coroutine(self.async_client.get_items_by_ids(ids, allow_missing))
+
+    @measured('project.get_project_by_code')
+    async def get_project_by_code(self, project_code: str) -> Node:
+        try:
+            project = await self.project_client.get(code=project_code)
+            result = await project.json()
+        except ProjectException:
+            raise ProjectException(f'Unable to get project by code "{project_code}".')
+
+        return Node(result)
+
+    def get_nodes_tree(self, start_folder_id: str, traverse_subtrees: bool = False) -> NodeList:
+        return run_coroutine(self.async_client.get_nodes_tree(start_folder_id, traverse_subtrees))
+
+    def search_nodes(self, parameters: Dict[str, Any], page_size: int = 1000) -> NodeList:
+        return run_coroutine(self.async_client.search_nodes(parameters, page_size))
+
+    def get_subtree(self, start_folder: Node) -> NodeList:
+        return run_coroutine(self.async_client.get_subtree(start_folder))
+
+    def get_node(self, zone: str, project_code: str, file_path: Union[Path, str]) -> Optional[Node]:
+        return run_coroutine(self.async_client.get_node(zone, project_code, file_path))
+
+    def get_child_names(self, zone: str, project_code: str, folder_path: Union[Path, str]) -> Set[str]:
+        return run_coroutine(self.async_client.get_child_names(zone, project_code, folder_path))
+
+    def is_file_exists(self, zone: str, project_code: str, path: Union[Path, str]) -> bool:
+        """Check if file already exists at specified path."""
+
+        node = self.get_node(zone, project_code, path)
+
+        return bool(node)
+
+    def is_folder_exists(self, zone: str, project_code: str, path: Union[Path, str]) -> bool:
+        """Check if folder already exists within project at specified path."""
+
+        node = self.get_node(zone, project_code, path)
+
+        return bool(node)
+
+    def update_node(self, node: Node, update_json: Dict[str, Any]) -> Dict[str, Any]:
+        return run_coroutine(self.async_client.update_node(node, update_json))
+
+    def format_folder_path(self, node: Node, divider: str) -> str:
+        return self.async_client.format_folder_path(node, divider)
+
+    def create_node_with_parent(self, node_property) -> Node:
+        return run_coroutine(self.async_client.create_node_with_parent(node_property))
+
+    def create_nodes(self, payloads: List[Dict[str, Any]], chunk_size: int = 100) -> NodeList:
+        return run_coroutine(self.async_client.create_nodes(payloads, chunk_size))
+
+    def move_node_to_trash(self, node_id: str) -> List:
+        return run_coroutine(self.async_client.move_node_to_trash(node_id))
+
+    def get_file_node_payload(
         self,
         project: str,
         source_file: Node,
         parent_node: Node,
         folder_display_path: Path,
-        minio_client: MinioBoto3Client,
         tags: Optional[List] = None,
         attribute: Optional[dict] = None,
         new_name: Optional[str] = None,
         system_tags: Optional[List] = None,
-    ) -> Tuple[Node, str]:
+    ) -> Dict[str, Any]:
+        """Return payload for creation of the file node copied from source file."""
+
         if tags is None:
             tags = []
 
@@ -194,12 +330,12 @@ class MetadataServiceClient:
 
         file_name = new_name if new_name else source_file.get('name')
 
-        file_display_path = folder_display_path / file_name
-        location = f'minio://{self.minio_endpoint}/core-{project}/{file_display_path}'
+        parent_path = self.format_folder_path(parent_node, '.')
+        location = f'minio://{self.minio_endpoint}/core-{project}/{folder_display_path}/{file_name}'
 
         payload = {
             'parent': parent_node.get('id'),
-            'parent_path': self.format_folder_path(parent_node, '.'),
+            'parent_path': parent_path,
             'type': 'file',
             'zone': ZoneType.CORE,
             'name': file_name,
@@ -221,50 +357,75 @@ class MetadataServiceClient:
             payload['attribute_template_id'] = list(manifest.keys())[0]
             payload['attributes'] = manifest[list(manifest.keys())[0]]
 
-        try:
-            # minio location is
-            # minio://http://<end_point>/bucket/user/object_path
-            src_minio_path = source_file['storage'].get('location_uri').split('//')[-1]
-            _, src_bucket, src_obj_path = tuple(src_minio_path.split('/', 2))
-            target_minio_path = location.split('//')[-1]
-            _, target_bucket, target_obj_path = tuple(target_minio_path.split('/', 2))
-
-            # here the minio api only accept the 5GB in copy.
-            # if >5GB we need to download
-            # to local then reupload to target
-            file_size_gb = payload['size']
-            loop = asyncio.get_event_loop()
-            if file_size_gb < 5e9:
-                logger.info('File size less than 5GiB')
-                logger.info(
-                    f'Copying object from "{src_bucket}/{src_obj_path}" to \
-                        "{target_bucket}/{target_obj_path}".'
-                )
-                result = loop.run_until_complete(
-                    minio_client.copy_object(target_bucket, target_obj_path, src_bucket, src_obj_path)
-                )
-                version_id = result.get('VersionId', '')  # empty in case versioning is unsupported
-            else:
-                logger.info('File size greater than 5GiB')
-                temp_path = self.temp_dir + str(time.time())
-                loop.run_until_complete(minio_client.download_object(src_bucket, src_obj_path, temp_path))
-                logger.info(f'File fetched to local disk: {temp_path}')
-                temp_file_path = f"{temp_path}/{payload['name']}"
-                result = loop.run_until_complete(
-                    minio_client.upload_object(target_bucket, target_obj_path, temp_file_path)
-                )
+        return payload
+
+    async def copy_file_object(self, source_file: Node, payload: Dict[str, Any], minio_client: MinioBoto3Client) -> str:
+        """Copy source file object into location from file node payload and return new version id."""
+
+        with get_job_metrics().measure('copy.file_object', payload['size']):
+            try:
+                # minio location is
+                # minio://http://<end_point>/bucket/user/object_path
+                src_minio_path = source_file['storage'].get('location_uri').split('//')[-1]
+                _, src_bucket, src_obj_path = tuple(src_minio_path.split('/', 2))
+                target_minio_path = payload['location_uri'].split('//')[-1]
+                _, target_bucket, target_obj_path = tuple(target_minio_path.split('/', 2))
+
+                # here the minio api only accept the 5GB in copy.
+                # if >5GB we copy it on server side part by part
+                # and fall back to relaying it through this process if that fails
+                file_size_gb = payload['size']
+                if file_size_gb < 5e9:
+                    logger.info('File size less than 5GiB')
+                    logger.info(
+                        f'Copying object from "{src_bucket}/{src_obj_path}" to \
+                            "{target_bucket}/{target_obj_path}".'
+                    )
+                    result = await minio_client.copy_object(target_bucket, target_obj_path, src_bucket, src_obj_path)
+                else:
+                    logger.info('File size greater than 5GiB')
+                    try:
+                        result = await minio_client.copy_large_object(
+                            target_bucket, target_obj_path, src_bucket, src_obj_path, file_size_gb
+                        )
+                    except Exception:
+                        logger.exception('Unable to perform multipart copy. Falling back to streaming relay.')
+                        result = await minio_client.relay_object(
+                            target_bucket, target_obj_path, src_bucket, src_obj_path, file_size_gb
+                        )
                 version_id = result.get('VersionId', '')  # empty in case versioning is unsupported
 
-            logger.info(f'Minio Copy {src_bucket}/{src_obj_path} Success')
-            payload['version'] = version_id
-            new_file_node = self.create_node_with_parent(payload)
-        except Exception:
-            logger.exception('Error when copying.')
-            raise
+                logger.info(f'Minio Copy {src_bucket}/{src_obj_path} Success')
+            except Exception:
+                logger.exception('Error when copying.')
+                raise
+
+        return version_id
+
+    def create_file_node(
+        self,
+        project: str,
+        source_file: Node,
+        parent_node: Node,
+        folder_display_path: Path,
+        minio_client: MinioBoto3Client,
+        tags: Optional[List] = None,
+        attribute: Optional[dict] = None,
+        new_name: Optional[str] = None,
+        system_tags: Optional[List] = None,
+    ) -> Tuple[Node, str]:
+        payload = self.get_file_node_payload(
+            project, source_file, parent_node, folder_display_path, tags, attribute, new_name, system_tags
+        )
+
+        version_id = run_coroutine(self.copy_file_object(source_file, payload, minio_client))
+
+        payload['version'] = version_id
+        new_file_node = self.create_node_with_parent(payload)
 
         return new_file_node, version_id
 
-    def create_folder_node(
+    def get_folder_node_payload(
         self,
         project_code: str,
         source_folder: Node,
@@ -272,7 +433,9 @@ class MetadataServiceClient:
         tags: Optional[List[str]] = None,
         new_name: Optional[str] = None,
         system_tags: Optional[List[str]] = None,
-    ) -> Node:
+    ) -> Dict[str, Any]:
+        """Return payload for creation of the folder node copied from source folder."""
+
         if tags is None:
             tags = []
 
@@ -300,34 +463,74 @@ class MetadataServiceClient:
             'tags': tags,
             'system_tags': system_tags,
         }
+
+        return payload
+
+    def create_folder_node(
+        self,
+        project_code: str,
+        source_folder: Node,
+        parent_node: Node,
+        tags: Optional[List[str]] = None,
+        new_name: Optional[str] = None,
+        system_tags: Optional[List[str]] = None,
+    ) -> Node:
+        payload = self.get_folder_node_payload(project_code, source_folder, parent_node, tags, new_name, system_tags)
         folder_node = self.create_node_with_parent(payload)
 
         return folder_node
 
-    def archived_node(self, source_file: Node, minio_client: MinioBoto3Client, operation_type, operator) -> Node:
-        trash_node = self.move_node_to_trash(source_file.id)
+    async def _remove_file_objects(
+        self, files: NodeList, minio_client: MinioBoto3Client, operation_type: str, operator: str
+    ) -> List[str]:
+        """Remove objects of files grouped by bucket and send activity logs for files that were removed.
 
-        try:
+        Return error message for every file which object was not removed.
+        """
+
+        files_by_bucket: Dict[str, Dict[str, Node]] = defaultdict(dict)
+        for file in files:
             # minio location is
             # minio://http://<end_point>/bucket/user/object_path
-            for item in trash_node:
-                if item['type'] == ResourceType.FILE:
-                    # Remove from minio
-                    src_minio_path = item['storage'].get('location_uri').split('//')[-1]
-                    _, src_bucket, src_obj_path = tuple(src_minio_path.split('/', 2))
-
-                    loop = asyncio.get_event_loop()
-                    loop.run_until_complete(minio_client.remove_object(src_bucket, src_obj_path))
-                    logger.info(
-                        f'Minio Delete \
-                        {src_bucket}/{src_obj_path} Success'
-                    )
-                    # Add activity log
-                    loop.run_until_complete(
-                        KafkaProducer.create_file_operation_logs(Node(item), operation_type, operator, None)
-                    )
+            src_minio_path = file['storage'].get('location_uri').split('//')[-1]
+            _, src_bucket, src_obj_path = tuple(src_minio_path.split('/', 2))
+            files_by_bucket[src_bucket][src_obj_path] = file
+
+        buckets = list(files_by_bucket)
+        results = await asyncio.gather(
+            *(minio_client.remove_objects(bucket, list(files_by_bucket[bucket])) for bucket in buckets)
+        )
+
+        errors = []
+        for bucket, bucket_errors in zip(buckets, results):
+            for src_obj_path, file in files_by_bucket[bucket].items():
+                if src_obj_path in bucket_errors:
+                    logger.error(f'Minio Delete {bucket}/{src_obj_path} Failed: {bucket_errors[src_obj_path]}')
+                    errors.append(f'{bucket}/{src_obj_path}: {bucket_errors[src_obj_path]}')
+                    continue
+
+                await KafkaProducer.create_file_operation_logs(file, operation_type, operator, None)
+
+        return errors
+
+    async def archive_node(
+        self, node: Node, minio_client: MinioBoto3Client, operation_type: str, operator: str
+    ) -> List[Dict[str, Any]]:
+        """Move node into trash bin and remove objects of all trashed files."""
+
+        trash_node = await self.async_client.move_node_to_trash(node.id)
+        files = NodeList([item for item in trash_node if item['type'] == ResourceType.FILE])
+
+        try:
+            errors = await self._remove_file_objects(files, minio_client, operation_type, operator)
         except Exception:
             logger.exception('Error when removing file.')
             raise
 
+        if errors:
+            raise Exception(errors)
+
         return trash_node
+
+    def archived_node(self, source_file: Node, minio_client: MinioBoto3Client, operation_type, operator) -> Node:
+        return run_coroutine(self.archive_node(source_file, minio_client, operation_type, operator))
@@ -0,0 +1,80 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+import logging
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Sequence
+
+from operations.metrics import get_job_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StepSkipped(Exception):
+    """Raised by step that was not started because some of its dependencies have failed or were skipped."""
+
+
+class Step:
+    def __init__(self, name: str, function: Callable[..., Awaitable[Any]], depends_on: Sequence[str]) -> None:
+        self.name = name
+        self.function = function
+        self.depends_on = tuple(depends_on)
+
+
+class StepGraph:
+    """Run async steps concurrently starting each of them as soon as the steps it depends on are finished.
+
+    Step function receives results of its dependencies as positional arguments. When step fails all steps depending on
+    it directly or transitively are skipped, and exceptions of failed steps are raised together once the remaining
+    steps are finished.
+    """
+
+    def __init__(self) -> None:
+        self.steps: Dict[str, Step] = {}
+
+    def add(self, name: str, function: Callable[..., Awaitable[Any]], depends_on: Sequence[str] = ()) -> None:
+        """Add step that depends on already added steps."""
+
+        unknown_steps = set(depends_on) - set(self.steps)
+        if unknown_steps:
+            raise ValueError(f'Step "{name}" depends on unknown steps {unknown_steps}.')
+
+        self.steps[name] = Step(name, function, depends_on)
+
+    async def _run_step(self, step: Step, tasks: Dict[str, asyncio.Task]) -> Any:
+        dependencies = [tasks[name] for name in step.depends_on]
+        if dependencies:
+            await asyncio.wait(dependencies)
+            if any(dependency.exception() is not None for dependency in dependencies):
+                logger.warning(f'Skipping step "{step.name}" because some of its dependencies have failed.')
+                raise StepSkipped(step.name)
+
+        with get_job_metrics().measure(f'step.{step.name}'):
+            return await step.function(*(dependency.result() for dependency in dependencies))
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all steps and return their results."""
+
+        tasks: Dict[str, asyncio.Task] = {}
+        for name, step in self.steps.items():
+            tasks[name] = asyncio.ensure_future(self._run_step(step, tasks))
+
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception) and not isinstance(result, StepSkipped)]
+        if errors:
+            raise Exception(errors)
+
+        return dict(zip(tasks, results))
@@ -10,39 +10,322 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+import asyncio
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from pathlib import Path
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
 from typing import Union
 
+from operations.event_loop import run_coroutine
 from operations.managers import NodeManager
+from operations.metrics import get_job_metrics
 from operations.models import Node
 from operations.models import NodeList
+from operations.models import NodeTreeIndex
+from operations.models import TreeSnapshot
 
 
 class Traverser:
-    """Traverse the trees using node manipulations from node manager."""
+    """Traverse the trees using node manipulations from node manager.
 
-    def __init__(self, node_manager: NodeManager) -> None:
+    When prefetch_tree is enabled the whole tree is fetched with one recursive query before traversing and child nodes
+    are read from the in-memory index instead of querying them folder by folder.
+
+    When snapshot from previous traversal is provided the tree structure and exclusions are taken from it without any
+    requests to the metadata service.
+    """
+
+    def __init__(
+        self, node_manager: NodeManager, prefetch_tree: bool = False, snapshot: Optional[TreeSnapshot] = None
+    ) -> None:
         self.node_manager = node_manager
+        self.prefetch_tree = prefetch_tree
+        self.snapshot = snapshot
+        self.tree_index: Optional[NodeTreeIndex] = None
+        self.visited: Dict[str, Tuple[Node, ...]] = {}
+        self.partial_folder_ids: Set[str] = set()
+
+    def take_snapshot(self) -> TreeSnapshot:
+        """Return immutable snapshot of the traversed tree."""
+
+        return TreeSnapshot(self.visited, self.partial_folder_ids)
+
+    def _load_tree(self, source_folder: Node) -> None:
+        if self.snapshot is not None or not self.prefetch_tree:
+            return
+
+        with get_job_metrics().measure('traverser.load_tree'):
+            self.tree_index = NodeTreeIndex.from_nodes(self.node_manager.get_subtree(source_folder))
+
+    def _get_children(self, source_folder: Node) -> NodeList:
+        """Return child nodes of source folder without the excluded ones."""
+
+        with get_job_metrics().measure('traverser.list_children'):
+            if self.snapshot is not None:
+                return NodeList(self.snapshot.get_children(source_folder))
+
+            if self.tree_index is None:
+                nodes = self.node_manager.get_tree(source_folder)
+            else:
+                nodes = self.tree_index.get_children(source_folder)
+
+            return self._filter_children(source_folder, nodes)
+
+    def _filter_children(self, source_folder: Node, nodes: NodeList) -> NodeList:
+        """Return child nodes without the excluded ones remembering them for the snapshot."""
 
-    def _traverse_tree(self, nodes: NodeList, source_folder: Node, destination_folder: Union[Path, Node]) -> None:
         excluded_geids = self.node_manager.exclude_nodes(source_folder, nodes)
+
+        children = NodeList([node for node in nodes if node.id not in excluded_geids])
+        self.visited[source_folder.id] = tuple(children)
+        if len(children) < len(nodes):
+            self.partial_folder_ids.add(source_folder.id)
+
+        return children
+
+    def _traverse_tree(self, nodes: NodeList, destination_folder: Union[Path, Node]) -> None:
         errors = []
 
         for source_entry in nodes:
-            if source_entry.id in excluded_geids:
-                continue
             try:
                 if source_entry.is_folder:
-                    existing_destination_folder = self.node_manager.process_folder(source_entry, destination_folder)
-                    self.traverse_tree(source_entry, existing_destination_folder)
+                    with get_job_metrics().measure('traverser.process_folder'):
+                        existing_destination_folder = self.node_manager.process_folder(source_entry, destination_folder)
+                    self._traverse_folder(source_entry, existing_destination_folder)
                 else:
-                    self.node_manager.process_file(source_entry, destination_folder)
+                    with get_job_metrics().measure('traverser.process_file'):
+                        self.node_manager.process_file(source_entry, destination_folder)
             except Exception as e:
                 errors.append(e)
         if errors:
             raise Exception(errors)
 
+    def _traverse_folder(self, source_folder: Node, destination_folder: Union[Path, Node]) -> None:
+        nodes = self._get_children(source_folder)
+        self._traverse_tree(nodes, destination_folder)
+
     def traverse_tree(self, source_folder: Node, destination_folder: Union[Path, Node]) -> None:
         """Start tree traversing."""
-        nodes = self.node_manager.get_tree(source_folder)
-        self._traverse_tree(nodes, source_folder, destination_folder)
+
+        self._load_tree(source_folder)
+        try:
+            self._traverse_folder(source_folder, destination_folder)
+        finally:
+            with get_job_metrics().measure('traverser.flush'):
+                self.node_manager.flush()
+
+
+Task = Tuple[Callable[..., List[Any]], Node, Union[Path, Node]]
+
+
+class ConcurrentTraverser(Traverser):
+    """Traverse the trees processing sibling files and independent subtrees in a pool of worker threads.
+
+    Folder is always processed before any of its children. All exceptions raised while processing nodes are collected
+    and raised together once the whole tree is traversed.
+    """
+
+    def __init__(
+        self,
+        node_manager: NodeManager,
+        max_workers: int,
+        prefetch_tree: bool = False,
+        snapshot: Optional[TreeSnapshot] = None,
+    ) -> None:
+        super().__init__(node_manager, prefetch_tree, snapshot)
+
+        self.max_workers = max_workers
+
+    def _list_tasks(self, source_folder: Node, destination_folder: Union[Path, Node]) -> List[Task]:
+        """Return tasks for processing all child nodes of source folder."""
+
+        tasks = []
+        for source_entry in self._get_children(source_folder):
+            if source_entry.is_folder:
+                tasks.append((self._process_folder, source_entry, destination_folder))
+            else:
+                tasks.append((self._process_file, source_entry, destination_folder))
+
+        return tasks
+
+    def _process_folder(self, source_folder: Node, destination_parent_folder: Union[Path, Node]) -> List[Task]:
+        """Process one folder and return tasks for its child nodes."""
+
+        with get_job_metrics().measure('traverser.process_folder'):
+            existing_destination_folder = self.node_manager.process_folder(source_folder, destination_parent_folder)
+        return self._list_tasks(source_folder, existing_destination_folder)
+
+    def _process_file(self, source_file: Node, destination_folder: Union[Path, Node]) -> List[Task]:
+        with get_job_metrics().measure('traverser.process_file'):
+            self.node_manager.process_file(source_file, destination_folder)
+        return []
+
+    def traverse_tree(self, source_folder: Node, destination_folder: Union[Path, Node]) -> None:
+        """Start tree traversing."""
+
+        self._load_tree(source_folder)
+        tasks = self._list_tasks(source_folder, destination_folder)
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(*task) for task in tasks}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        pending.update(executor.submit(*task) for task in future.result())
+                    except Exception as e:
+                        errors.append(e)
+
+        try:
+            with get_job_metrics().measure('traverser.flush'):
+                self.node_manager.flush()
+        except Exception as e:
+            errors.append(e)
+
+        if errors:
+            raise Exception(errors)
+
+
+AsyncTask = Tuple[Callable[..., Awaitable[List[Any]]], Node, Union[Path, Node]]
+
+
+class AsyncTraverser(Traverser):
+    """Traverse the trees in the event loop using async methods of node manager.
+
+    Sibling files and independent subtrees are processed by limited number of concurrent tasks and folder is always
+    processed before any of its children. All exceptions raised while processing nodes are collected and raised
+    together once the whole tree is traversed. When flush interval is set, node manager is asked to flush expired
+    buffers every flush interval seconds while the tree is traversed.
+    """
+
+    def __init__(
+        self,
+        node_manager: NodeManager,
+        max_tasks: int,
+        prefetch_tree: bool = False,
+        snapshot: Optional[TreeSnapshot] = None,
+        flush_interval: float = 0,
+    ) -> None:
+        super().__init__(node_manager, prefetch_tree, snapshot)
+
+        self.max_tasks = max_tasks
+        self.flush_interval = flush_interval
+
+    async def _load_tree_async(self, source_folder: Node) -> None:
+        if self.snapshot is not None or not self.prefetch_tree:
+            return
+
+        with get_job_metrics().measure('traverser.load_tree'):
+            self.tree_index = NodeTreeIndex.from_nodes(await self.node_manager.get_subtree_async(source_folder))
+
+    async def _get_children_async(self, source_folder: Node) -> NodeList:
+        if self.snapshot is not None or self.tree_index is not None:
+            return self._get_children(source_folder)
+
+        with get_job_metrics().measure('traverser.list_children'):
+            nodes = await self.node_manager.get_tree_async(source_folder)
+
+            return self._filter_children(source_folder, nodes)
+
+    async def _list_tasks(self, source_folder: Node, destination_folder: Union[Path, Node]) -> List[AsyncTask]:
+        """Return tasks for processing all child nodes of source folder."""
+
+        tasks = []
+        for source_entry in await self._get_children_async(source_folder):
+            if source_entry.is_folder:
+                tasks.append((self._process_folder, source_entry, destination_folder))
+            else:
+                tasks.append((self._process_file, source_entry, destination_folder))
+
+        return tasks
+
+    async def _process_folder(
+        self, source_folder: Node, destination_parent_folder: Union[Path, Node]
+    ) -> List[AsyncTask]:
+        """Process one folder and return tasks for its child nodes."""
+
+        with get_job_metrics().measure('traverser.process_folder'):
+            existing_destination_folder = await self.node_manager.process_folder_async(
+                source_folder, destination_parent_folder
+            )
+        return await self._list_tasks(source_folder, existing_destination_folder)
+
+    async def _process_file(self, source_file: Node, destination_folder: Union[Path, Node]) -> List[AsyncTask]:
+        with get_job_metrics().measure('traverser.process_file'):
+            await self.node_manager.process_file_async(source_file, destination_folder)
+        return []
+
+    async def _process_tasks(self, queue: asyncio.Queue, errors: List[Exception]) -> None:
+        """Process tasks from the queue until cancelled adding tasks for child nodes back to the queue."""
+
+        while True:
+            function, source_entry, destination_folder = await queue.get()
+            try:
+                for task in await function(source_entry, destination_folder):
+                    queue.put_nowait(task)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                queue.task_done()
+
+    async def _flush_expired(self, stopped: asyncio.Event, errors: List[Exception]) -> None:
+        """Flush expired buffers of node manager every flush interval until stopped.
+
+        Flush in progress is never cancelled, so buffered data taken by it is not lost.
+        """
+
+        while not stopped.is_set():
+            try:
+                await asyncio.wait_for(stopped.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                try:
+                    with get_job_metrics().measure('traverser.flush_expired'):
+                        await self.node_manager.flush_expired_async()
+                except Exception as e:
+                    errors.append(e)
+
+    async def traverse_tree_async(self, source_folder: Node, destination_folder: Union[Path, Node]) -> None:
+        """Start tree traversing in the running event loop."""
+
+        await self._load_tree_async(source_folder)
+        queue: asyncio.Queue = asyncio.Queue()
+        for task in await self._list_tasks(source_folder, destination_folder):
+            queue.put_nowait(task)
+        errors = []
+
+        workers = [asyncio.ensure_future(self._process_tasks(queue, errors)) for _ in range(self.max_tasks)]
+        stopped = asyncio.Event()
+        flusher = asyncio.ensure_future(self._flush_expired(stopped, errors)) if self.flush_interval > 0 else None
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            stopped.set()
+            if flusher is not None:
+                await flusher
+
+        try:
+            with get_job_metrics().measure('traverser.flush'):
+                await self.node_manager.flush_async()
+        except Exception as e:
+            errors.append(e)
+
+        if errors:
+            raise Exception(errors)
+
+    def traverse_tree(self, source_folder: Node, destination_folder: Union[Path, Node]) -> None:
+        """Start tree traversing in the shared event loop and wait until it is finished."""
+
+        run_coroutine(self.traverse_tree_async(source_folder, destination_folder))
@@ -12,6 +12,7 @@
 
 pytest_plugins = [
     'tests.fixtures.fake',
+    'tests.fixtures.minio',
     'tests.fixtures.node',
     'tests.fixtures.services',
 ]
@@ -0,0 +1,136 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Set
+
+import pytest
+from operations.minio_boto3_client import MinioBoto3Client
+
+
+class FakeStreamingBody:
+    """In-memory replacement for aiobotocore streaming body."""
+
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+        self.position = 0
+
+    async def __aenter__(self) -> 'FakeStreamingBody':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def read(self, size: int) -> bytes:
+        chunk = self.content[self.position : self.position + size]  # noqa: E203
+        self.position += len(chunk)
+        return chunk
+
+
+class FakeS3Client:
+    """In-memory replacement for aioboto3 s3 client that supports multipart operations."""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.aborted: List[str] = []
+        self.calls: List[str] = []
+        self.part_failures: Dict[int, int] = {}
+        self.delete_failures: Set[str] = set()
+        self.delete_batch_sizes: List[int] = []
+
+    async def __aenter__(self) -> 'FakeS3Client':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def _check_part(self, part_number: int) -> None:
+        """Fail part processing while there are failures left for this part number."""
+
+        if self.part_failures.get(part_number, 0) > 0:
+            self.part_failures[part_number] -= 1
+            raise Exception(f'Unable to process part {part_number}')
+
+    async def get_object(self, Bucket: str, Key: str, Range: str) -> Dict[str, Any]:
+        self.calls.append('get_object')
+        start, end = map(int, Range.replace('bytes=', '').split('-'))
+        return {'Body': FakeStreamingBody(self.objects[f'{Bucket}/{Key}'][start : end + 1])}  # noqa: E203
+
+    async def create_multipart_upload(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        self.calls.append('create_multipart_upload')
+        upload_id = f'upload-{len(self.uploads)}'
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    async def upload_part_copy(
+        self,
+        Bucket: str,
+        Key: str,
+        UploadId: str,
+        PartNumber: int,
+        CopySource: Dict[str, str],
+        CopySourceRange: str,
+    ) -> Dict[str, Any]:
+        self.calls.append('upload_part_copy')
+        self._check_part(PartNumber)
+        start, end = map(int, CopySourceRange.replace('bytes=', '').split('-'))
+        source = self.objects[f'{CopySource["Bucket"]}/{CopySource["Key"]}']
+        self.uploads[UploadId][PartNumber] = source[start : end + 1]  # noqa: E203
+        return {'CopyPartResult': {'ETag': f'etag-{PartNumber}'}}
+
+    async def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any) -> Dict[str, Any]:
+        self.calls.append('upload_part')
+        content = Body.read() if hasattr(Body, 'read') else bytes(Body)
+        self._check_part(PartNumber)
+        self.uploads[UploadId][PartNumber] = content
+        return {'ETag': f'etag-{PartNumber}'}
+
+    async def complete_multipart_upload(
+        self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        self.calls.append('complete_multipart_upload')
+        parts = self.uploads.pop(UploadId)
+        part_numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        self.objects[f'{Bucket}/{Key}'] = b''.join(parts[part_number] for part_number in part_numbers)
+        return {'VersionId': f'version-{UploadId}'}
+
+    async def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> Dict[str, Any]:
+        self.calls.append('abort_multipart_upload')
+        self.uploads.pop(UploadId)
+        self.aborted.append(UploadId)
+        return {}
+
+    async def delete_objects(self, Bucket: str, Delete: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls.append('delete_objects')
+        self.delete_batch_sizes.append(len(Delete['Objects']))
+        errors = []
+        for item in Delete['Objects']:
+            if item['Key'] in self.delete_failures:
+                errors.append({'Key': item['Key'], 'Code': 'AccessDenied', 'Message': 'Access Denied'})
+                continue
+            self.objects.pop(f'{Bucket}/{item["Key"]}', None)
+        return {'Errors': errors} if errors else {}
+
+
+@pytest.fixture
+def fake_s3_client() -> FakeS3Client:
+    yield FakeS3Client()
+
+
+@pytest.fixture
+def minio_client(mocker, fake_s3_client) -> MinioBoto3Client:
+    client = MinioBoto3Client('access-key', 'secret-key', 'minio-endpoint', False)
+    mocker.patch.object(client, '_get_s3_client', return_value=fake_s3_client)
+    yield client
@@ -10,6 +10,11 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+import json
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
 from uuid import uuid4
 
 import pytest
@@ -23,6 +28,8 @@ from sqlalchemy import MetaData
 from sqlalchemy import String
 from sqlalchemy import Table
 from sqlalchemy.future import create_engine
+from werkzeug import Request
+from werkzeug import Response
 
 
 @pytest.fixture
@@ -38,8 +45,11 @@ def metadata(inmemory_engine):
         metadata,
         Column('id', String(), unique=True, primary_key=True, default=uuid4),
         Column('request_id', String()),
+        Column('entity_id', String()),
+        Column('parent_id', String()),
         Column('entity_type', String()),
         Column('review_status', String()),
+        Column('copy_status', String()),
     )
     Table(
         'approval_request',
@@ -76,11 +86,85 @@ def dataops_client(httpserver) -> DataopsServiceClient:
 
 @pytest.fixture
 def metadata_service_client(httpserver) -> MetadataServiceClient:
-    yield MetadataServiceClient(
-        httpserver.url_for('/'), 'minio-endpoint', 'core-zone', 'temp-dir', httpserver.url_for('/')
-    )
+    yield MetadataServiceClient(httpserver.url_for('/'), 'minio-endpoint', 'core-zone', httpserver.url_for('/'))
 
 
 @pytest.fixture
 def audit_trail_service_client(httpserver) -> AuditTrailServiceClient:
     yield AuditTrailServiceClient(httpserver.url_for('/'))
+
+
+class FakeMetadataServer:
+    """Metadata service routes for node creation backed by in-memory storage."""
+
+    def __init__(self, httpserver) -> None:
+        self.items: List[Dict[str, Any]] = []
+        self.batch_sizes: List[int] = []
+        httpserver.expect_request('/v1/items/batch/', method='POST').respond_with_handler(self.create_items)
+
+    def create_items(self, request: Request) -> Response:
+        items = [{**item, 'id': str(uuid4())} for item in request.json['items']]
+        self.items.extend(items)
+        self.batch_sizes.append(len(items))
+        return Response(json.dumps({'result': items}), content_type='application/json')
+
+
+@pytest.fixture
+def fake_metadata_server(httpserver) -> FakeMetadataServer:
+    yield FakeMetadataServer(httpserver)
+
+
+class FakeDataopsLockServer:
+    """Dataops service bulk lock routes backed by in-memory lock state that understands prefix keys.
+
+    Key ending with slash locks the resource and all resources under it. Read locks can be shared, any other
+    combination of overlapping locks is a conflict.
+    """
+
+    def __init__(self, httpserver) -> None:
+        self.locks: List[Tuple[str, str]] = []
+        self.requests: List[Tuple[str, int]] = []
+        httpserver.expect_request('/v2/resource/lock/bulk', method='POST').respond_with_handler(self.lock)
+        httpserver.expect_request('/v2/resource/lock/bulk', method='DELETE').respond_with_handler(self.unlock)
+
+    @staticmethod
+    def covers(key: str, other_key: str) -> bool:
+        if key == other_key:
+            return True
+
+        return key.endswith('/') and (other_key.startswith(key) or other_key == key[:-1])
+
+    def is_conflict(self, key: str, operation: str) -> bool:
+        for locked_key, locked_operation in self.locks:
+            if locked_operation == operation == 'read':
+                continue
+
+            if self.covers(locked_key, key) or self.covers(key, locked_key):
+                return True
+
+        return False
+
+    def lock(self, request: Request) -> Response:
+        resource_keys, operation = request.json['resource_keys'], request.json['operation']
+        self.requests.append(('lock', len(resource_keys)))
+        if any(self.is_conflict(key, operation) for key in resource_keys):
+            return Response(
+                json.dumps({'error_msg': 'Resource is locked'}), status=409, content_type='application/json'
+            )
+
+        self.locks.extend((key, operation) for key in resource_keys)
+        return Response(json.dumps({'result': resource_keys}), content_type='application/json')
+
+    def unlock(self, request: Request) -> Response:
+        resource_keys, operation = request.json['resource_keys'], request.json['operation']
+        self.requests.append(('unlock', len(resource_keys)))
+        for key in resource_keys:
+            if (key, operation) in self.locks:
+                self.locks.remove((key, operation))
+
+        return Response(json.dumps({'result': resource_keys}), content_type='application/json')
+
+
+@pytest.fixture
+def fake_dataops_lock_server(httpserver) -> FakeDataopsLockServer:
+    yield FakeDataopsLockServer(httpserver)
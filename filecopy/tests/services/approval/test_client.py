@@ -10,7 +10,28 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+import pytest
+from operations.services.approval.client import CopyStatusWriter
 from operations.services.approval.models import ApprovalEntities
+from operations.services.approval.models import ApprovalEntity
+from operations.services.approval.models import ApprovalEntityIndex
+from operations.services.approval.models import CopyStatus
+from operations.services.approval.models import EntityType
+from operations.services.approval.models import ReviewStatus
+from sqlalchemy import insert
+from sqlalchemy import select
+
+
+@pytest.fixture
+def approval_entities(approval_service_client, fake):
+    entity_ids = [fake.uuid4() for _ in range(3)]
+    with approval_service_client.engine.begin() as connection:
+        connection.execute(
+            insert(approval_service_client.approval_entity),
+            [{'id': entity_id, 'copy_status': CopyStatus.PENDING} for entity_id in entity_ids],
+        )
+
+    yield entity_ids
 
 
 class TestApprovalServiceClient:
@@ -20,3 +41,131 @@ class TestApprovalServiceClient:
         result = approval_service_client.get_approval_entities(request_id)
 
         assert isinstance(result, ApprovalEntities)
+
+    def test_get_approval_entity_index_streams_approved_entities_with_parents(self, approval_service_client, fake):
+        request_id = fake.uuid4()
+        folder_geid, file_geid, denied_file_geid = fake.uuid4(), fake.uuid4(), fake.uuid4()
+        rows = [
+            {'entity_id': folder_geid, 'parent_id': None, 'entity_type': EntityType.FOLDER},
+            {'entity_id': file_geid, 'parent_id': folder_geid, 'entity_type': EntityType.FILE},
+            {'entity_id': denied_file_geid, 'parent_id': folder_geid, 'review_status': ReviewStatus.DENIED},
+        ]
+        with approval_service_client.engine.begin() as connection:
+            connection.execute(
+                insert(approval_service_client.approval_entity),
+                [
+                    {
+                        'id': fake.uuid4(),
+                        'request_id': request_id,
+                        'entity_type': EntityType.FILE,
+                        'review_status': ReviewStatus.APPROVED,
+                        'copy_status': CopyStatus.PENDING,
+                        **row,
+                    }
+                    for row in rows
+                ],
+            )
+
+        index = approval_service_client.get_approval_entity_index(request_id, batch_size=1)
+
+        assert isinstance(index, ApprovalEntityIndex)
+        assert len(index) == 3
+        assert set(index.get_approved().geids) == {folder_geid, file_geid}
+
+    def test_update_copy_statuses_updates_all_entities_in_one_transaction(
+        self, approval_service_client, approval_entities
+    ):
+        copied_ids = approval_entities[:2]
+
+        approval_service_client.update_copy_statuses({entity_id: CopyStatus.COPIED for entity_id in copied_ids})
+
+        table = approval_service_client.approval_entity
+        with approval_service_client.engine.connect() as connection:
+            rows = connection.execute(select(table.c.id, table.c.copy_status)).fetchall()
+        assert dict(rows) == {
+            approval_entities[0]: CopyStatus.COPIED,
+            approval_entities[1]: CopyStatus.COPIED,
+            approval_entities[2]: CopyStatus.PENDING,
+        }
+
+
+class TestCopyStatusWriter:
+    def create_approval_entity(self, fake) -> ApprovalEntity:
+        return ApprovalEntity(id=fake.uuid4(), name=fake.word())
+
+    def test_add_writes_buffered_statuses_when_batch_size_is_reached(self, mocker, fake):
+        approval_service_client = mocker.Mock()
+        writer = CopyStatusWriter(approval_service_client, 2, 3600)
+        entities = [self.create_approval_entity(fake) for _ in range(3)]
+
+        for entity in entities:
+            writer.add(entity, CopyStatus.COPIED)
+
+        approval_service_client.update_copy_statuses.assert_called_once_with(
+            {entities[0].id: CopyStatus.COPIED, entities[1].id: CopyStatus.COPIED}
+        )
+        assert writer.pending == {entities[2].id: CopyStatus.COPIED}
+
+    def test_add_keeps_buffered_statuses_until_flush_interval_has_passed(self, mocker, fake):
+        approval_service_client = mocker.Mock()
+        writer = CopyStatusWriter(approval_service_client, 100, 0)
+        entity = self.create_approval_entity(fake)
+
+        writer.add(entity, CopyStatus.COPIED)
+
+        approval_service_client.update_copy_statuses.assert_not_called()
+
+    def test_flush_expired_writes_buffered_statuses_when_flush_interval_has_passed(self, mocker, fake):
+        approval_service_client = mocker.Mock()
+        writer = CopyStatusWriter(approval_service_client, 100, 3600)
+        entities = [self.create_approval_entity(fake) for _ in range(2)]
+        writer.add(entities[0], CopyStatus.COPIED)
+        writer.flush_expired()
+        writer.last_write_time -= 3600
+        writer.add(entities[1], CopyStatus.COPIED)
+
+        writer.flush_expired()
+
+        approval_service_client.update_copy_statuses.assert_called_once_with(
+            {entities[0].id: CopyStatus.COPIED, entities[1].id: CopyStatus.COPIED}
+        )
+
+    def test_add_keeps_statuses_of_failed_batch_buffered_and_retries_them_with_next_batch(self, mocker, fake):
+        approval_service_client = mocker.Mock()
+        approval_service_client.update_copy_statuses.side_effect = [Exception('Database is not available'), None]
+        writer = CopyStatusWriter(approval_service_client, 2, 3600)
+        entities = [self.create_approval_entity(fake) for _ in range(4)]
+
+        for entity in entities[:3]:
+            writer.add(entity, CopyStatus.COPIED)
+
+        assert approval_service_client.update_copy_statuses.call_count == 1
+        assert len(writer.pending) == 3
+
+        writer.add(entities[3], CopyStatus.COPIED)
+
+        assert approval_service_client.update_copy_statuses.call_count == 2
+        assert writer.pending == {}
+
+    def test_flush_writes_remaining_statuses(self, mocker, fake):
+        approval_service_client = mocker.Mock()
+        writer = CopyStatusWriter(approval_service_client, 100, 3600)
+        entity = self.create_approval_entity(fake)
+        writer.add(entity, CopyStatus.COPIED)
+
+        writer.flush()
+        writer.flush()
+
+        approval_service_client.update_copy_statuses.assert_called_once_with({entity.id: CopyStatus.COPIED})
+
+    def test_flush_keeps_statuses_buffered_when_write_fails(self, mocker, fake):
+        approval_service_client = mocker.Mock()
+        approval_service_client.update_copy_statuses.side_effect = Exception('Database is not available')
+        writer = CopyStatusWriter(approval_service_client, 100, 3600)
+        entity = self.create_approval_entity(fake)
+        writer.add(entity, CopyStatus.COPIED)
+
+        with pytest.raises(Exception):
+            writer.flush()
+
+        assert writer.pending == {entity.id: CopyStatus.COPIED}
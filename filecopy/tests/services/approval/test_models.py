@@ -16,6 +16,8 @@ from typing import Callable
 import pytest
 from operations.services.approval.models import ApprovalEntities
 from operations.services.approval.models import ApprovalEntity
+from operations.services.approval.models import ApprovalEntityIndex
+from operations.services.approval.models import ApprovalEntityRecord
 from operations.services.approval.models import ApprovedApprovalEntities
 from operations.services.approval.models import CopyStatus
 from operations.services.approval.models import EntityType
@@ -156,3 +158,43 @@ class TestApprovalEntities:
         approved_entities = approval_entities.get_approved()
 
         assert approved_entities == expected_approved_entities
+
+
+class TestApprovalEntityIndex:
+    def test_from_rows_stores_compact_records_by_entity_id(self, create_approval_entity):
+        approval_entity = create_approval_entity(
+            entity_type=EntityType.FILE, review_status=ReviewStatus.APPROVED, copy_status=CopyStatus.PENDING
+        )
+
+        index = ApprovalEntityIndex.from_rows([approval_entity])
+
+        assert index == {
+            approval_entity.entity_id: ApprovalEntityRecord(approval_entity.id, approval_entity.parent_id, True)
+        }
+
+    def test_get_approved_returns_same_entities_as_approval_entities(self, create_approval_entity):
+        folder = create_approval_entity(parent_id=None, entity_type=EntityType.FOLDER)
+        approved_file = create_approval_entity(
+            parent_id=folder.entity_id,
+            entity_type=EntityType.FILE,
+            review_status=ReviewStatus.APPROVED,
+            copy_status=CopyStatus.PENDING,
+        )
+        copied_file = create_approval_entity(
+            parent_id=folder.entity_id,
+            entity_type=EntityType.FILE,
+            review_status=ReviewStatus.APPROVED,
+            copy_status=CopyStatus.COPIED,
+        )
+        approval_entities = ApprovalEntities(
+            {entity.entity_id: entity for entity in (folder, approved_file, copied_file)}
+        )
+
+        approved_entities = ApprovalEntityIndex.from_rows(approval_entities.values()).get_approved()
+
+        assert (
+            approved_entities.geids
+            == approval_entities.get_approved().geids
+            == {folder.entity_id, approved_file.entity_id}
+        )
+        assert approved_entities[approved_file.entity_id].id == approved_file.id
@@ -12,8 +12,25 @@
 
 from pathlib import Path
 
+import pytest
+from operations.services.dataops.client import DataopsServiceClient
 from operations.services.dataops.client import JobStatus
+from operations.services.dataops.client import ResourceKeys
 from operations.services.dataops.client import ResourceLockOperation
+from operations.services.dataops.client import get_prefix_key
+from operations.services.dataops.client import iter_chunks
+
+
+def test_iter_chunks_yields_string_keys_in_chunks_of_chunk_size():
+    chunks = list(iter_chunks([Path('a'), 'b', Path('c')], 2))
+
+    assert chunks == [['a', 'b'], ['c']]
+
+
+def test_resource_keys_can_be_iterated_multiple_times():
+    resource_keys = ResourceKeys(lambda: (f'key-{i}' for i in range(2)))
+
+    assert list(resource_keys) == list(resource_keys) == ['key-0', 'key-1']
 
 
 class TestDataopsServiceClient:
@@ -23,7 +40,48 @@ class TestDataopsServiceClient:
 
         received_body = dataops_client.lock_resources([Path('key')], ResourceLockOperation.READ)
 
-        assert received_body == expected_body
+        assert received_body == [expected_body]
+
+    def test_lock_resources_sends_resource_keys_in_chunks(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_chunk_size=2)
+        for resource_keys in (['a', 'b'], ['c']):
+            httpserver.expect_ordered_request(
+                '/v2/resource/lock/bulk', method='POST', json={'resource_keys': resource_keys, 'operation': 'read'}
+            ).respond_with_json({})
+
+        dataops_client.lock_resources(ResourceKeys(lambda: iter('abc')), ResourceLockOperation.READ)
+
+        httpserver.check_assertions()
+
+    def test_lock_resources_unlocks_already_locked_chunks_when_chunk_cannot_be_locked(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_chunk_size=2)
+        httpserver.expect_ordered_request('/v2/resource/lock/bulk', method='POST').respond_with_json({})
+        httpserver.expect_ordered_request('/v2/resource/lock/bulk', method='POST').respond_with_json({}, status=409)
+        httpserver.expect_ordered_request(
+            '/v2/resource/lock/bulk', method='DELETE', json={'resource_keys': ['a', 'b'], 'operation': 'write'}
+        ).respond_with_json({})
+
+        with pytest.raises(Exception, match='Unable to lock resource keys'):
+            dataops_client.lock_resources(['a', 'b', 'c', 'd'], ResourceLockOperation.WRITE)
+
+        httpserver.check_assertions()
+
+    def test_lock_resources_rejects_iterator_that_cannot_be_iterated_again_for_rollback(self, dataops_client):
+        with pytest.raises(TypeError):
+            dataops_client.lock_resources(iter(['a', 'b']), ResourceLockOperation.READ)
+
+    def test_lock_resources_conflicts_with_resources_under_locked_prefix(self, fake_dataops_lock_server, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'))
+        dataops_client.lock_resources([get_prefix_key('core-project/admin/folder')], ResourceLockOperation.WRITE)
+
+        with pytest.raises(Exception, match='Unable to lock resource keys'):
+            dataops_client.lock_resources(['core-project/admin/folder/file.txt'], ResourceLockOperation.READ)
+        dataops_client.lock_resources(['core-project/admin/folder-2/file.txt'], ResourceLockOperation.READ)
+
+        assert fake_dataops_lock_server.locks == [
+            ('core-project/admin/folder/', 'write'),
+            ('core-project/admin/folder-2/file.txt', 'read'),
+        ]
 
     def test_unlock_resources_returns_response_body(self, dataops_client, httpserver, fake):
         expected_body = fake.pydict(value_types=['str', 'int'])
@@ -31,7 +89,7 @@ class TestDataopsServiceClient:
 
         received_body = dataops_client.unlock_resources([Path('key')], ResourceLockOperation.READ)
 
-        assert received_body == expected_body
+        assert received_body == [expected_body]
 
     def test_update_job_returns_response_body(self, dataops_client, httpserver, fake):
         expected_body = fake.pydict(value_types=['str', 'int'])
@@ -10,6 +10,13 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+from pathlib import Path
+
+import pytest
+from operations.event_loop import run_coroutine
+from operations.models import ResourceType
+
+
 class TestMetadataServiceClient:
     def test_is_file_exists_returns_true_if_node_exists(self, metadata_service_client, mocker, create_node):
         mocker.patch.object(metadata_service_client, 'get_node', return_value=create_node())
@@ -38,3 +45,115 @@ class TestMetadataServiceClient:
         received_response = metadata_service_client.is_folder_exists('zone', 'code', 'path')
 
         assert received_response is False
+
+    def test_search_nodes_returns_nodes_from_all_pages(self, metadata_service_client, httpserver, create_node):
+        node_1 = create_node()
+        node_2 = create_node()
+        httpserver.expect_ordered_request(
+            '/v1/items/search/', query_string={'page': '0', 'page_size': '1'}
+        ).respond_with_json({'result': [node_1], 'page': 0, 'num_of_pages': 2})
+        httpserver.expect_ordered_request(
+            '/v1/items/search/', query_string={'page': '1', 'page_size': '1'}
+        ).respond_with_json({'result': [node_2], 'page': 1, 'num_of_pages': 2})
+
+        received_nodes = metadata_service_client.search_nodes({}, page_size=1)
+
+        assert received_nodes == [node_1, node_2]
+
+    def test_get_subtree_performs_recursive_search_from_start_folder(
+        self, metadata_service_client, httpserver, create_node
+    ):
+        folder = create_node(parent_path='admin', name='folder')
+        expected_node = create_node(parent_path='admin.folder')
+        query_string = {
+            'archived': 'False',
+            'zone': '0',
+            'container_code': 'testproject',
+            'parent_path': 'admin.folder',
+            'recursive': 'True',
+            'page': '0',
+            'page_size': '1000',
+        }
+        httpserver.expect_request('/v1/items/search/', query_string=query_string).respond_with_json(
+            {'result': [expected_node], 'page': 0, 'num_of_pages': 1}
+        )
+
+        received_nodes = metadata_service_client.get_subtree(folder)
+
+        assert received_nodes == [expected_node]
+
+    def test_get_child_names_returns_names_of_nodes_in_folder(self, metadata_service_client, httpserver, create_node):
+        expected_names = {'file1.txt', 'file2.txt'}
+        query_string = {
+            'archived': 'False',
+            'zone': '1',
+            'container_code': 'project',
+            'recursive': 'False',
+            'parent_path': 'admin.folder',
+            'page': '0',
+            'page_size': '1000',
+        }
+        body = {'result': [create_node(name=name) for name in expected_names], 'page': 0, 'num_of_pages': 1}
+        httpserver.expect_request('/v1/items/search/', query_string=query_string).respond_with_json(body)
+
+        received_names = metadata_service_client.get_child_names('Core', 'project', Path('admin/folder'))
+
+        assert received_names == expected_names
+
+    def test_copy_file_object_relays_large_file_when_multipart_copy_fails(
+        self, metadata_service_client, mocker, create_node
+    ):
+        source_file = create_node()
+        source_file['storage']['location_uri'] = 'minio://http://minio/source/path/file.txt'
+        payload = {'location_uri': 'minio://http://minio/dest/path/file.txt', 'size': 6e9}
+        minio_client = mocker.Mock()
+        minio_client.copy_large_object = mocker.AsyncMock(side_effect=Exception)
+        minio_client.relay_object = mocker.AsyncMock(return_value={'VersionId': 'version'})
+
+        received_version_id = run_coroutine(
+            metadata_service_client.copy_file_object(source_file, payload, minio_client)
+        )
+
+        assert received_version_id == 'version'
+        minio_client.relay_object.assert_awaited_once_with('dest', 'path/file.txt', 'source', 'path/file.txt', 6e9)
+
+    def test_create_nodes_creates_nodes_in_chunks_keeping_order(self, metadata_service_client, fake_metadata_server):
+        payloads = [{'name': f'file-{index}'} for index in range(5)]
+
+        received_nodes = metadata_service_client.create_nodes(payloads, chunk_size=2)
+
+        assert [node.name for node in received_nodes] == ['file-0', 'file-1', 'file-2', 'file-3', 'file-4']
+        assert fake_metadata_server.batch_sizes == [2, 2, 1]
+
+    def test_archived_node_removes_objects_of_trashed_files_and_reports_failed_ones(
+        self, metadata_service_client, mocker, create_node
+    ):
+        files = [create_node(type_=ResourceType.FILE) for _ in range(3)]
+        for index, file in enumerate(files):
+            file['storage']['location_uri'] = f'minio://http://minio/bucket-{index % 2}/path/file-{index}.txt'
+        trash_node = [create_node(type_=ResourceType.FOLDER), *files]
+        mocker.patch.object(
+            metadata_service_client.async_client,
+            'move_node_to_trash',
+            new_callable=mocker.AsyncMock,
+            return_value=trash_node,
+        )
+        minio_client = mocker.Mock()
+        minio_client.remove_objects = mocker.AsyncMock(
+            side_effect=lambda bucket, keys: {'path/file-2.txt': 'AccessDenied'} if bucket == 'bucket-0' else {}
+        )
+        create_file_operation_logs = mocker.patch(
+            'operations.kafka_producer.KafkaProducer.create_file_operation_logs', new_callable=mocker.AsyncMock
+        )
+
+        with pytest.raises(Exception) as exc_info:
+            metadata_service_client.archived_node(create_node(), minio_client, 'delete', 'operator')
+
+        assert exc_info.value.args[0] == ['bucket-0/path/file-2.txt: AccessDenied']
+        minio_client.remove_objects.assert_has_awaits(
+            [
+                mocker.call('bucket-0', ['path/file-0.txt', 'path/file-2.txt']),
+                mocker.call('bucket-1', ['path/file-1.txt']),
+            ]
+        )
+        assert [call.args[0].id for call in create_file_operation_logs.await_args_list] == [files[0].id, files[1].id]
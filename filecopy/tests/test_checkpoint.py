@@ -0,0 +1,61 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import pytest
+from operations.checkpoint import CheckpointJournal
+from operations.checkpoint import CopiedFile
+
+
+@pytest.fixture
+def checkpoint_journal(tmp_path) -> CheckpointJournal:
+    checkpoint_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+    yield checkpoint_journal
+    checkpoint_journal.close()
+
+
+class TestCheckpointJournal:
+    def test_record_stores_copied_file_that_is_loaded_by_journal_of_the_same_job(self, checkpoint_journal, tmp_path):
+        checkpoint_journal.record('source-id', 'destination-id', 'version-id')
+        checkpoint_journal.close()
+
+        received_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+
+        assert 'source-id' in received_journal
+        assert received_journal.get('source-id') == CopiedFile('source-id', 'destination-id', 'version-id')
+
+    def test_journal_of_another_job_is_empty(self, checkpoint_journal, tmp_path):
+        checkpoint_journal.record('source-id', 'destination-id', 'version-id')
+
+        received_journal = CheckpointJournal.for_job(tmp_path, 'another-job-id')
+
+        assert len(received_journal) == 0
+
+    def test_journal_skips_partially_written_line_and_appends_after_it(self, checkpoint_journal, tmp_path):
+        checkpoint_journal.record('source-1', 'destination-1', 'version-1')
+        checkpoint_journal.close()
+        with checkpoint_journal.path.open('a') as f:
+            f.write('{"source_id": "source-2", "destina')
+
+        resumed_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+        resumed_journal.record('source-3', 'destination-3', 'version-3')
+        resumed_journal.close()
+
+        received_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+
+        assert set(received_journal.files) == {'source-1', 'source-3'}
+
+    def test_remove_deletes_journal_file(self, checkpoint_journal):
+        checkpoint_journal.record('source-id', 'destination-id', 'version-id')
+
+        checkpoint_journal.remove()
+
+        assert not checkpoint_journal.path.exists()
@@ -0,0 +1,50 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+
+import pytest
+from operations import event_loop
+from operations.event_loop import get_event_loop_thread
+from operations.event_loop import get_shared_event_loop
+from operations.event_loop import run_blocking
+from operations.event_loop import run_coroutine
+from operations.event_loop import run_main
+
+
+async def get_running_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.get_running_loop()
+
+
+class TestRunMain:
+    def test_run_coroutine_uses_loop_of_entry_point_from_blocking_code(self):
+        async def main():
+            loop = asyncio.get_running_loop()
+            used_loop = await run_blocking(run_coroutine, get_running_loop())
+            return loop, used_loop
+
+        loop, used_loop = run_main(main())
+
+        assert used_loop is loop
+        assert event_loop.main_event_loop is None
+
+    def test_run_coroutine_raises_error_inside_of_entry_point_loop(self):
+        async def main():
+            coroutine = get_running_loop()
+            with pytest.raises(RuntimeError):
+                run_coroutine(coroutine)
+
+        run_main(main())
+
+    def test_run_coroutine_uses_background_loop_without_entry_point(self):
+        assert get_shared_event_loop() is get_event_loop_thread()
+        assert run_coroutine(get_running_loop()) is get_event_loop_thread().loop
@@ -0,0 +1,54 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+
+import pytest
+from operations.event_loop import run_coroutine
+from operations.http_client import HTTPConnectionManager
+from operations.http_client import encode_params
+
+
+@pytest.fixture
+def connection_manager() -> HTTPConnectionManager:
+    connection_manager = HTTPConnectionManager(10, 2, 5, 10)
+    yield connection_manager
+    run_coroutine(connection_manager.close())
+
+
+def test_encode_params_encodes_booleans_as_requests_and_skips_none_values():
+    received_params = encode_params({'archived': False, 'recursive': True, 'zone': None, 'page': 0})
+
+    assert received_params == {'archived': 'False', 'recursive': 'True', 'page': 0}
+
+
+class TestHTTPConnectionManager:
+    def test_request_sends_encoded_query_parameters(self, connection_manager, httpserver):
+        httpserver.expect_request('/items/', query_string={'archived': 'False'}).respond_with_json({'result': []})
+
+        response = run_coroutine(connection_manager.get(httpserver.url_for('/items/'), params={'archived': False}))
+
+        assert response.json() == {'result': []}
+
+    def test_request_limits_concurrent_requests_per_host(self, connection_manager, httpserver):
+        async def scenario():
+            semaphore = connection_manager._get_host_semaphore(httpserver.url_for('/first'))
+            same_host_semaphore = connection_manager._get_host_semaphore(httpserver.url_for('/second'))
+            other_host_semaphore = connection_manager._get_host_semaphore('http://other-host/first')
+            return semaphore, same_host_semaphore, other_host_semaphore
+
+        semaphore, same_host_semaphore, other_host_semaphore = run_coroutine(scenario())
+
+        assert semaphore is same_host_semaphore
+        assert semaphore is not other_host_semaphore
+        assert isinstance(semaphore, asyncio.Semaphore)
+        assert semaphore._value == 2
@@ -0,0 +1,121 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+import io
+import uuid
+
+import pytest
+from fastavro import schemaless_reader
+from operations.event_loop import run_coroutine
+from operations.kafka_producer import KafkaProducer
+
+
+class FakeProducer:
+    """Replacement for aiokafka producer that resolves delivery futures on demand."""
+
+    def __init__(self) -> None:
+        self.messages = []
+        self.futures = []
+
+    async def send(self, topic: str, value: bytes) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.messages.append(value)
+        self.futures.append(future)
+        return future
+
+    async def deliver(self, error: Exception = None) -> None:
+        for future in self.futures:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+
+@pytest.fixture
+def producer(mocker):
+    producer = FakeProducer()
+    mocker.patch.object(KafkaProducer, 'producer', producer)
+    mocker.patch.object(KafkaProducer, 'pending', [])
+    mocker.patch.object(KafkaProducer, 'delivery_errors', [])
+    yield producer
+
+
+class TestKafkaProducer:
+    def test_get_schema_parses_schema_only_once(self, mocker):
+        mocker.patch.object(KafkaProducer, 'parsed_schema', None)
+        parse_schema = mocker.patch('operations.kafka_producer.parse_schema', return_value={'type': 'string'})
+
+        KafkaProducer.get_schema()
+        KafkaProducer.get_schema()
+
+        parse_schema.assert_called_once()
+
+    def test_create_file_operation_logs_does_not_wait_for_delivery(self, producer, create_node):
+        nodes = [create_node(id_=str(uuid.uuid4()), name=name, type_='file') for name in ('long-file-name', 'file')]
+
+        for node in nodes:
+            run_coroutine(KafkaProducer.create_file_operation_logs(node, 'delete', 'admin', None))
+
+        messages = [schemaless_reader(io.BytesIO(message), KafkaProducer.get_schema()) for message in producer.messages]
+        assert [message['item_name'] for message in messages] == ['long-file-name', 'file']
+        assert len(KafkaProducer.pending) == 2
+
+    def test_flush_waits_for_all_delivery_futures(self, producer, create_node):
+        node = create_node(id_=str(uuid.uuid4()), type_='file')
+        run_coroutine(KafkaProducer.create_file_operation_logs(node, 'delete', 'admin', None))
+        run_coroutine(producer.deliver())
+
+        run_coroutine(KafkaProducer.flush())
+
+        assert KafkaProducer.pending == []
+
+    def test_flush_raises_exception_when_any_message_is_not_delivered(self, producer, create_node):
+        node = create_node(id_=str(uuid.uuid4()), type_='file')
+        run_coroutine(KafkaProducer.create_file_operation_logs(node, 'delete', 'admin', None))
+        run_coroutine(producer.deliver(ValueError('Broker is not available')))
+
+        with pytest.raises(Exception, match='Broker is not available'):
+            run_coroutine(KafkaProducer.flush())
+
+    def test_create_file_operation_logs_waits_for_delivery_when_max_pending_is_reached(
+        self, mocker, producer, create_node
+    ):
+        mocker.patch.object(KafkaProducer, 'max_pending', 1)
+        wait_for_delivery = mocker.patch.object(KafkaProducer, 'wait_for_delivery', new_callable=mocker.AsyncMock)
+        node = create_node(id_=str(uuid.uuid4()), type_='file')
+
+        run_coroutine(KafkaProducer.create_file_operation_logs(node, 'delete', 'admin', None))
+
+        wait_for_delivery.assert_awaited_once()
+
+    def test_create_file_operation_logs_keeps_delivery_errors_of_other_messages_until_flush(
+        self, mocker, producer, create_node
+    ):
+        mocker.patch.object(KafkaProducer, 'max_pending', 2)
+        nodes = [create_node(id_=str(uuid.uuid4()), type_='file') for _ in range(2)]
+        run_coroutine(KafkaProducer.create_file_operation_logs(nodes[0], 'delete', 'admin', None))
+        run_coroutine(producer.deliver(ValueError('Broker is not available')))
+
+        async def send_delivered_message() -> None:
+            task = asyncio.ensure_future(KafkaProducer.create_file_operation_logs(nodes[1], 'delete', 'admin', None))
+            while len(producer.futures) < 2:
+                await asyncio.sleep(0)
+            producer.futures[1].set_result(None)
+            await task
+
+        run_coroutine(send_delivered_message())
+
+        assert KafkaProducer.pending == []
+        with pytest.raises(Exception, match='Broker is not available'):
+            run_coroutine(KafkaProducer.flush())
+        assert KafkaProducer.delivery_errors == []
@@ -10,11 +10,24 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+from pathlib import Path
+
 import pytest
+from operations.checkpoint import CheckpointJournal
+from operations.duplicated_file_names import DuplicatedFileNames
+from operations.event_loop import run_coroutine
+from operations.managers import CopyManager
+from operations.managers import CopyPreparationManager
+from operations.managers import DeleteManager
+from operations.managers import DeletePreparationManager
 from operations.managers import NodeManager
+from operations.metrics import reset_job_metrics
 from operations.models import Node
 from operations.models import NodeList
 from operations.models import ResourceType
+from operations.models import TreeSnapshot
+from operations.services.dataops.client import DataopsServiceClient
+from operations.services.dataops.client import ResourceLockOperation
 
 
 @pytest.fixture
@@ -35,8 +48,635 @@ class TestNodeManager:
 
         assert received_nodes == [expected_node]
 
+    def test_get_subtree_returns_all_nodes_under_source_folder(self, node_manager, httpserver, create_node):
+        parent_node = create_node(type_=ResourceType.FOLDER, name='folder1', id_='parent_id')
+        expected_nodes = [create_node(parent_path='fake.folder1'), create_node(parent_path='fake.folder1.nested')]
+        body = {'result': expected_nodes, 'page': 0, 'num_of_pages': 1}
+        httpserver.expect_request('/v1/items/search/').respond_with_json(body)
+
+        received_nodes = node_manager.get_subtree(parent_node)
+
+        assert received_nodes == expected_nodes
+
     def test_exclude_nodes_returns_empty_set(self, node_manager, create_node):
         expected_set = set()
         received_set = node_manager.exclude_nodes(create_node(), NodeList([]))
 
         assert received_set == expected_set
+
+
+@pytest.fixture
+def copy_preparation_manager(metadata_service_client) -> CopyPreparationManager:
+    yield CopyPreparationManager(
+        metadata_service_client,
+        None,
+        None,
+        'project',
+        'greenroom',
+        'core',
+        Path('gr-project'),
+        Path('core-project'),
+        None,
+    )
+
+
+class TestCopyPreparationManager:
+    def test_get_lock_keys_return_keys_for_processed_source_and_destination_nodes(
+        self, copy_preparation_manager, mocker, create_node
+    ):
+        mocker.patch.object(copy_preparation_manager.metadata_service_client, 'get_child_names', return_value=set())
+        source_folder = create_node(type_=ResourceType.FOLDER, parent_path='admin', name='source')
+        folder = create_node(type_=ResourceType.FOLDER, parent_path='admin.source', name='folder')
+        file = create_node(type_=ResourceType.FILE, parent_path='admin.source.folder', name='file.txt')
+        snapshot = TreeSnapshot({source_folder.id: (folder,), folder.id: (file,)})
+        destination_path = Path('admin/destination')
+
+        read_lock_keys = copy_preparation_manager.get_read_lock_keys(snapshot, source_folder, destination_path)
+        write_lock_keys = copy_preparation_manager.get_write_lock_keys(snapshot, source_folder, destination_path)
+
+        assert list(read_lock_keys) == ['gr-project/admin/source/folder', 'gr-project/admin/source/folder/file.txt']
+        assert list(write_lock_keys) == [
+            'core-project/admin/destination/folder',
+            'core-project/admin/destination/folder/file.txt',
+        ]
+
+    def test_process_file_uses_new_filename_for_existing_destination_file_without_changing_source_node(
+        self, copy_preparation_manager, mocker, create_node
+    ):
+        source_file = create_node(type_=ResourceType.FILE, parent_path='admin.source', name='file.txt')
+        mocker.patch.object(
+            copy_preparation_manager.metadata_service_client, 'get_child_names', return_value={'file.txt'}
+        )
+        new_filename = f'file_{copy_preparation_manager.duplicated_files.filename_timestamp}.txt'
+
+        copy_preparation_manager.process_file(source_file, Path('admin/destination'))
+
+        assert source_file.name == 'file.txt'
+        assert copy_preparation_manager.duplicated_files.get(source_file.display_path) == new_filename
+
+    def test_get_write_lock_keys_return_new_filename_for_existing_destination_file(
+        self, copy_preparation_manager, mocker, create_node
+    ):
+        mocker.patch.object(
+            copy_preparation_manager.metadata_service_client, 'get_child_names', return_value={'file.txt'}
+        )
+        source_folder = create_node(type_=ResourceType.FOLDER, parent_path='admin', name='source')
+        source_file = create_node(type_=ResourceType.FILE, parent_path='admin.source', name='file.txt')
+        snapshot = TreeSnapshot({source_folder.id: (source_file,)})
+        new_filename = f'file_{copy_preparation_manager.duplicated_files.filename_timestamp}.txt'
+
+        copy_preparation_manager.process_file(source_file, Path('admin/destination'))
+        write_lock_keys = copy_preparation_manager.get_write_lock_keys(
+            snapshot, source_folder, Path('admin/destination')
+        )
+
+        assert list(write_lock_keys) == [f'core-project/admin/destination/{new_filename}']
+
+    def test_process_file_fetches_destination_names_once_per_folder(
+        self, copy_preparation_manager, mocker, create_node
+    ):
+        get_child_names = mocker.patch.object(
+            copy_preparation_manager.metadata_service_client, 'get_child_names', return_value=set()
+        )
+
+        copy_preparation_manager.process_file(create_node(type_=ResourceType.FILE), Path('admin/destination'))
+        copy_preparation_manager.process_file(create_node(type_=ResourceType.FILE), Path('admin/destination'))
+
+        get_child_names.assert_called_once_with('core', 'project', Path('admin/destination'))
+
+    def test_process_file_retries_destination_names_fetch_that_failed(
+        self, copy_preparation_manager, mocker, create_node
+    ):
+        get_child_names = mocker.patch.object(
+            copy_preparation_manager.metadata_service_client, 'get_child_names', side_effect=[Exception(), set()]
+        )
+
+        with pytest.raises(Exception):
+            copy_preparation_manager.process_file(create_node(type_=ResourceType.FILE), Path('admin/destination'))
+        copy_preparation_manager.process_file(create_node(type_=ResourceType.FILE), Path('admin/destination'))
+
+        assert get_child_names.call_count == 2
+
+    def test_process_file_async_retries_destination_names_fetch_that_failed(
+        self, copy_preparation_manager, mocker, create_node
+    ):
+        get_child_names = mocker.patch.object(
+            copy_preparation_manager.metadata_service_client.async_client,
+            'get_child_names',
+            new_callable=mocker.AsyncMock,
+            side_effect=[Exception(), set(), set()],
+        )
+
+        async def process_files() -> None:
+            with pytest.raises(Exception):
+                await copy_preparation_manager.process_file_async(
+                    create_node(type_=ResourceType.FILE), Path('admin/destination')
+                )
+            for _ in range(2):
+                await copy_preparation_manager.process_file_async(
+                    create_node(type_=ResourceType.FILE), Path('admin/destination')
+                )
+
+        run_coroutine(process_files())
+
+        assert get_child_names.await_count == 2
+
+    def test_process_file_and_get_write_lock_keys_skip_file_copied_according_to_checkpoint_journal(
+        self, copy_preparation_manager, mocker, create_node, tmp_path
+    ):
+        mocker.patch.object(
+            copy_preparation_manager.metadata_service_client, 'get_child_names', return_value={'file.txt'}
+        )
+        source_folder = create_node(type_=ResourceType.FOLDER, parent_path='admin', name='source')
+        source_file = create_node(type_=ResourceType.FILE, parent_path='admin.source', name='file.txt')
+        snapshot = TreeSnapshot({source_folder.id: (source_file,)})
+        copy_preparation_manager.checkpoint_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+        copy_preparation_manager.checkpoint_journal.record(source_file.id, 'destination-id', 'version-id')
+
+        copy_preparation_manager.process_file(source_file, Path('admin/destination'))
+        write_lock_keys = copy_preparation_manager.get_write_lock_keys(
+            snapshot, source_folder, Path('admin/destination')
+        )
+
+        assert copy_preparation_manager.duplicated_files.get(source_file.display_path) == ''
+        assert list(write_lock_keys) == []
+
+    def test_unlock_releases_all_locked_keys_of_files_copied_after_locking(
+        self, copy_preparation_manager, mocker, create_node, tmp_path
+    ):
+        source_folder = create_node(type_=ResourceType.FOLDER, parent_path='admin', name='source')
+        files = [
+            create_node(type_=ResourceType.FILE, parent_path='admin.source', name=name) for name in ('a.txt', 'b.txt')
+        ]
+        snapshot = TreeSnapshot({source_folder.id: tuple(files)})
+        copy_preparation_manager.checkpoint_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+        dataops_client = DataopsServiceClient('http://dataops', 1)
+        locked, unlocked = [], []
+        mocker.patch.object(
+            dataops_client.async_client,
+            '_lock_chunk',
+            new_callable=mocker.AsyncMock,
+            side_effect=lambda keys, operation: locked.extend(keys),
+        )
+        mocker.patch.object(
+            dataops_client.async_client,
+            '_unlock_chunk',
+            new_callable=mocker.AsyncMock,
+            side_effect=lambda keys, operation: unlocked.extend(keys),
+        )
+
+        read_lock_keys = copy_preparation_manager.get_read_lock_keys(snapshot, source_folder, Path('admin/destination'))
+        dataops_client.lock_resources(read_lock_keys, ResourceLockOperation.READ)
+        copy_preparation_manager.checkpoint_journal.record(files[0].id, 'destination-id', 'version-id')
+        dataops_client.unlock_resources(read_lock_keys, ResourceLockOperation.READ)
+
+        assert locked == ['gr-project/admin/source/a.txt', 'gr-project/admin/source/b.txt']
+        assert unlocked == locked
+
+    def test_get_lock_keys_return_prefix_keys_for_complete_folders_when_prefixes_are_enabled(
+        self, copy_preparation_manager, create_node
+    ):
+        source_folder = create_node(type_=ResourceType.FOLDER, parent_path='admin', name='source')
+        complete = create_node(type_=ResourceType.FOLDER, parent_path='admin.source', name='complete')
+        partial = create_node(type_=ResourceType.FOLDER, parent_path='admin.source', name='partial')
+        files = [
+            create_node(type_=ResourceType.FILE, parent_path=f'admin.source.{folder.name}', name='file.txt')
+            for folder in (complete, partial)
+        ]
+        snapshot = TreeSnapshot(
+            {source_folder.id: (complete, partial), complete.id: (files[0],), partial.id: (files[1],)},
+            {partial.id},
+        )
+        destination_path = Path('admin/destination')
+
+        read_lock_keys = copy_preparation_manager.get_read_lock_keys(snapshot, source_folder, destination_path, True)
+        write_lock_keys = copy_preparation_manager.get_write_lock_keys(snapshot, source_folder, destination_path, True)
+
+        assert list(read_lock_keys) == [
+            'gr-project/admin/source/complete/',
+            'gr-project/admin/source/partial',
+            'gr-project/admin/source/partial/file.txt',
+        ]
+        assert list(write_lock_keys) == [
+            'core-project/admin/destination/complete/',
+            'core-project/admin/destination/partial',
+            'core-project/admin/destination/partial/file.txt',
+        ]
+
+
+class TestDeletePreparationManager:
+    def test_get_write_lock_keys_return_keys_for_included_nodes_and_all_nodes_under_them(
+        self, metadata_service_client, mocker, create_node
+    ):
+        delete_preparation_manager = DeletePreparationManager(
+            metadata_service_client, 'project', 'greenroom', Path('gr-project'), None
+        )
+        folder = create_node(type_=ResourceType.FOLDER, parent_path='admin.source', name='folder')
+        file = create_node(type_=ResourceType.FILE, parent_path='admin.source', name='file.txt')
+        nested = [
+            create_node(type_=ResourceType.FOLDER, parent_path='admin.source.folder', name='nested'),
+            create_node(type_=ResourceType.FILE, parent_path='admin.source.folder.nested', name='file.txt'),
+        ]
+        get_subtree = mocker.patch.object(
+            metadata_service_client.async_client,
+            'get_subtree',
+            new_callable=mocker.AsyncMock,
+            return_value=NodeList(nested),
+        )
+
+        write_lock_keys = delete_preparation_manager.get_write_lock_keys(NodeList([folder, file]))
+
+        assert list(write_lock_keys) == [
+            'gr-project/admin/source/folder',
+            'gr-project/admin/source/folder/nested',
+            'gr-project/admin/source/folder/nested/file.txt',
+            'gr-project/admin/source/file.txt',
+        ]
+        get_subtree.assert_awaited_once_with(folder)
+
+    def test_get_write_lock_keys_fetch_only_subtrees_of_included_sibling_folders(
+        self, metadata_service_client, mocker, create_node
+    ):
+        delete_preparation_manager = DeletePreparationManager(
+            metadata_service_client, 'project', 'greenroom', Path('gr-project'), None
+        )
+        folders = [
+            create_node(type_=ResourceType.FOLDER, parent_path='admin.source', name=name) for name in ('a', 'b', 'c')
+        ]
+        subtrees = {
+            folders[0].id: NodeList(
+                [create_node(type_=ResourceType.FILE, parent_path='admin.source.a', name='file.txt')]
+            ),
+            folders[1].id: NodeList(
+                [create_node(type_=ResourceType.FILE, parent_path='admin.source.b.nested', name='file.txt')]
+            ),
+        }
+        get_subtree = mocker.patch.object(
+            metadata_service_client.async_client,
+            'get_subtree',
+            new_callable=mocker.AsyncMock,
+            side_effect=lambda folder: subtrees[folder.id],
+        )
+        search_subtree = mocker.patch.object(
+            metadata_service_client.async_client, 'search_subtree', new_callable=mocker.AsyncMock
+        )
+
+        write_lock_keys = delete_preparation_manager.get_write_lock_keys(NodeList(folders[:2]))
+
+        assert list(write_lock_keys) == [
+            'gr-project/admin/source/a',
+            'gr-project/admin/source/a/file.txt',
+            'gr-project/admin/source/b',
+            'gr-project/admin/source/b/nested/file.txt',
+        ]
+        assert [call.args[0] for call in get_subtree.await_args_list] == folders[:2]
+        search_subtree.assert_not_awaited()
+
+    def test_get_write_lock_keys_return_prefix_keys_for_included_folders_when_prefixes_are_enabled(
+        self, metadata_service_client, mocker, create_node
+    ):
+        delete_preparation_manager = DeletePreparationManager(
+            metadata_service_client, 'project', 'greenroom', Path('gr-project'), None
+        )
+        folder = create_node(type_=ResourceType.FOLDER, parent_path='admin.source', name='folder')
+        file = create_node(type_=ResourceType.FILE, parent_path='admin.source', name='file.txt')
+        get_subtree = mocker.patch.object(
+            metadata_service_client.async_client, 'get_subtree', new_callable=mocker.AsyncMock
+        )
+
+        write_lock_keys = delete_preparation_manager.get_write_lock_keys(NodeList([folder, file]), True)
+
+        assert list(write_lock_keys) == ['gr-project/admin/source/folder/', 'gr-project/admin/source/file.txt']
+        get_subtree.assert_not_awaited()
+
+    def test_get_included_nodes_fetches_all_included_nodes_with_one_request(
+        self, metadata_service_client, mocker, create_node
+    ):
+        delete_preparation_manager = DeletePreparationManager(
+            metadata_service_client, 'project', 'greenroom', Path('gr-project'), {'id-2', 'id-1'}
+        )
+        nodes = {node_id: create_node(id_=node_id) for node_id in ('id-1', 'id-2')}
+        get_items_by_ids = mocker.patch.object(metadata_service_client, 'get_items_by_ids', return_value=nodes)
+
+        received_nodes = delete_preparation_manager.get_included_nodes()
+
+        assert received_nodes.ids == {'id-1', 'id-2'}
+        get_items_by_ids.assert_called_once_with(['id-1', 'id-2'], allow_missing=True)
+
+    def test_get_included_nodes_leaves_out_nodes_that_are_not_found(
+        self, metadata_service_client, httpserver, create_node
+    ):
+        delete_preparation_manager = DeletePreparationManager(
+            metadata_service_client, 'project', 'greenroom', Path('gr-project'), {'id-1', 'id-2'}
+        )
+        httpserver.expect_request('/v1/items/batch/', method='GET').respond_with_json(
+            {'result': [create_node(id_='id-1')]}
+        )
+
+        received_nodes = delete_preparation_manager.get_included_nodes()
+
+        assert received_nodes.ids == {'id-1'}
+
+    def test_get_included_nodes_returns_empty_list_without_included_nodes(self, metadata_service_client, mocker):
+        delete_preparation_manager = DeletePreparationManager(
+            metadata_service_client, 'project', 'greenroom', Path('gr-project'), None
+        )
+        get_items_by_ids = mocker.patch.object(metadata_service_client, 'get_items_by_ids')
+
+        received_nodes = delete_preparation_manager.get_included_nodes()
+
+        assert received_nodes == []
+        get_items_by_ids.assert_not_called()
+
+
+@pytest.fixture
+def delete_manager(
+    metadata_service_client, lineage_service_client, audit_trail_service_client, dataops_client, mocker
+) -> DeleteManager:
+    yield DeleteManager(
+        metadata_service_client,
+        lineage_service_client,
+        audit_trail_service_client,
+        dataops_client,
+        {'code': 'project'},
+        'operator',
+        mocker.Mock(),
+        'Core',
+        'Greenroom',
+        'pipeline',
+        'description',
+        'delete',
+        {'id-1', 'id-2', 'id-3'},
+        archive_concurrency=2,
+    )
+
+
+class TestDeleteManager:
+    def test_archive_nodes_fetches_all_nodes_at_once_and_reports_result_of_every_node(
+        self, delete_manager, mocker, create_node
+    ):
+        metadata_service_client = delete_manager.metadata_service_client
+        nodes = {node_id: create_node(id_=node_id) for node_id in ('id-1', 'id-2', 'id-3')}
+        get_items_by_ids = mocker.patch.object(
+            metadata_service_client.async_client, 'get_items_by_ids', new_callable=mocker.AsyncMock, return_value=nodes
+        )
+
+        async def archive_node(node, *args):
+            if node.id == 'id-2':
+                raise Exception('Unable to archive')
+
+        archive_node = mocker.patch.object(
+            metadata_service_client, 'archive_node', new_callable=mocker.AsyncMock, side_effect=archive_node
+        )
+        mocker.patch('operations.kafka_producer.KafkaProducer.flush', new_callable=mocker.AsyncMock)
+
+        report = delete_manager.archive_nodes()
+
+        get_items_by_ids.assert_awaited_once_with(['id-1', 'id-2', 'id-3'], allow_missing=True)
+        assert archive_node.await_count == 3
+        assert report == {'id-1': None, 'id-2': 'Unable to archive', 'id-3': None}
+        assert report.failed == {'id-2': 'Unable to archive'}
+
+    def test_archive_nodes_reuses_included_nodes_from_preparation(self, delete_manager, mocker, create_node):
+        metadata_service_client = delete_manager.metadata_service_client
+        delete_manager.included_nodes = NodeList([create_node(id_=node_id) for node_id in ('id-1', 'id-2', 'id-3')])
+        get_items_by_ids = mocker.patch.object(
+            metadata_service_client.async_client, 'get_items_by_ids', new_callable=mocker.AsyncMock
+        )
+        archive_node = mocker.patch.object(metadata_service_client, 'archive_node', new_callable=mocker.AsyncMock)
+        mocker.patch('operations.kafka_producer.KafkaProducer.flush', new_callable=mocker.AsyncMock)
+
+        report = delete_manager.archive_nodes()
+
+        get_items_by_ids.assert_not_awaited()
+        assert archive_node.await_count == 3
+        assert report.failed == {}
+
+    def test_archive_nodes_fetches_only_unresolved_nodes_and_reports_those_that_cannot_be_fetched(
+        self, delete_manager, mocker, create_node
+    ):
+        metadata_service_client = delete_manager.metadata_service_client
+        delete_manager.included_nodes = NodeList([create_node(id_=node_id) for node_id in ('id-1', 'id-3')])
+        get_items_by_ids = mocker.patch.object(
+            metadata_service_client.async_client, 'get_items_by_ids', new_callable=mocker.AsyncMock, return_value={}
+        )
+        archive_node = mocker.patch.object(metadata_service_client, 'archive_node', new_callable=mocker.AsyncMock)
+        mocker.patch('operations.kafka_producer.KafkaProducer.flush', new_callable=mocker.AsyncMock)
+
+        report = delete_manager.archive_nodes()
+
+        get_items_by_ids.assert_awaited_once_with(['id-2'], allow_missing=True)
+        assert [call.args[0].id for call in archive_node.await_args_list] == ['id-1', 'id-3']
+        assert report.failed == {'id-2': 'Unable to get node: Node "id-2" is not found.'}
+        assert report['id-1'] is None
+        assert report['id-3'] is None
+
+    def test_archive_nodes_returns_empty_report_without_included_nodes(self, delete_manager, mocker):
+        get_items_by_ids = mocker.patch.object(
+            delete_manager.metadata_service_client.async_client, 'get_items_by_ids', new_callable=mocker.AsyncMock
+        )
+        delete_manager.include_geids = None
+
+        report = delete_manager.archive_nodes()
+
+        assert report == {}
+        get_items_by_ids.assert_not_awaited()
+
+
+@pytest.fixture
+def copy_manager(
+    metadata_service_client, lineage_service_client, audit_trail_service_client, dataops_client, mocker
+) -> CopyManager:
+    yield CopyManager(
+        metadata_service_client,
+        lineage_service_client,
+        audit_trail_service_client,
+        dataops_client,
+        None,
+        None,
+        DuplicatedFileNames(),
+        ['copied-to-core'],
+        {'code': 'project'},
+        'operator',
+        mocker.Mock(),
+        'Core',
+        'Greenroom',
+        'pipeline',
+        'description',
+        'copy',
+        None,
+        copy_concurrency=2,
+    )
+
+
+class TestCopyManager:
+    def test_process_file_copies_object_and_creates_node_with_new_version(
+        self, copy_manager, mocker, create_node, fake_metadata_server
+    ):
+        metadata_service_client = copy_manager.metadata_service_client
+        copy_file_object = mocker.patch.object(
+            metadata_service_client, 'copy_file_object', new_callable=mocker.AsyncMock, return_value='version'
+        )
+        create_file_metadata = mocker.patch.object(copy_manager, '_create_file_metadata', new_callable=mocker.AsyncMock)
+        source_file = create_node(type_=ResourceType.FILE)
+
+        copy_manager.process_file(source_file, create_node(type_=ResourceType.FOLDER))
+        copy_manager.flush()
+
+        copy_file_object.assert_awaited_once()
+        created_node = fake_metadata_server.items[0]
+        assert created_node['version'] == 'version'
+        create_file_metadata.assert_awaited_once_with(source_file, created_node, 'version')
+
+    def test_process_file_records_copied_file_in_checkpoint_journal_and_skips_it_on_next_run(
+        self, copy_manager, mocker, create_node, fake_metadata_server, tmp_path
+    ):
+        copy_manager.checkpoint_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+        copy_file_object = mocker.patch.object(
+            copy_manager.metadata_service_client, 'copy_file_object', new_callable=mocker.AsyncMock, return_value='v1'
+        )
+        mocker.patch.object(copy_manager, '_create_file_metadata', new_callable=mocker.AsyncMock)
+        source_file = create_node(type_=ResourceType.FILE)
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+
+        copy_manager.process_file(source_file, destination_folder)
+        copy_manager.flush()
+        copy_manager.checkpoint_journal.close()
+        copy_manager.checkpoint_journal = CheckpointJournal.for_job(tmp_path, 'job-id')
+        copy_manager.process_file(source_file, destination_folder)
+        copy_manager.flush()
+
+        copy_file_object.assert_awaited_once()
+        copied_file = copy_manager.checkpoint_journal.get(source_file.id)
+        assert copied_file.destination_id == fake_metadata_server.items[0]['id']
+        assert copied_file.version_id == 'v1'
+
+    def test_process_file_creates_nodes_of_one_folder_in_batches(
+        self, copy_manager, mocker, create_node, fake_metadata_server
+    ):
+        copy_manager.node_batch_size = 2
+        mocker.patch.object(
+            copy_manager.metadata_service_client, 'copy_file_object', new_callable=mocker.AsyncMock, return_value=''
+        )
+        mocker.patch.object(copy_manager, '_create_file_metadata', new_callable=mocker.AsyncMock)
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        source_files = [create_node(name=f'file-{index}', type_=ResourceType.FILE) for index in range(3)]
+
+        for source_file in source_files:
+            copy_manager.process_file(source_file, destination_folder)
+        copy_manager.flush()
+
+        assert sorted(fake_metadata_server.batch_sizes) == [1, 2]
+        assert {item['name'] for item in fake_metadata_server.items} == {'file-0', 'file-1', 'file-2'}
+
+    def test_flush_expired_creates_nodes_of_batches_older_than_max_age_only(
+        self, copy_manager, mocker, create_node, fake_metadata_server
+    ):
+        copy_manager.node_batch_size = 10
+        copy_manager.node_batch_max_age = 60
+        mocker.patch.object(
+            copy_manager.metadata_service_client, 'copy_file_object', new_callable=mocker.AsyncMock, return_value=''
+        )
+        mocker.patch.object(copy_manager, '_create_file_metadata', new_callable=mocker.AsyncMock)
+        old_folder, new_folder = create_node(type_=ResourceType.FOLDER), create_node(type_=ResourceType.FOLDER)
+
+        run_coroutine(copy_manager.process_file_async(create_node(name='old', type_=ResourceType.FILE), old_folder))
+        copy_manager.pending_file_nodes_started_at[old_folder.id] -= 60
+        run_coroutine(copy_manager.process_file_async(create_node(name='new', type_=ResourceType.FILE), new_folder))
+        copy_manager.flush_expired()
+
+        assert [item['name'] for item in fake_metadata_server.items] == ['old']
+        assert list(copy_manager.pending_file_nodes) == [new_folder.id]
+
+    def test_flush_raises_errors_from_all_failed_copies(self, copy_manager, mocker, create_node):
+        mocker.patch.object(
+            copy_manager.metadata_service_client,
+            'copy_file_object',
+            new_callable=mocker.AsyncMock,
+            side_effect=Exception('Unable to copy'),
+        )
+
+        for _ in range(3):
+            copy_manager.process_file(create_node(type_=ResourceType.FILE), create_node(type_=ResourceType.FOLDER))
+
+        with pytest.raises(Exception) as exc_info:
+            copy_manager.flush()
+
+        assert len(exc_info.value.args[0]) == 3
+
+    def test_create_file_metadata_runs_all_post_copy_steps(self, copy_manager, mocker, create_node):
+        metrics = reset_job_metrics()
+        source_node = create_node(type_=ResourceType.FILE)
+        target_node = create_node(type_=ResourceType.FILE)
+        async_clients = {
+            'dataops': copy_manager.dataops_client.async_client,
+            'lineage': copy_manager.lineage_service_client.async_client,
+            'audit_trail': copy_manager.audit_trail_service_client.async_client,
+            'metadata': copy_manager.metadata_service_client.async_client,
+        }
+        get_zip_preview = mocker.patch.object(
+            async_clients['dataops'],
+            'get_zip_preview',
+            new_callable=mocker.AsyncMock,
+            return_value={'result': 'preview'},
+        )
+        create_zip_preview = mocker.patch.object(
+            async_clients['dataops'], 'create_zip_preview', new_callable=mocker.AsyncMock
+        )
+        create_catalog_entity = mocker.patch.object(
+            async_clients['lineage'], 'create_catalog_entity', new_callable=mocker.AsyncMock
+        )
+        create_lineage_v3 = mocker.patch.object(
+            async_clients['audit_trail'], 'create_lineage_v3', new_callable=mocker.AsyncMock
+        )
+        update_node = mocker.patch.object(async_clients['metadata'], 'update_node', new_callable=mocker.AsyncMock)
+        create_file_operation_logs = mocker.patch(
+            'operations.managers.KafkaProducer.create_file_operation_logs', new_callable=mocker.AsyncMock
+        )
+
+        run_coroutine(copy_manager._create_file_metadata(source_node, target_node, 'version'))
+
+        get_zip_preview.assert_awaited_once_with(source_node.id)
+        create_zip_preview.assert_awaited_once_with(target_node.id, 'preview')
+        create_catalog_entity.assert_awaited_once_with(target_node, 'operator', 'core')
+        create_lineage_v3.assert_awaited_once()
+        create_file_operation_logs.assert_awaited_once_with(source_node, 'copy', 'operator', target_node)
+        update_node.assert_awaited_once_with(source_node, {'system_tags': ['copied-to-core'], 'version': 'version'})
+        assert metrics.summary()['operations'].keys() == {
+            'step.get_zip_preview',
+            'step.create_zip_preview',
+            'step.create_catalog_entity',
+            'step.create_lineage',
+            'step.create_activity_log',
+            'step.update_source_node',
+        }
+
+    def test_create_file_metadata_does_not_update_source_node_when_any_step_fails(
+        self, copy_manager, mocker, create_node
+    ):
+        source_node = create_node(type_=ResourceType.FILE)
+        target_node = create_node(type_=ResourceType.FILE)
+        mocker.patch.object(
+            copy_manager.dataops_client.async_client,
+            'get_zip_preview',
+            new_callable=mocker.AsyncMock,
+            return_value=None,
+        )
+        mocker.patch.object(
+            copy_manager.lineage_service_client.async_client,
+            'create_catalog_entity',
+            new_callable=mocker.AsyncMock,
+            side_effect=Exception('Unable to create catalog entity'),
+        )
+        mocker.patch.object(
+            copy_manager.audit_trail_service_client.async_client, 'create_lineage_v3', new_callable=mocker.AsyncMock
+        )
+        mocker.patch('operations.managers.KafkaProducer.create_file_operation_logs', new_callable=mocker.AsyncMock)
+        update_node = mocker.patch.object(
+            copy_manager.metadata_service_client.async_client, 'update_node', new_callable=mocker.AsyncMock
+        )
+
+        with pytest.raises(Exception):
+            run_coroutine(copy_manager._create_file_metadata(source_node, target_node, 'version'))
+
+        update_node.assert_not_awaited()
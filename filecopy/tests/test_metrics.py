@@ -0,0 +1,108 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import json
+
+import pytest
+from operations.event_loop import run_coroutine
+from operations.metrics import JobMetrics
+from operations.metrics import export_job_metrics
+from operations.metrics import get_job_metrics
+from operations.metrics import measured
+from operations.metrics import reset_job_metrics
+
+
+class TestJobMetrics:
+    def test_summary_returns_calls_errors_bytes_and_latency_histogram_per_operation(self):
+        metrics = JobMetrics(buckets=(0.1, 1.0))
+        metrics.record('s3.copy_object', 0.05, 100)
+        metrics.record('s3.copy_object', 0.5, 200)
+        metrics.record('s3.copy_object', 2.0, failed=True)
+
+        summary = metrics.summary()['operations']['s3.copy_object']
+
+        assert summary['calls'] == 3
+        assert summary['errors'] == 1
+        assert summary['bytes'] == 300
+        assert summary['latency']['max'] == 2.0
+        assert summary['latency']['p50'] == 1.0
+        assert summary['latency']['buckets'] == {'0.1': 1, '1.0': 2, '+Inf': 3}
+
+    def test_measure_records_failed_block_without_moved_bytes(self):
+        metrics = JobMetrics()
+
+        with pytest.raises(ValueError):
+            with metrics.measure('copy.file_object', 100):
+                raise ValueError()
+
+        summary = metrics.summary()['operations']['copy.file_object']
+        assert summary['calls'] == 1
+        assert summary['errors'] == 1
+        assert summary['bytes'] == 0
+
+    def test_format_prometheus_returns_histogram_with_escaped_labels(self):
+        metrics = JobMetrics(buckets=(0.1,))
+        metrics.record('metadata.get_node', 0.05)
+
+        text = metrics.format_prometheus(job_id='job "1"')
+
+        assert '# TYPE filecopy_operation_latency_seconds histogram' in text
+        assert 'filecopy_operation_calls_total{job_id="job \\"1\\"",operation="metadata.get_node"} 1' in text
+        assert (
+            'filecopy_operation_latency_seconds_bucket{job_id="job \\"1\\"",operation="metadata.get_node",le="+Inf"} 1'
+            in text
+        )
+
+    def test_write_prometheus_textfile_replaces_existing_file(self, tmp_path):
+        path = tmp_path / 'metrics' / 'filecopy.prom'
+        metrics = JobMetrics()
+        metrics.record('kafka.flush', 0.01)
+
+        metrics.write_prometheus_textfile(path, job_id='job')
+        metrics.write_prometheus_textfile(path, job_id='job')
+
+        assert path.read_text().count('filecopy_operation_calls_total{job_id="job",operation="kafka.flush"} 1') == 1
+        assert [file.name for file in path.parent.iterdir()] == ['filecopy.prom']
+
+
+class TestMeasured:
+    def test_decorator_records_calls_of_sync_and_async_functions_in_running_job_metrics(self):
+        @measured('sync')
+        def sync_function():
+            return 'sync'
+
+        @measured('async')
+        async def async_function():
+            raise ValueError()
+
+        metrics = reset_job_metrics()
+
+        assert sync_function() == 'sync'
+        with pytest.raises(ValueError):
+            run_coroutine(async_function())
+
+        assert get_job_metrics() is metrics
+        assert metrics.summary()['operations']['sync']['calls'] == 1
+        assert metrics.summary()['operations']['async']['errors'] == 1
+
+    def test_export_job_metrics_returns_json_summary_and_writes_textfile(self, tmp_path):
+        metrics = reset_job_metrics()
+        metrics.record('dataops.lock', 0.2)
+
+        summary = json.loads(export_job_metrics(str(tmp_path / 'filecopy.prom'), job_id='job'))
+
+        assert summary['job_id'] == 'job'
+        assert summary['operations']['dataops.lock']['calls'] == 1
+        assert (
+            'filecopy_operation_calls_total{job_id="job",operation="dataops.lock"} 1'
+            in (tmp_path / 'filecopy.prom').read_text()
+        )
@@ -0,0 +1,257 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+import io
+
+import pytest
+from operations.event_loop import run_coroutine
+from operations.minio_boto3_client import MAX_PART_SIZE
+from operations.minio_boto3_client import MAX_PARTS_COUNT
+from operations.minio_boto3_client import MIN_PART_SIZE
+from operations.minio_boto3_client import MinioBoto3Client
+from operations.minio_boto3_client import PartReader
+from operations.minio_boto3_client import RingBuffer
+from operations.minio_boto3_client import get_part_ranges
+from operations.minio_boto3_client import get_part_size
+
+
+@pytest.mark.parametrize(
+    'size,preferred_part_size,expected',
+    [
+        (100, 1, MIN_PART_SIZE),
+        (MIN_PART_SIZE * MAX_PARTS_COUNT * 2, MIN_PART_SIZE, MIN_PART_SIZE * 2),
+        (MAX_PART_SIZE * MAX_PARTS_COUNT, MAX_PART_SIZE * 2, MAX_PART_SIZE),
+        (1024, MIN_PART_SIZE * 4, MIN_PART_SIZE * 4),
+    ],
+)
+def test_get_part_size_returns_part_size_within_limits(size, preferred_part_size, expected):
+    assert get_part_size(size, preferred_part_size) == expected
+
+
+def test_get_part_ranges_returns_inclusive_byte_ranges_for_each_part():
+    assert get_part_ranges(10, 4) == [(1, 0, 3), (2, 4, 7), (3, 8, 9)]
+
+
+class TestPartReader:
+    def test_read_returns_content_of_view_in_chunks(self):
+        reader = PartReader(memoryview(b'0123456789')[2:8])
+
+        assert len(reader) == 6
+        assert reader.read(4) == b'2345'
+        assert reader.read(4) == b'67'
+        assert reader.read(4) == b''
+
+    def test_seek_allows_to_read_content_again(self):
+        reader = PartReader(memoryview(b'0123456789'))
+        reader.read()
+
+        reader.seek(-3, io.SEEK_END)
+
+        assert reader.tell() == 7
+        assert reader.read() == b'789'
+
+    def test_readinto_fills_buffer_with_content(self):
+        reader = PartReader(memoryview(b'0123456789'))
+        buffer = bytearray(4)
+
+        assert reader.readinto(buffer) == 4
+        assert buffer == b'0123'
+
+    def test_read_releases_pages_of_mapping_that_were_already_read(self, mocker):
+        mocker.patch('operations.minio_boto3_client.RELEASE_PAGES_SIZE', 4)
+        release_pages = mocker.patch('operations.minio_boto3_client.release_pages')
+        mapped = mocker.Mock()
+        reader = PartReader(memoryview(b'0123456789'), mapped, 100)
+
+        reader.read(2)
+        reader.read(3)
+        reader.close()
+
+        assert release_pages.call_args_list == [mocker.call(mapped, 100, 104), mocker.call(mapped, 105, 109)]
+
+    def test_close_releases_view(self):
+        view = memoryview(b'0123456789')
+        reader = PartReader(view)
+
+        reader.close()
+
+        with pytest.raises(ValueError):
+            view.tobytes()
+
+
+class TestRingBuffer:
+    def test_acquire_waits_until_slot_is_returned(self):
+        async def scenario():
+            ring = RingBuffer(1, 10)
+            async with ring.acquire() as slot:
+                waiting = asyncio.ensure_future(ring.acquire().__aenter__())
+                await asyncio.sleep(0)
+                assert not waiting.done()
+            assert await waiting is slot
+
+        run_coroutine(scenario())
+
+
+class TestMinioBoto3Client:
+    def test_get_s3_client_uses_own_session_with_configured_endpoint_and_pool_size(self, mocker):
+        client = MinioBoto3Client('access-key', 'secret-key', 'minio-endpoint', False)
+        session_client = mocker.patch.object(client.session, 'client')
+
+        client._get_s3_client(32)
+
+        config = session_client.call_args.kwargs['config']
+        assert session_client.call_args.kwargs['endpoint_url'] == 'http://minio-endpoint'
+        assert config.max_pool_connections == 32
+        assert config.signature_version == 's3v4'
+
+    @pytest.fixture(autouse=True)
+    def small_min_part_size(self, mocker):
+        mocker.patch('operations.minio_boto3_client.MIN_PART_SIZE', 1)
+        mocker.patch('operations.minio_boto3_client.UPLOAD_RETRY_DELAY', 0)
+
+    def test_copy_large_object_copies_all_part_ranges_on_server_side(self, minio_client, fake_s3_client, fake):
+        content = fake.binary(length=1000)
+        fake_s3_client.objects['source/path/file.txt'] = content
+
+        result = run_coroutine(
+            minio_client.copy_large_object('dest', 'path/file.txt', 'source', 'path/file.txt', len(content), 100)
+        )
+
+        assert fake_s3_client.objects['dest/path/file.txt'] == content
+        assert fake_s3_client.calls.count('upload_part_copy') == 10
+        assert result['VersionId'] == 'version-upload-0'
+
+    def test_copy_large_object_aborts_multipart_upload_when_part_copy_fails(self, minio_client, fake_s3_client, fake):
+        content = fake.binary(length=1000)
+        fake_s3_client.objects['source/path/file.txt'] = content
+        fake_s3_client.part_failures = {2: 1}
+
+        with pytest.raises(Exception):
+            run_coroutine(
+                minio_client.copy_large_object('dest', 'path/file.txt', 'source', 'path/file.txt', len(content), 100)
+            )
+
+        assert fake_s3_client.aborted == ['upload-0']
+        assert 'dest/path/file.txt' not in fake_s3_client.objects
+
+    def test_upload_object_uploads_file_in_multiple_parts(self, minio_client, fake_s3_client, fake, tmp_path):
+        content = fake.binary(length=1000)
+        file_path = tmp_path / 'file.txt'
+        file_path.write_bytes(content)
+
+        result = run_coroutine(minio_client.upload_object('dest', 'path/file.txt', str(file_path), part_size=100))
+
+        assert fake_s3_client.objects['dest/path/file.txt'] == content
+        assert fake_s3_client.calls.count('upload_part') == 10
+        assert result['VersionId'] == 'version-upload-0'
+
+    def test_upload_object_uploads_empty_file_as_one_part(self, minio_client, fake_s3_client, tmp_path):
+        file_path = tmp_path / 'file.txt'
+        file_path.write_bytes(b'')
+
+        run_coroutine(minio_client.upload_object('dest', 'path/file.txt', str(file_path)))
+
+        assert fake_s3_client.objects['dest/path/file.txt'] == b''
+
+    def test_upload_object_retries_failed_part(self, minio_client, fake_s3_client, fake, tmp_path):
+        content = fake.binary(length=1000)
+        file_path = tmp_path / 'file.txt'
+        file_path.write_bytes(content)
+        fake_s3_client.part_failures = {3: 2}
+
+        run_coroutine(minio_client.upload_object('dest', 'path/file.txt', str(file_path), part_size=100))
+
+        assert fake_s3_client.objects['dest/path/file.txt'] == content
+        assert fake_s3_client.calls.count('upload_part') == 12
+
+    def test_upload_object_aborts_multipart_upload_when_part_retries_are_exhausted(
+        self, minio_client, fake_s3_client, fake, tmp_path
+    ):
+        file_path = tmp_path / 'file.txt'
+        file_path.write_bytes(fake.binary(length=1000))
+        fake_s3_client.part_failures = {3: 3}
+
+        with pytest.raises(Exception):
+            run_coroutine(minio_client.upload_object('dest', 'path/file.txt', str(file_path), part_size=100))
+
+        assert fake_s3_client.aborted == ['upload-0']
+        assert 'dest/path/file.txt' not in fake_s3_client.objects
+
+    def test_relay_object_copies_content_through_ranged_reads_and_part_uploads(
+        self, minio_client, fake_s3_client, fake
+    ):
+        content = fake.binary(length=1000)
+        fake_s3_client.objects['source/path/file.txt'] = content
+
+        result = run_coroutine(
+            minio_client.relay_object('dest', 'path/file.txt', 'source', 'path/file.txt', len(content), 300, 2)
+        )
+
+        assert fake_s3_client.objects['dest/path/file.txt'] == content
+        assert fake_s3_client.calls.count('get_object') == 4
+        assert fake_s3_client.calls.count('upload_part') == 4
+        assert result['VersionId'] == 'version-upload-0'
+
+    def test_relay_object_aborts_multipart_upload_when_part_upload_fails(self, minio_client, fake_s3_client, fake):
+        content = fake.binary(length=1000)
+        fake_s3_client.objects['source/path/file.txt'] = content
+        fake_s3_client.part_failures = {2: 3}
+
+        with pytest.raises(Exception):
+            run_coroutine(
+                minio_client.relay_object('dest', 'path/file.txt', 'source', 'path/file.txt', len(content), 300, 2)
+            )
+
+        assert fake_s3_client.aborted == ['upload-0']
+        assert 'dest/path/file.txt' not in fake_s3_client.objects
+
+    def test_relay_object_aborts_when_source_returns_more_bytes_than_requested_range(
+        self, minio_client, fake_s3_client, fake, mocker
+    ):
+        content = fake.binary(length=1000)
+        fake_s3_client.objects['source/path/file.txt'] = content
+        get_object = fake_s3_client.get_object
+
+        async def get_whole_object(Bucket, Key, Range):
+            return await get_object(Bucket, Key, f'bytes=0-{len(content) - 1}')
+
+        mocker.patch.object(fake_s3_client, 'get_object', side_effect=get_whole_object)
+
+        with pytest.raises(ValueError, match='Received more than 300 bytes'):
+            run_coroutine(
+                minio_client.relay_object('dest', 'path/file.txt', 'source', 'path/file.txt', len(content), 300, 1)
+            )
+
+        assert fake_s3_client.aborted == ['upload-0']
+
+    def test_remove_objects_removes_keys_in_chunks(self, minio_client, fake_s3_client):
+        keys = [f'path/file-{index}.txt' for index in range(5)]
+        for key in keys:
+            fake_s3_client.objects[f'bucket/{key}'] = b'content'
+
+        errors = run_coroutine(minio_client.remove_objects('bucket', keys, chunk_size=2))
+
+        assert errors == {}
+        assert fake_s3_client.objects == {}
+        assert sorted(fake_s3_client.delete_batch_sizes) == [1, 2, 2]
+
+    def test_remove_objects_returns_errors_of_keys_that_were_not_removed(self, minio_client, fake_s3_client):
+        keys = ['path/file-1.txt', 'path/file-2.txt']
+        for key in keys:
+            fake_s3_client.objects[f'bucket/{key}'] = b'content'
+        fake_s3_client.delete_failures = {'path/file-2.txt'}
+
+        errors = run_coroutine(minio_client.remove_objects('bucket', keys))
+
+        assert errors == {'path/file-2.txt': 'AccessDenied: Access Denied'}
+        assert list(fake_s3_client.objects) == ['bucket/path/file-2.txt']
@@ -15,7 +15,9 @@ from pathlib import Path
 import pytest
 from operations.models import Node
 from operations.models import NodeList
+from operations.models import NodeTreeIndex
 from operations.models import ResourceType
+from operations.models import TreeSnapshot
 from operations.models import append_suffix_to_filepath
 
 
@@ -89,6 +91,39 @@ class TestNode:
 
         assert node.tags == expected_tags
 
+    def test_dotted_path_returns_parent_path_joined_with_name(self, create_node):
+        node = create_node(parent_path='admin.folder', name='name')
+
+        assert node.dotted_path == 'admin.folder.name'
+
+    def test_dotted_path_returns_name_when_parent_path_is_empty(self, create_node):
+        node = create_node(name='admin')
+        node['parent_path'] = None
+
+        assert node.dotted_path == 'admin'
+
+    def test_display_path_returns_parent_path_joined_with_name_relative_to_root(self, create_node):
+        node = create_node(parent_path='admin.folder', name='name')
+
+        assert node.display_path == Path('admin/folder/name')
+
+    def test_display_path_is_cached_until_parent_path_or_name_is_changed(self, create_node):
+        node = create_node(parent_path='admin.folder', name='name')
+        display_path = node.display_path
+
+        assert node.display_path is display_path
+
+        node['name'] = 'renamed'
+
+        assert node.display_path == Path('admin/folder/renamed')
+
+    def test_new_instance_interns_values_repeated_across_nodes(self):
+        parent_path = ''.join(['admin.', 'folder'])
+        node_1 = Node({'parent_path': parent_path, 'container_code': 'project'})
+        node_2 = Node({'parent_path': ''.join(['admin.', 'folder']), 'container_code': 'project'})
+
+        assert node_1['parent_path'] is node_2['parent_path']
+
     def test_get_attributes_returns_attributes_which_starts_with_attr(self, create_node):
         node = create_node(attributes={'attr_one': 1})
         expected_attributes = {'attr_one': 1}
@@ -102,6 +137,13 @@ class TestNodeList:
 
         assert isinstance(nodes[0], Node)
 
+    def test_new_instance_keeps_existing_node_instances(self, create_node):
+        node = create_node()
+
+        nodes = NodeList([node])
+
+        assert nodes[0] is node
+
     def test_ids_returns_set_with_all_node_ids(self, create_node):
         node_1 = create_node()
         node_2 = create_node()
@@ -117,3 +159,65 @@ class TestNodeList:
         expected_nodes = NodeList([node_1])
 
         assert expected_nodes == nodes.filter_files()
+
+
+class TestNodeTreeIndex:
+    def test_get_children_returns_nodes_with_folder_path_as_parent_path(self, create_node):
+        folder = create_node(type_=ResourceType.FOLDER, parent_path='admin', name='folder')
+        child_1 = create_node(parent_path='admin.folder')
+        child_2 = create_node(parent_path='admin.folder')
+        nested_child = create_node(parent_path='admin.folder.nested')
+        index = NodeTreeIndex.from_nodes([folder, child_1, child_2, nested_child])
+
+        assert index.get_children(folder) == [child_1, child_2]
+
+    def test_get_children_returns_empty_node_list_for_folder_without_children(self, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        index = NodeTreeIndex.from_nodes([folder])
+
+        assert index.get_children(folder) == []
+
+
+class TestTreeSnapshot:
+    def test_get_children_returns_stored_child_nodes(self, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        children = (create_node(), create_node())
+        snapshot = TreeSnapshot({folder.id: children})
+
+        assert snapshot.get_children(folder) == children
+
+    def test_iteration_returns_all_nodes(self, create_node):
+        node_1 = create_node()
+        node_2 = create_node()
+        snapshot = TreeSnapshot({'folder_1': (node_1,), 'folder_2': (node_2,)})
+
+        assert list(snapshot) == [node_1, node_2]
+
+    def test_snapshot_is_not_changed_by_source_mapping_changes(self, create_node):
+        children = {'folder': (create_node(),)}
+        snapshot = TreeSnapshot(children)
+
+        children['another_folder'] = ()
+
+        assert len(snapshot) == 1
+
+    def test_get_complete_folder_ids_returns_folders_with_every_node_included(self, create_node):
+        root = create_node(type_=ResourceType.FOLDER)
+        complete, partial, nested_partial, with_excluded_file = (
+            create_node(type_=ResourceType.FOLDER) for _ in range(4)
+        )
+        excluded_file = create_node(type_=ResourceType.FILE, name='excluded')
+        snapshot = TreeSnapshot(
+            {
+                root.id: (complete, partial, with_excluded_file),
+                complete.id: (create_node(type_=ResourceType.FILE),),
+                partial.id: (nested_partial,),
+                nested_partial.id: (),
+                with_excluded_file.id: (excluded_file,),
+            },
+            {nested_partial.id},
+        )
+
+        complete_folder_ids = snapshot.get_complete_folder_ids(root, lambda node: node.name != 'excluded')
+
+        assert complete_folder_ids == {complete.id}
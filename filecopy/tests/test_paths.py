@@ -0,0 +1,55 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+from pathlib import Path
+
+import pytest
+from operations.paths import NodePaths
+from operations.paths import get_node_paths
+
+
+class TestNodePaths:
+    def test_new_instance_precomputes_all_path_forms(self):
+        paths = NodePaths('admin.folder', 'file.txt')
+
+        assert paths.dotted == 'admin.folder.file.txt'
+        assert paths.slashed == 'admin/folder/file.txt'
+        assert paths.display == Path('admin/folder/file.txt')
+        assert paths.object_path == 'admin/folder/file.txt'
+
+    def test_new_instance_uses_name_when_parent_path_is_empty(self):
+        paths = NodePaths(None, 'admin')
+
+        assert paths.dotted == paths.slashed == paths.object_path == 'admin'
+
+    def test_display_is_relative_to_root(self):
+        paths = NodePaths('/admin', 'file.txt')
+
+        assert paths.display == Path('admin/file.txt')
+
+    @pytest.mark.parametrize(
+        'divider,expected', [('.', 'admin.folder.file'), ('/', 'admin/folder/file'), ('|', 'admin|folder|file')]
+    )
+    def test_join_joins_path_with_divider(self, divider, expected):
+        paths = NodePaths('admin.folder', 'file')
+
+        assert paths.join(divider) == expected
+
+    def test_in_bucket_returns_object_path_qualified_with_bucket(self):
+        paths = NodePaths('admin.folder', 'file.txt')
+
+        assert paths.in_bucket(Path('core-project')) == 'core-project/admin/folder/file.txt'
+
+
+def test_get_node_paths_returns_cached_instance_for_same_parent_path_and_name():
+    assert get_node_paths('admin.folder', 'file') is get_node_paths('admin.folder', 'file')
+    assert get_node_paths('admin.folder', 'file') is not get_node_paths('admin.other', 'file')
@@ -0,0 +1,64 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+
+import pytest
+from operations.pipeline import AsyncPipeline
+
+
+class TestAsyncPipeline:
+    def test_join_waits_for_all_submitted_coroutines(self):
+        pipeline = AsyncPipeline(max_pending=2)
+        finished = []
+
+        async def job(number: int) -> None:
+            await asyncio.sleep(0.01)
+            finished.append(number)
+
+        for number in range(5):
+            pipeline.submit(job(number))
+        pipeline.join()
+
+        assert sorted(finished) == [0, 1, 2, 3, 4]
+
+    def test_submit_keeps_no_more_than_max_pending_coroutines_running(self):
+        pipeline = AsyncPipeline(max_pending=2)
+        running = []
+        max_running = []
+
+        async def job() -> None:
+            running.append(1)
+            max_running.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        for _ in range(6):
+            pipeline.submit(job())
+        pipeline.join()
+
+        assert max(max_running) <= 2
+
+    def test_join_raises_all_collected_exceptions(self):
+        pipeline = AsyncPipeline(max_pending=2)
+
+        async def job(number: int) -> None:
+            if number % 2:
+                raise ValueError(number)
+
+        for number in range(4):
+            pipeline.submit(job(number))
+
+        with pytest.raises(Exception) as exc_info:
+            pipeline.join()
+
+        assert len(exc_info.value.args[0]) == 2
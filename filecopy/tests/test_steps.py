@@ -0,0 +1,97 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License along with this program.
+# If not, see http://www.gnu.org/licenses/.
+
+import asyncio
+
+import pytest
+from operations.event_loop import run_coroutine
+from operations.metrics import reset_job_metrics
+from operations.steps import StepGraph
+
+
+class TestStepGraph:
+    def test_run_starts_independent_steps_concurrently(self):
+        started = []
+
+        async def step(name):
+            started.append(name)
+            await asyncio.sleep(0.01)
+            return name
+
+        graph = StepGraph()
+        graph.add('first', lambda: step('first'))
+        graph.add('second', lambda: step('second'))
+        graph.add('third', lambda first, second: step(f'{first}-{second}'), depends_on=['first', 'second'])
+
+        results = run_coroutine(graph.run())
+
+        assert started == ['first', 'second', 'first-second']
+        assert results == {'first': 'first', 'second': 'second', 'third': 'first-second'}
+
+    def test_run_skips_steps_depending_on_failed_step_and_raises_its_exception(self):
+        async def failed():
+            raise ValueError('Step has failed')
+
+        async def dependent(_):
+            raise AssertionError('Dependent step should not be started')
+
+        async def independent():
+            return 'done'
+
+        graph = StepGraph()
+        graph.add('failed', failed)
+        graph.add('dependent', dependent, depends_on=['failed'])
+        graph.add('independent', independent)
+
+        with pytest.raises(Exception) as exc_info:
+            run_coroutine(graph.run())
+
+        assert [str(error) for error in exc_info.value.args[0]] == ['Step has failed']
+
+    def test_run_skips_all_steps_transitively_depending_on_failed_step(self):
+        started = []
+
+        async def failed():
+            raise ValueError('Step has failed')
+
+        async def dependent(_):
+            started.append('dependent')
+
+        graph = StepGraph()
+        graph.add('a', failed)
+        graph.add('b', dependent, depends_on=['a'])
+        graph.add('c', dependent, depends_on=['b'])
+
+        with pytest.raises(Exception) as exc_info:
+            run_coroutine(graph.run())
+
+        assert started == []
+        assert [str(error) for error in exc_info.value.args[0]] == ['Step has failed']
+
+    def test_add_raises_error_when_dependency_is_unknown(self):
+        graph = StepGraph()
+
+        with pytest.raises(ValueError):
+            graph.add('step', asyncio.sleep, depends_on=['unknown'])
+
+    def test_run_records_latency_of_each_step(self):
+        metrics = reset_job_metrics()
+        graph = StepGraph()
+        graph.add('first', lambda: asyncio.sleep(0))
+        graph.add('second', lambda: asyncio.sleep(0))
+
+        run_coroutine(graph.run())
+        run_coroutine(graph.run())
+
+        summary = metrics.summary()['operations']
+        assert summary.keys() == {'step.first', 'step.second'}
+        assert summary['step.first']['calls'] == 2
@@ -10,10 +10,16 @@
 # You should have received a copy of the GNU Affero General Public License along with this program.
 # If not, see http://www.gnu.org/licenses/.
 
+import asyncio
+
+import pytest
 from operations.managers import NodeManager
+from operations.metrics import reset_job_metrics
 from operations.models import Node
 from operations.models import NodeList
 from operations.models import ResourceType
+from operations.traverser import AsyncTraverser
+from operations.traverser import ConcurrentTraverser
 from operations.traverser import Traverser
 
 
@@ -37,3 +43,278 @@ class TestTraverser:
         traverser.traverse_tree(create_node(), create_node())
 
         assert len(tree_nodes) == 0
+
+    def test_traverse_tree_reads_children_from_prefetched_tree(self, metadata_service_client, create_node):
+        source_folder = create_node(type_=ResourceType.FOLDER, parent_path='admin', name='source')
+        folder = create_node(type_=ResourceType.FOLDER, parent_path='admin.source', name='folder')
+        file_1 = create_node(type_=ResourceType.FILE, parent_path='admin.source')
+        file_2 = create_node(type_=ResourceType.FILE, parent_path='admin.source.folder')
+        processed = []
+
+        class Manager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                raise AssertionError('Tree should not be fetched per folder')
+
+            def get_subtree(self, source_folder: Node):
+                return NodeList([folder, file_1, file_2])
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                processed.append(source_file)
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                processed.append(source_folder)
+
+        traverser = Traverser(Manager(metadata_service_client), prefetch_tree=True)
+
+        traverser.traverse_tree(source_folder, create_node())
+
+        assert processed == [folder, file_2, file_1]
+
+    def test_traverse_tree_uses_snapshot_from_previous_traversal(self, metadata_service_client, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        tree = {
+            'root': NodeList([folder, create_node(type_=ResourceType.FILE)]),
+            folder.id: NodeList([create_node(type_=ResourceType.FILE), create_node(type_=ResourceType.FILE)]),
+        }
+        excluded_node = tree[folder.id][1]
+        processed = []
+
+        class PreparationManager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            def exclude_nodes(self, source_folder: Node, nodes: NodeList):
+                return {excluded_node.id}
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                pass
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                pass
+
+        class Manager(PreparationManager):
+            def get_tree(self, source_folder: Node):
+                raise AssertionError('Tree should not be fetched again')
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                processed.append(source_file.id)
+
+        source_folder = create_node(id_='root')
+        traverser = Traverser(PreparationManager(metadata_service_client))
+        traverser.traverse_tree(source_folder, create_node())
+        traverser = Traverser(Manager(metadata_service_client), snapshot=traverser.take_snapshot())
+
+        traverser.traverse_tree(source_folder, create_node())
+
+        assert processed == [tree[folder.id][0].id, tree['root'][1].id]
+
+    def test_take_snapshot_marks_folders_with_excluded_children_as_partial(self, metadata_service_client, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        excluded_node = create_node(type_=ResourceType.FILE)
+        tree = {'root': NodeList([folder]), folder.id: NodeList([create_node(type_=ResourceType.FILE), excluded_node])}
+
+        class Manager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            def exclude_nodes(self, source_folder: Node, nodes: NodeList):
+                return {excluded_node.id}
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                pass
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                pass
+
+        source_folder = create_node(id_='root')
+        traverser = Traverser(Manager(metadata_service_client))
+        traverser.traverse_tree(source_folder, create_node())
+
+        snapshot = traverser.take_snapshot()
+
+        assert snapshot.is_partial(folder) is True
+        assert snapshot.is_partial(source_folder) is False
+
+
+class TestConcurrentTraverser:
+    def test_traverse_tree_processes_parent_folder_before_its_children(self, metadata_service_client, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        nested_folder = create_node(type_=ResourceType.FOLDER)
+        tree = {
+            'root': NodeList([folder, create_node(type_=ResourceType.FILE)]),
+            folder.id: NodeList([nested_folder, create_node(type_=ResourceType.FILE)]),
+            nested_folder.id: NodeList([create_node(type_=ResourceType.FILE), create_node(type_=ResourceType.FILE)]),
+        }
+        processed = []
+
+        class Manager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                assert destination_folder in processed
+                processed.append(source_file.id)
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                assert destination_parent_folder in processed
+                processed.append(source_folder.id)
+                return source_folder.id
+
+        traverser = ConcurrentTraverser(Manager(metadata_service_client), 4)
+        processed.append('destination')
+
+        traverser.traverse_tree(create_node(id_='root'), 'destination')
+
+        assert len(processed) == 7
+
+    def test_traverse_tree_raises_all_collected_errors_at_the_end(self, metadata_service_client, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        tree = {
+            'root': NodeList([folder, create_node(type_=ResourceType.FILE)]),
+            folder.id: NodeList([create_node(type_=ResourceType.FILE), create_node(type_=ResourceType.FILE)]),
+        }
+
+        class Manager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                raise ValueError(source_file.id)
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                return destination_parent_folder
+
+        traverser = ConcurrentTraverser(Manager(metadata_service_client), 4)
+
+        with pytest.raises(Exception) as exc_info:
+            traverser.traverse_tree(create_node(id_='root'), create_node())
+
+        assert len(exc_info.value.args[0]) == 3
+
+
+class TestAsyncTraverser:
+    def test_traverse_tree_processes_parent_folder_before_its_children(self, metadata_service_client, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        nested_folder = create_node(type_=ResourceType.FOLDER)
+        tree = {
+            'root': NodeList([folder, create_node(type_=ResourceType.FILE)]),
+            folder.id: NodeList([nested_folder, create_node(type_=ResourceType.FILE)]),
+            nested_folder.id: NodeList([create_node(type_=ResourceType.FILE), create_node(type_=ResourceType.FILE)]),
+        }
+        processed = []
+
+        class Manager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                assert destination_folder in processed
+                processed.append(source_file.id)
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                assert destination_parent_folder in processed
+                processed.append(source_folder.id)
+                return source_folder.id
+
+        traverser = AsyncTraverser(Manager(metadata_service_client), 4)
+        processed.append('destination')
+
+        traverser.traverse_tree(create_node(id_='root'), 'destination')
+
+        assert len(processed) == 7
+
+    def test_traverse_tree_keeps_no_more_than_max_tasks_running(self, metadata_service_client, create_node):
+        tree = {'root': NodeList([create_node(type_=ResourceType.FILE) for _ in range(10)])}
+        running = []
+        max_running = []
+
+        class Manager(NodeManager):
+            async def get_tree_async(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            async def process_file_async(self, source_file: Node, destination_folder: Node):
+                running.append(source_file.id)
+                max_running.append(len(running))
+                await asyncio.sleep(0.01)
+                running.remove(source_file.id)
+
+        traverser = AsyncTraverser(Manager(metadata_service_client), 3)
+
+        traverser.traverse_tree(create_node(id_='root'), create_node())
+
+        assert len(max_running) == 10
+        assert max(max_running) <= 3
+
+    def test_traverse_tree_raises_all_collected_errors_at_the_end(self, metadata_service_client, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        tree = {
+            'root': NodeList([folder, create_node(type_=ResourceType.FILE)]),
+            folder.id: NodeList([create_node(type_=ResourceType.FILE), create_node(type_=ResourceType.FILE)]),
+        }
+
+        class Manager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                raise ValueError(source_file.id)
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                return destination_parent_folder
+
+        traverser = AsyncTraverser(Manager(metadata_service_client), 4)
+
+        with pytest.raises(Exception) as exc_info:
+            traverser.traverse_tree(create_node(id_='root'), create_node())
+
+        assert len(exc_info.value.args[0]) == 3
+
+    def test_traverse_tree_flushes_expired_buffers_periodically_while_traversing(
+        self, metadata_service_client, create_node
+    ):
+        tree = {'root': NodeList([create_node(type_=ResourceType.FILE) for _ in range(3)])}
+        flushed = []
+
+        class Manager(NodeManager):
+            async def get_tree_async(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            async def process_file_async(self, source_file: Node, destination_folder: Node):
+                await asyncio.sleep(0.05)
+
+            async def flush_expired_async(self):
+                flushed.append(True)
+
+        traverser = AsyncTraverser(Manager(metadata_service_client), 1, flush_interval=0.01)
+
+        traverser.traverse_tree(create_node(id_='root'), create_node())
+
+        assert len(flushed) >= 5
+
+    def test_traverse_tree_records_processed_nodes_in_job_metrics(self, metadata_service_client, create_node):
+        folder = create_node(type_=ResourceType.FOLDER)
+        tree = {
+            'root': NodeList([folder, create_node(type_=ResourceType.FILE)]),
+            folder.id: NodeList([create_node(type_=ResourceType.FILE), create_node(type_=ResourceType.FILE)]),
+        }
+
+        class Manager(NodeManager):
+            def get_tree(self, source_folder: Node):
+                return tree[source_folder.id]
+
+            def process_file(self, source_file: Node, destination_folder: Node):
+                pass
+
+            def process_folder(self, source_folder: Node, destination_parent_folder: Node):
+                return destination_parent_folder
+
+        metrics = reset_job_metrics()
+        traverser = AsyncTraverser(Manager(metadata_service_client), 4)
+
+        traverser.traverse_tree(create_node(id_='root'), create_node())
+
+        operations = metrics.summary()['operations']
+        assert operations['traverser.list_children']['calls'] == 2
+        assert operations['traverser.process_folder']['calls'] == 1
+        assert operations['traverser.process_file']['calls'] == 3
+        assert operations['traverser.flush']['calls'] == 1